@@ -229,7 +229,7 @@ class DexNet_cli(object):
             self.dexnet_api.open_database(database_name, create_db=True)
             print('Opened database %s' %(database_name))
             print
-            existing_datasets = [d.name for d in self.dexnet_api.database.datasets]
+            existing_datasets = self.dexnet_api.database.dataset_names
             if len(existing_datasets) == 1:
                 dataset_name = existing_datasets[0]
                 self.dexnet_api.open_dataset(dataset_name)
@@ -280,7 +280,7 @@ class DexNet_cli(object):
             self.dexnet_api.open_database(database_name, create_db=True)
             print('Opened database %s' %(database_name))
             print
-            existing_datasets = [d.name for d in self.dexnet_api.database.datasets]
+            existing_datasets = self.dexnet_api.database.dataset_names
             if len(existing_datasets) == 1:
                 dataset_name = existing_datasets[0]
                 self.dexnet_api.open_dataset(dataset_name)
@@ -331,7 +331,7 @@ class DexNet_cli(object):
             self.dexnet_api.open_database(database_name, create_db=True)
             print('Opened database %s' %(database_name))
             print
-            existing_datasets = [d.name for d in self.dexnet_api.database.datasets]
+            existing_datasets = self.dexnet_api.database.dataset_names
             if len(existing_datasets) == 1:
                 dataset_name = existing_datasets[0]
                 self.dexnet_api.open_dataset(dataset_name)
@@ -370,7 +370,7 @@ class DexNet_cli(object):
             self.dexnet_api.open_database(database_name, create_db=True)
             print('Opened database %s' %(database_name))
             print
-            existing_datasets = [d.name for d in self.dexnet_api.database.datasets]
+            existing_datasets = self.dexnet_api.database.dataset_names
             if len(existing_datasets) == 1:
                 dataset_name = existing_datasets[0]
                 self.dexnet_api.open_dataset(dataset_name)
@@ -386,7 +386,7 @@ class DexNet_cli(object):
             return True
         
         # show existing datasets
-        existing_datasets = [d.name for d in self.dexnet_api.database.datasets]
+        existing_datasets = self.dexnet_api.database.dataset_names
         print('Existing datasets:')
         for dataset_name in existing_datasets:
             print dataset_name
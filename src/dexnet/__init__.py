@@ -21,4 +21,5 @@ MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """
 from constants import *
 from abstractstatic import abstractstatic
+from profiler import Profiler, PROFILER
 from api import DexNet
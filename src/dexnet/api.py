@@ -44,7 +44,9 @@ import dexnet.grasping.grasp_quality_config as gqc
 import dexnet.grasping.grasp_quality_function as gqf
 import dexnet.grasping.grasp_sampler as gs
 import dexnet.grasping.gripper as gr
+from dexnet.grasping import GraspSet, GraspQualityCache, ParallelJawPtGrasp3D
 import dexnet.database.mesh_processor as mp
+from dexnet.profiler import PROFILER
 from meshpy_berkeley import convex_decomposition, Mesh3D
 try:
     from dexnet.visualization import DexNetVisualizer3D as vis
@@ -75,6 +77,15 @@ class DexNet(object):
     ----------------
     cache_dir 
         Cache directory for to store intermediate files. If None uses a temporary directory
+    graspable_cache_mb
+        Size, in megabytes, of the in-memory cache of graspable objects for each dataset. Zero disables caching
+    sdf_band_voxels
+        Width, in voxels, of the narrow band SDFs that graspable objects are read into. Zero keeps dense SDFs
+    num_prefetch_objects
+        Number of objects to read ahead in a background thread when sampling grasps or computing metrics
+    quality_cache_entries
+        Maximum number of grasp quality results to keep in the persistent cache in the database cache directory.
+        Zero disables caching
     use_default_mass
         If True, clobbers mass and uses default_mass as mass always
     default_mass
@@ -83,6 +94,8 @@ class DexNet(object):
         Directory where the grippers models and parameters are
     metric_display_rate
         Number of grasps to compute metrics for before logging a line
+    metric_batch_size
+        Number of grasps to compute metrics for together, so that their wrench programs are solved at once
     gravity_accel
         Gravity acceleration for computing gravity-based metrics
     metrics
@@ -108,6 +121,9 @@ class DexNet(object):
         lowest value of metric to show grasps for
     max_plot_gripper
         Number of grasps to plot
+    profile
+        If True, records per-stage timings for each object while sampling grasps or computing metrics and saves them
+        as JSON to cache_dir/profiles
     """
     def __init__(self):
         """Create a DexNet object
@@ -143,6 +159,15 @@ class DexNet(object):
             DexNet._deep_update_config(updated_cfg, updates)
         return updated_cfg
     
+    def _save_profiles(self, profiles, name, config):
+        """ Saves a dictionary of profiler summaries to cache_dir/profiles/<name>.json """
+        profile_dir = os.path.join(config['cache_dir'], 'profiles')
+        if not os.path.exists(profile_dir):
+            os.makedirs(profile_dir)
+        profile_filename = os.path.join(profile_dir, '%s.json' %(name))
+        PROFILER.save(profile_filename, summary=profiles)
+        logger.info('Saved profile to %s' %(profile_filename))
+
     def _check_opens(self):
         """ Checks that database and dataset are open """
         if self.database is None:
@@ -168,6 +193,12 @@ class DexNet(object):
         ----------------
         cache_dir 
             Cache directory for to store intermediate files. If None uses a temporary directory
+        graspable_cache_mb
+            Size, in megabytes, of the in-memory cache of graspable objects for each dataset. Zero disables caching
+        sdf_band_voxels
+            Width, in voxels, of the narrow band SDFs that graspable objects are read into. Zero keeps dense SDFs
+        database_storage
+            Chunking, compression and SDF quantization for new databases, see dexnet.database.Hdf5ObjectFactory.storage_options
             
         Raises
         ------
@@ -202,9 +233,13 @@ class DexNet(object):
             self._database_temp_cache_dir = cache_dir
             
         # Open database
+        graspable_cache_bytes = int(config['graspable_cache_mb'] * 1e6)
         self.database = db.Hdf5Database(database_path,
                                         access_level=db.READ_WRITE_ACCESS,
-                                        cache_dir=cache_dir)
+                                        cache_dir=cache_dir,
+                                        graspable_cache_bytes=graspable_cache_bytes,
+                                        storage_options=config['database_storage'],
+                                        sdf_band_voxels=config['sdf_band_voxels'])
     
     def open_dataset(self, dataset_name, config=None, create_ds=True):
         """Open/create a dataset
@@ -237,7 +272,7 @@ class DexNet(object):
         if len(tokens) > 1:
             raise ValueError("dataset_name \"{}\" is invalid (contains delimiter)".format(dataset_name))
             
-        existing_datasets = [d.name for d in self.database.datasets]
+        existing_datasets = self.database.dataset_names
             
         # create/open new ds
         if dataset_name not in existing_datasets:
@@ -330,7 +365,7 @@ class DexNet(object):
         if name is None:
             _, root = os.path.split(filepath)
             name, _ = os.path.splitext(root)
-        if name in self.dataset.object_keys:
+        if self.dataset.has_object(name):
             raise RuntimeError('An object with key %s already exists. ' +
                                'Delete the object with delete_graspable first if replacing it'.format(name))
         
@@ -403,6 +438,10 @@ class DexNet(object):
             number of attempts to return an exact number of grasps before giving up
         gripper_dir
             Directory where the grippers models and parameters are.
+        num_prefetch_objects
+            Number of objects to read ahead in a background thread, 0 to read objects synchronously
+        profile
+            If True, saves per-object stage timings to cache_dir/profiles/sample_grasps.json
             
         Raises
         ------
@@ -422,33 +461,66 @@ class DexNet(object):
             else:
                 raise ValueError("{} is not a valid gripper name".format(gripper_name))
         
-        objects = self.dataset.object_keys
         if object_name is not None:
-            if object_name in objects:
+            if self.dataset.has_object(object_name):
                 objects = [object_name]
             else:
                 raise ValueError("{} is not a valid object name".format(object_name))
+        else:
+            objects = self.dataset.object_keys
         
-        for gripper_name in grippers:
-            gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
-            for object_name in objects:
-                if self.dataset.has_grasps(object_name, gripper=gripper.name):
-                    if overwrite:
-                        logger.info("Overwriting grasps for object {}, gripper {}".format(object_name, gripper.name))
-                        self.dataset.delete_grasps(object_name, gripper=gripper.name)
-                    else:
+        profiles = {}
+        if config['profile']:
+            PROFILER.enable()
+
+        try:
+            for gripper_name in grippers:
+                gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
+
+                # skip objects with existing grasps before reading them
+                target_objects = []
+                for object_name in objects:
+                    if not overwrite and self.dataset.has_grasps(object_name, gripper=gripper.name):
                         logger.warning("Grasps exist for object {}, gripper {}. ".format(object_name, gripper.name)+
                                         "To overwrite existing grasps, set kwarg overwrite to True")
                         continue
+                    target_objects.append(object_name)
+
+                # read objects in the background while sampling
+                object_iter = self.dataset.graspables(target_objects, num_prefetch=config['num_prefetch_objects'])
+                while True:
+                    PROFILER.reset()
+                    grasps_start = time.time()
+                    with PROFILER.timer('dataset/load_object'):
+                        obj = next(object_iter, None)
+                    if obj is None:
+                        break
+                    object_name = obj.key
+
+                    if self.dataset.has_grasps(object_name, gripper=gripper.name):
+                        logger.info("Overwriting grasps for object {}, gripper {}".format(object_name, gripper.name))
+                        self.dataset.delete_grasps(object_name, gripper=gripper.name)
+
+                    logger.info('Sampling grasps for object %s' %(object_name))
+                    grasps = DexNet._single_obj_grasps(self.dataset, obj, gripper, config, stable_pose_id=stable_pose)
+                    with PROFILER.timer('dataset/store_grasps'):
+                        self.dataset.store_grasps(obj.key, grasps, gripper=gripper.name)
+                        self.database.flush()
+                    grasps_stop = time.time()
+                    logger.info('Sampling grasps took %.3f sec' %(grasps_stop - grasps_start))
+
+                    if PROFILER.enabled:
+                        PROFILER.record('sample_grasps/total', grasps_stop - grasps_start)
+                        PROFILER.log()
+                        profiles['%s/%s' %(gripper.name, object_name)] = PROFILER.summary()
 
-                logger.info('Sampling grasps for object %s' %(object_name))
-                grasps_start = time.time()
-                obj = self.dataset[object_name]
-                grasps = DexNet._single_obj_grasps(self.dataset, obj, gripper, config, stable_pose_id=stable_pose)
-                self.dataset.store_grasps(obj.key, grasps, gripper=gripper.name)
-                self.database.flush()
-                grasps_stop = time.time()
-                logger.info('Sampling grasps took %.3f sec' %(grasps_stop - grasps_start))
+            if config['profile']:
+                self._save_profiles(profiles, 'sample_grasps', config)
+        finally:
+            # stop profiling even if sampling fails
+            if config['profile']:
+                PROFILER.disable()
+                PROFILER.reset()
             
     def down_sample_grasps(self, config=None, object_name=None, gripper_name=None):
         self._check_opens()
@@ -461,12 +533,13 @@ class DexNet(object):
             else:
                 raise ValueError("{} is not a valid gripper name".format(gripper_name))
         
-        objects = self.dataset.object_keys
         if object_name is not None:
-            if object_name in objects:
+            if self.dataset.has_object(object_name):
                 objects = [object_name]
             else:
                 raise ValueError("{} is not a valid object name".format(object_name))
+        else:
+            objects = self.dataset.object_keys
         
         for gripper_name in grippers:
             gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
@@ -508,7 +581,7 @@ class DexNet(object):
         obj = self.dataset[object_name]
         import IPython;IPython.embed()
         from dexnet.visualization import DexNetVisualizer3D as vis
-        surface_points, _ = obj.sdf.surface_points(grid_basis=False)
+        surface_points = obj.surface_index.surface_points
         vis.figure(bgcolor=(1,1,1), size=(500,500))
         # vis.mesh(obj.mesh.trimesh, color=(0.5, 0.5, 0.5), style='surface')
         vis.points(surface_points, scale=0.0001, color=(0,1,0))
@@ -524,7 +597,8 @@ class DexNet(object):
         gravity_resist_wrench = -np.append(gravity_force, [0,0,0])
         return gravity_resist_wrench
 
-    def _compute_metrics(self, obj, gripper, config, stable_pose_id=None, metric_name=None, overwrite=True):
+    def _compute_metrics(self, obj, gripper, config, stable_pose_id=None, metric_name=None, overwrite=True,
+                         quality_cache=None):
         """ Computes metrics for the grasps associated with the given object """
         # load grasps
         grasps = self.dataset.grasps(obj.key, gripper=gripper.name)
@@ -535,6 +609,10 @@ class DexNet(object):
         else:
             stable_poses = [self.dataset.stable_pose(obj.key, stable_pose_id)]
 
+        # align every grasp with every stable pose at once
+        table_normals = np.array([ParallelJawPtGrasp3D.table_normal(stable_pose) for stable_pose in stable_poses])
+        aligned_angles = GraspSet.from_grasps(grasps).perpendicular_table_angles(table_normals)
+
         # setup metrics to compute
         metric_dict = config['metrics']
         if metric_name is not None and metric_name in metric_dict.keys():
@@ -580,47 +658,51 @@ class DexNet(object):
                 setattr(metric_config, 'finger_radius', gripper.finger_radius)
             
                 # create quality function
-                quality_fn = gqf.GraspQualityFunctionFactory.create_quality_function(obj, metric_config)
+                quality_fn = gqf.GraspQualityFunctionFactory.create_quality_function(obj, metric_config,
+                                                                                     quality_cache=quality_cache)
                 
-                # compute quality for each grasp
+                # collect the grasps to evaluate and the metric to store each result in
+                existing_grasp_metrics = self.dataset.grasp_metrics(obj.key, grasps, gripper=gripper.name)
+                eval_grasps = []
+                eval_tags = []
                 for k, grasp in enumerate(grasps):
-                    if k % config['metric_display_rate'] == 0:
-                        logger.info('Computing metric for grasp %d of %d' %(k+1, len(grasps)))
-
                     # init grasp metric dict if necessary
                     if grasp.id not in grasp_metrics.keys():
                         grasp_metrics[grasp.id] = {}              
 
-                    existing_metrics = self.dataset.grasp_metrics(obj.key, [grasp], gripper=gripper.name)[grasp.id]
+                    existing_metrics = existing_grasp_metrics[grasp.id]
                       
                     # compute stable-pose specific metrics if check approach specified
                     if metric_config.check_approach and metric_config.quality_method != 'partial_closure' and \
                        metric_config.quality_method != 'wrench_resistance':
 
-                        for stable_pose in stable_poses:
-                            # compute grasp quality
+                        for j, stable_pose in enumerate(stable_poses):
                             metric_tag = '%s_%s' %(metric_name, stable_pose.id)
                             if metric_tag in existing_metrics and not overwrite:
                                 logger.info("Metric {} for object {}, gripper {}, grasp {}, stable pose {} exists, not overwriting"
                                                .format(metric_name, obj.key, gripper.name, grasp.id, stable_pose.id))
                                 continue
-                            s = time.time()
-                            aligned_grasp = grasp.perpendicular_table(stable_pose)
-                            q = quality_fn(aligned_grasp)
-                            e = time.time()
-                            grasp_metrics[grasp.id][metric_tag] = q.quality
+                            eval_grasps.append(grasp.with_approach_angle(aligned_angles[k,j]))
+                            eval_tags.append((grasp.id, metric_tag))
 
                     # else compute regular metrics
                     else:
-                        # compute grasp quality
                         if metric_name in existing_metrics and not overwrite:
                             logger.info("Metric {} for object {}, gripper {}, grasp {}, not overwriting"
                                             .format(metric_name, obj.key, gripper.name, grasp.id))
                             continue
-                        s = time.time()
-                        q = quality_fn(grasp)
-                        e = time.time()
-                        grasp_metrics[grasp.id][metric_name] = q.quality
+                        eval_grasps.append(grasp)
+                        eval_tags.append((grasp.id, metric_name))
+
+                # compute the quality of the grasps in batches, so that their wrench programs are solved together
+                batch_size = max(config['metric_batch_size'], 1)
+                display_rate = max(config['metric_display_rate'], 1)
+                for k in range(0, len(eval_grasps), batch_size):
+                    if k % display_rate == 0 or k // display_rate != (k + batch_size - 1) // display_rate:
+                        logger.info('Computing metric for grasp %d of %d' %(k+1, len(eval_grasps)))
+                    results = quality_fn.evaluate_batch(eval_grasps[k:k+batch_size])
+                    for (grasp_id, metric_tag), q in zip(eval_tags[k:k+batch_size], results):
+                        grasp_metrics[grasp_id][metric_tag] = q.quality
 
         # store the grasp metrics
         self.dataset.store_grasp_metrics(obj.key, grasp_metrics, gripper=gripper.name,
@@ -652,11 +734,19 @@ class DexNet(object):
             Directory where the grippers models and parameters are
         metric_display_rate
             Number of grasps to compute metrics for before logging a line
+        metric_batch_size
+            Number of grasps to compute metrics for together, so that their wrench programs are solved at once
         gravity_accel
             Gravity acceleration for computing gravity-based metrics
         metrics
             Dictionary mapping metric names to metric config dicts
             For available metrics and their config parameters see dexnet.grasping.grasp_quality_config
+        num_prefetch_objects
+            Number of objects to read ahead in a background thread, 0 to read objects synchronously
+        quality_cache_entries
+            Maximum number of grasp quality results to keep in the persistent cache, 0 to always recompute
+        profile
+            If True, saves per-object stage timings to cache_dir/profiles/compute_metrics.json
             
         Raises
         ------
@@ -677,12 +767,13 @@ class DexNet(object):
             else:
                 raise ValueError("{} is not a valid gripper name".format(gripper_name))
 
-        objects = self.dataset.object_keys
         if object_name is not None:
-            if object_name in objects:
+            if self.dataset.has_object(object_name):
                 objects = [object_name]
             else:
                 raise ValueError("{} is not a valid object name".format(object_name))
+        else:
+            objects = self.dataset.object_keys
             
         if metric_name is not None:
             if metric_name not in config['metrics'].keys():
@@ -690,23 +781,58 @@ class DexNet(object):
             metrics = [metric_name]
         else:
             metrics = config['metrics'].keys()
-        for obj_name in objects:
-            for gripper_name in grippers:
-                gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
-                for metric in metrics:
-                    # check for grasps
-                    if not self.dataset.has_grasps(obj_name, gripper=gripper.name):
-                        raise RuntimeWarning('No grasps exist for gripper %s on object %s' %(gripper.name, obj_name))
-
-                    # compute metrics
-                    obj = self.dataset[obj_name]
-                    logger.info('Computing grasp metric %s for object %s' %(metric, obj_name))
+        profiles = {}
+        if config['profile']:
+            PROFILER.enable()
+
+        quality_cache = None
+        try:
+            # reuse qualities computed for the same grasp, object and metric config in previous runs
+            if config['quality_cache_entries'] > 0:
+                quality_cache = GraspQualityCache(os.path.join(self.database.cache_dir, 'quality_cache.db'),
+                                                  max_entries=config['quality_cache_entries'])
+
+            # read each object once, in the background while computing metrics for the previous object
+            for obj in self.dataset.graspables(objects, num_prefetch=config['num_prefetch_objects']):
+                obj_name = obj.key
+                for gripper_name in grippers:
+                    gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
+                    PROFILER.reset()
+                    for metric in metrics:
+                        # check for grasps
+                        if not self.dataset.has_grasps(obj_name, gripper=gripper.name):
+                            raise RuntimeWarning('No grasps exist for gripper %s on object %s' %(gripper.name, obj_name))
+
+                        # compute metrics
+                        logger.info('Computing grasp metric %s for object %s' %(metric, obj_name))
                 
-                    metrics_start = time.time()
-                    self._compute_metrics(obj, gripper, config, stable_pose_id=stable_pose, metric_name=metric, overwrite=overwrite)
-                    self.database.flush()
-                    metrics_stop = time.time()
-                    logger.info('Computing metrics took %.3f sec' %(metrics_stop - metrics_start))
+                        metrics_start = time.time()
+                        self._compute_metrics(obj, gripper, config, stable_pose_id=stable_pose, metric_name=metric, overwrite=overwrite,
+                                              quality_cache=quality_cache)
+                        self.database.flush()
+                        if quality_cache is not None:
+                            quality_cache.flush()
+                        metrics_stop = time.time()
+                        logger.info('Computing metrics took %.3f sec' %(metrics_stop - metrics_start))
+                        PROFILER.record('compute_metrics/%s' %(metric), metrics_stop - metrics_start)
+
+                    if PROFILER.enabled:
+                        PROFILER.log()
+                        profiles['%s/%s' %(gripper.name, obj_name)] = PROFILER.summary()
+
+            if config['profile']:
+                self._save_profiles(profiles, 'compute_metrics', config)
+        finally:
+            # stop profiling and close the quality cache even if a metric fails
+            if config['profile']:
+                PROFILER.disable()
+                PROFILER.reset()
+            if quality_cache is not None:
+                logger.info('Quality cache stats: %s' %(quality_cache.stats))
+                quality_cache.close()
+
+        if self.dataset.graspable_cache is not None:
+            logger.info('Graspable cache stats: %s' %(self.dataset.graspable_cache.stats))
                           
     def compute_simulation_data(self, object_name, config=None):
         """Compute normals and convex decomposition for object (preprocessing for simulation)
@@ -1010,7 +1136,7 @@ class DexNet(object):
         self._check_opens()
         config=self._get_config(config)
         
-        if object_name not in self.dataset.object_keys:
+        if not self.dataset.has_object(object_name):
             raise ValueError("{} is not a valid object name".format(object_name))
 
         logger.info('Displaying {}'.format(object_name))
@@ -1046,7 +1172,7 @@ class DexNet(object):
         self._check_opens()
         config=self._get_config(config)
         
-        if object_name not in self.dataset.object_keys:
+        if not self.dataset.has_object(object_name):
             raise ValueError("{} is not a valid object name".format(object_name))
         
         logger.info('Displaying stable poses for'.format(object_name))
@@ -1099,8 +1225,7 @@ class DexNet(object):
             raise ValueError("{} is not a valid gripper name".format(gripper_name))
         gripper = gr.RobotGripper.load(gripper_name, gripper_dir=config['gripper_dir'])
 
-        objects = self.dataset.object_keys
-        if object_name not in objects:
+        if not self.dataset.has_object(object_name):
             raise ValueError("{} is not a valid object name".format(object_name))
 
         metrics = self.dataset.available_metrics(object_name, gripper=gripper.name)
@@ -1182,7 +1307,7 @@ class DexNet(object):
             Database or dataset not opened
         """
         self._check_opens()
-        if object_name not in self.dataset.object_keys:
+        if not self.dataset.has_object(object_name):
             raise ValueError("{} is not a valid object name".format(object_name))
 
         logger.info('Deleting {}'.format(object_name))
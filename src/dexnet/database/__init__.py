@@ -20,8 +20,9 @@ HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
 MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """
 from hdf5_factory import Hdf5ObjectFactory
+from graspable_cache import GraspableObjectCache
 from database import Database, Hdf5Database, Dataset, Hdf5Dataset
 from mesh_processor import MeshProcessor, RescalingType
 
 __all__ = ['Database', 'Hdf5Database', 'Dataset', 'Hdf5Dataset', 'Hdf5ObjectFactory',
-           'MeshProcessor', 'RescalingType']
+           'GraspableObjectCache', 'MeshProcessor', 'RescalingType']
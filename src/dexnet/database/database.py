@@ -26,22 +26,25 @@ Author: Jeff Mahler
 from abc import ABCMeta, abstractmethod
 
 import datetime as dt
+import functools
 import gc
 import h5py
 import logging
 import numbers
 import numpy as np
 import os
+import Queue
 from subprocess import Popen
 import sys
+import threading
 import time
 
 from dexnet.constants import *
 
-from dexnet.database import Hdf5ObjectFactory
+from dexnet.database import Hdf5ObjectFactory, GraspableObjectCache
 from dexnet.database.keys import *
 
-from dexnet.grasping import GraspableObject3D
+from dexnet.grasping import GraspableObject3D, GraspSet, NarrowBandSdf3D, SurfaceIndex
 
 import meshpy_berkeley.obj_file as obj_file
 import meshpy_berkeley.sdf_file as sdf_file
@@ -58,6 +61,20 @@ except ImportError:
     logging.warning("Could not import dill, some metadata operations will be unavailable")
 
 INDEX_FILE = 'index.db'
+PREFETCH_TIMEOUT = 0.1 # seconds to wait on a full prefetch queue before checking for cancellation
+
+class _PrefetchError(object):
+    """ Exception raised while prefetching an object, passed to the consuming thread to re-raise """
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+def _locked(method):
+    """ Holds the file lock of the dataset while a method that writes to the HDF5 file runs """
+    @functools.wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self.file_lock_:
+            return method(self, *args, **kwargs)
+    return locked_method
 
 class Database(object):
     """ Abstract class for Dex-Net databases. Main purpose is to wrap individual datasets.
@@ -90,11 +107,31 @@ class Hdf5Database(Database):
         directory to cache files used by the database wrapper class
     datasets : :obj:`list` of :obj:`Hdf5Dataset`
         datasets contained in this database
+    dataset_names : :obj:`list` of :obj:`str`
+        names of the datasets contained in this database
+    graspable_cache_bytes : int
+        size, in bytes, of the in-memory cache of graspable objects for each dataset, zero to disable caching
+    storage_options : :obj:`dict`
+        chunking, compression and SDF quantization for new SDF and mesh data (see Hdf5ObjectFactory.storage_options).
+        Only applied when a new database file is created, after which the options are stored in the file
+    sdf_band_voxels : float
+        width, in voxels, of the narrow band SDFs that graspable objects are read into, zero to keep dense SDFs
+    file_lock : :obj:`threading.RLock`
+        lock shared by the datasets that serializes writes to the file with background object reads
+
+    Notes
+    -----
+    Dataset wrappers are constructed on first access, so opening a database does not touch the objects of any dataset.
     """
     def __init__(self, database_filename, access_level=READ_ONLY_ACCESS,
-                 cache_dir='.dexnet'):
+                 cache_dir='.dexnet', graspable_cache_bytes=0,
+                 storage_options=None, sdf_band_voxels=0):
         Database.__init__(self, access_level)
         self.database_filename_ = database_filename
+        self.graspable_cache_bytes_ = graspable_cache_bytes
+        self.sdf_band_voxels_ = sdf_band_voxels
+        self.file_lock_ = threading.RLock()
+        self.storage_options_ = Hdf5ObjectFactory.storage_options(storage_options)
         if not self.database_filename_.endswith(HDF5_EXT):
             raise ValueError('Must provide HDF5 database')
 
@@ -114,6 +151,31 @@ class Hdf5Database(Database):
         self.data_.attrs[CREATION_KEY] = creation_stamp
         self.data_.create_group(DATASETS_KEY)
 
+        # save the storage layout for future writes to this database
+        chunk_size = self.storage_options_['chunk_size']
+        if chunk_size is None:
+            chunk_size = 0
+        self.data_.attrs[STORAGE_COMPRESSION_KEY] = str(self.storage_options_['compression'] or '')
+        self.data_.attrs[STORAGE_COMPRESSION_LEVEL_KEY] = self.storage_options_['compression_level']
+        self.data_.attrs[STORAGE_CHUNK_SIZE_KEY] = chunk_size
+        self.data_.attrs[STORAGE_QUANTIZE_SDF_KEY] = int(self.storage_options_['quantize_sdf'])
+
+    def _load_storage_options(self):
+        """ Reads the storage layout saved in the database, if any """
+        attrs = self.data_.attrs
+        if STORAGE_COMPRESSION_KEY not in attrs.keys():
+            # databases created before storage options were saved are uncompressed
+            self.storage_options_ = Hdf5ObjectFactory.storage_options()
+            return
+        compression = str(attrs[STORAGE_COMPRESSION_KEY])
+        chunk_size = int(attrs[STORAGE_CHUNK_SIZE_KEY])
+        self.storage_options_ = Hdf5ObjectFactory.storage_options({
+            'compression': compression if compression != '' else None,
+            'compression_level': int(attrs[STORAGE_COMPRESSION_LEVEL_KEY]),
+            'chunk_size': chunk_size if chunk_size > 0 else None,
+            'quantize_sdf': bool(attrs[STORAGE_QUANTIZE_SDF_KEY])
+        })
+
     def _load_database(self):
         """ Loads in the HDF5 file """
         if self.access_level == READ_ONLY_ACCESS:
@@ -125,26 +187,47 @@ class Hdf5Database(Database):
                 self._create_new_db()
         elif self.access_level == WRITE_ACCESS:
             self._create_new_db()
+        self._load_storage_options()
         self.dataset_names_ = self.data_[DATASETS_KEY].keys()
 
     def _load_datasets(self):
-        """ Load in the datasets """
-        self.datasets_ = []
-        for dataset_name in self.dataset_names_:
-            if dataset_name not in self.data_[DATASETS_KEY].keys():
+        """ Set up the dataset handles, which are loaded on first access """
+        self.datasets_ = {}
+
+    def _load_dataset(self, dataset_name):
+        """ Load in a single dataset, caching the wrapper for future accesses """
+        if dataset_name not in self.datasets_.keys():
+            if dataset_name not in self.data_[DATASETS_KEY]:
                 logging.warning('Dataset %s not in database' %(dataset_name))
-            else:
-                dataset_cache_dir = os.path.join(self.database_cache_dir_, dataset_name)
-                self.datasets_.append(Hdf5Dataset(dataset_name, self.data_[DATASETS_KEY][dataset_name],
-                                                  cache_dir=dataset_cache_dir))
+                return None
+            dataset_cache_dir = os.path.join(self.database_cache_dir_, dataset_name)
+            graspable_cache = None
+            if self.graspable_cache_bytes_ > 0:
+                graspable_cache = GraspableObjectCache(self.graspable_cache_bytes_)
+            self.datasets_[dataset_name] = Hdf5Dataset(dataset_name, self.data_[DATASETS_KEY][dataset_name],
+                                                       cache_dir=dataset_cache_dir,
+                                                       graspable_cache=graspable_cache,
+                                                       storage_options=self.storage_options_,
+                                                       sdf_band_voxels=self.sdf_band_voxels_,
+                                                       file_lock=self.file_lock_)
+        return self.datasets_[dataset_name]
 
     @property
     def cache_dir(self):
         return self.database_cache_dir_
 
+    @property
+    def dataset_names(self):
+        return self.dataset_names_
+
+    @property
+    def storage_options(self):
+        return self.storage_options_
+
     @property
     def datasets(self):
-        return self.datasets_
+        datasets = [self._load_dataset(dataset_name) for dataset_name in self.dataset_names_]
+        return [dataset for dataset in datasets if dataset is not None]
 
     def dataset(self, dataset_name):
         """ Returns handles to individual Hdf5 datasets.
@@ -159,15 +242,18 @@ class Hdf5Database(Database):
         :obj `Hdf5Dataset`
             dataset wrapper for the given name, if it exists, None otherwise
         """
-        if self.datasets is None or dataset_name not in self.dataset_names_:
+        if dataset_name not in self.dataset_names_:
             return None
-        for dataset in self.datasets_:
-            if dataset.name == dataset_name:
-                return dataset
+        return self._load_dataset(dataset_name)
+
+    @property
+    def file_lock(self):
+        return self.file_lock_
 
     def flush(self):
         """ Flushes the file """
-        self.data_.flush()
+        with self.file_lock_:
+            self.data_.flush()
         gc.collect()
 
     def close(self):
@@ -194,20 +280,17 @@ class Hdf5Database(Database):
         :obj:`Hdf5Dataset`
             the created dataset
         """
-        if dataset_name in self.data_[DATASETS_KEY].keys():
+        if dataset_name in self.data_[DATASETS_KEY]:
             logging.warning('Dataset %s already exists. Cannot overwrite' %(dataset_name))
-            return self.datasets_[self.data_[DATASETS_KEY].keys().index(dataset_name)]
+            return self._load_dataset(dataset_name)
         self.data_[DATASETS_KEY].create_group(dataset_name)
         self.data_[DATASETS_KEY][dataset_name].create_group(OBJECTS_KEY)
         self.data_[DATASETS_KEY][dataset_name].create_group(METRICS_KEY)
         for obj_key in obj_keys:
             self.data_[DATASETS_KEY][dataset_name][OBJECTS_KEY].create_group(obj_key)
 
-        dataset_cache_dir = os.path.join(self.database_cache_dir_, dataset_name)
         self.dataset_names_.append(dataset_name)
-        self.datasets_.append(Hdf5Dataset(dataset_name, self.data_[DATASETS_KEY][dataset_name],
-                                          cache_dir=dataset_cache_dir))
-        return self.datasets_[-1] # return the dataset
+        return self._load_dataset(dataset_name) # return the dataset
         
     def create_linked_dataset(self, dataset_name, graspable_list, nearest_neighbors):
         """ Creates a new dataset that links to objects physically stored as part of another dataset. Not currently implemented """
@@ -231,17 +314,34 @@ class Hdf5Dataset(Dataset):
     start_index : :obj:`int`
         initial object index to use for iteration
     end_index : :obj:`int`
-        final object index to use for iteration
+        final object index to use for iteration, None to use all objects after start_index
+    object_keys : :obj:`list` of :obj:`str`
+        precomputed keys of the objects in [start_index, end_index), used by subset views to avoid re-listing the keys
+    graspable_cache : :obj:`GraspableObjectCache`
+        in-memory cache of graspable objects read from the dataset, None to read from the file on every access
+    storage_options : :obj:`dict`
+        chunking, compression and SDF quantization for new SDF and mesh data (see Hdf5ObjectFactory.storage_options)
+    sdf_band_voxels : float
+        width, in voxels, of the narrow band SDFs that graspable objects are read into, zero to keep dense SDFs
+    file_lock : :obj:`threading.RLock`
+        lock held by writes to the file and by background object reads, shared with the database
     """
     def __init__(self, dataset_name, data, cache_dir=None,
-                 start_index=0, end_index=None):
+                 start_index=0, end_index=None, object_keys=None,
+                 graspable_cache=None, storage_options=None,
+                 sdf_band_voxels=0, file_lock=None):
         self.dataset_name_ = dataset_name
         self.data_ = data
-        self.object_keys_ = None
+        self.graspable_cache_ = graspable_cache
+        self.storage_options_ = storage_options
+        self.sdf_band_voxels_ = sdf_band_voxels
+        self.file_lock_ = file_lock
+        if self.file_lock_ is None:
+            self.file_lock_ = threading.RLock()
+        self.object_keys_ = object_keys
+        self.object_key_set_ = None
         self.start_index_ = start_index
         self.end_index_ = end_index
-        if self.end_index_ is None:
-            self.end_index_ = len(self.objects.keys())
 
         self.cache_dir_ = cache_dir
         if self.cache_dir_ is None:
@@ -256,6 +356,15 @@ class Hdf5Dataset(Dataset):
         """ :obj:`str` : Name of the dataset """
         return self.dataset_name_
 
+    @property
+    def file_lock(self):
+        return self.file_lock_
+
+    @property
+    def graspable_cache(self):
+        """ :obj:`GraspableObjectCache` : Cache of graspable objects, or None if caching is disabled """
+        return self.graspable_cache_
+
     @property
     def objects(self):
         """ :obj:`h5py.Group` : Data containing handles of objects.
@@ -267,15 +376,65 @@ class Hdf5Dataset(Dataset):
     def object_keys(self):
         """ :obj:`list` of :obj:`str` : Names of all objects in the dataset.
         """
-        if not self.object_keys_:
+        if self.object_keys_ is None:
             self.object_keys_ = self.objects.keys()[self.start_index_:self.end_index_]
         return self.object_keys_
 
+    @property
+    def object_key_set(self):
+        """ :obj:`set` of :obj:`str` : Names of all objects in the dataset, for constant time membership checks.
+        """
+        if self.object_key_set_ is None:
+            self.object_key_set_ = set(self.object_keys)
+        return self.object_key_set_
+
     @property
     def num_objects(self):
         """ int : number of objects in the dataset. """
+        if self.object_keys_ is None and self._is_full_view():
+            return len(self.objects)
         return len(self.object_keys)
 
+    def _is_full_view(self):
+        """ Whether or not the dataset spans all objects in the HDF5 group """
+        return self.start_index_ == 0 and self.end_index_ is None
+
+    def _update_object_keys(self, added_key=None, removed_key=None):
+        """ Updates the key index after an object is created or deleted.
+        The ordered key list is re-read on next access, while the key set is updated in place when possible.
+        """
+        self.object_keys_ = None
+        if not self._is_full_view():
+            self.object_key_set_ = None
+            self.end_index_ = None
+        elif self.object_key_set_ is not None:
+            if added_key is not None:
+                self.object_key_set_.add(added_key)
+            if removed_key is not None:
+                self.object_key_set_.discard(removed_key)
+
+    def has_object(self, key):
+        """ Checks whether an object is in the dataset.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the object
+
+        Returns
+        -------
+        bool
+            True if the object is in the dataset, False otherwise
+        """
+        if self.object_key_set_ is None and self._is_full_view():
+            # direct HDF5 link lookup, avoids listing all keys
+            return key in self.objects
+        return key in self.object_key_set
+
+    def __contains__(self, key):
+        """ Object key membership using the in operator """
+        return self.has_object(key)
+
     # easy data accessors
     @property
     def metrics(self):
@@ -317,6 +476,11 @@ class Hdf5Dataset(Dataset):
     def mesh_data(self, key):
         return self.objects[key][MESH_KEY]
 
+    def surface_index_data(self, key):
+        if SURFACE_INDEX_KEY in self.objects[key].keys():
+            return self.objects[key][SURFACE_INDEX_KEY]
+        return None
+
     def convex_piece_data(self, key):
         if CONVEX_PIECES_KEY in self.objects[key].keys():
             return self.objects[key][CONVEX_PIECES_KEY]
@@ -370,7 +534,7 @@ class Hdf5Dataset(Dataset):
 
     def __iter__(self):
         """ Generate iterator """
-        self.iter_count_ = self.start_index_ # NOT THREAD SAFE!
+        self.iter_count_ = 0 # NOT THREAD SAFE!
         return self
 
     def subset(self, start_index, end_index):
@@ -388,8 +552,14 @@ class Hdf5Dataset(Dataset):
         :obj:`Hdf5Dataset`
             Dataset containing only the specified subset
         """
+        # slice the key list of this dataset rather than re-listing the HDF5 group
         return Hdf5Dataset(self.dataset_name_, self.data_, self.cache_dir_,
-                           start_index, end_index) 
+                           self.start_index_ + start_index, self.start_index_ + end_index,
+                           object_keys=self.object_keys[start_index:end_index],
+                           graspable_cache=self.graspable_cache_,
+                           storage_options=self.storage_options_,
+                           sdf_band_voxels=self.sdf_band_voxels_,
+                           file_lock=self.file_lock_)
     
     def next(self):
         """ Read the next object file in the list.
@@ -399,19 +569,94 @@ class Hdf5Dataset(Dataset):
         :obj:`GraspableObject3D`
             the next graspable object in the iteration
         """
-        if self.iter_count_ >= len(self.object_keys) or self.iter_count_ >= self.end_index_:
-            raise StopIteration
-        else:
-            logging.info('Returning datum %s' %(self.object_keys[self.iter_count_]))
-            try:
-                obj = self.graspable(self.object_keys[self.iter_count_])    
-            except:
-                logging.warning('Error reading %s. Skipping' %(self.object_keys[self.iter_count_]))
-                self.iter_count_ = self.iter_count_ + 1
-                return self.next()
-
+        # skip unreadable objects iteratively so long runs of bad objects cannot exhaust the stack
+        while self.iter_count_ < len(self.object_keys):
+            key = self.object_keys[self.iter_count_]
             self.iter_count_ = self.iter_count_ + 1
-            return obj
+            logging.info('Returning datum %s' %(key))
+            obj = self._read_graspable(key)
+            if obj is not None:
+                return obj
+        raise StopIteration
+
+    def _read_graspable(self, key):
+        """ Reads a graspable, returning None and logging a warning if the object cannot be read """
+        try:
+            return self.graspable(key)
+        except Exception:
+            logging.warning('Error reading %s. Skipping' %(key))
+        return None
+
+    def graspables(self, keys=None, num_prefetch=0):
+        """ Iterates over graspable objects.
+        When num_prefetch is positive the objects are read ahead in a background thread so that HDF5 reads
+        and SDF decoding overlap with computation on the current object. The thread holds the file lock while
+        reading, and errors reading an object are raised on the iterating thread.
+
+        Parameters
+        ----------
+        keys : :obj:`list` of :obj:`str`
+            keys of the objects to read, in order, defaults to all objects in the dataset
+        num_prefetch : int
+            max number of objects to hold in the prefetch queue, 0 to read objects synchronously
+
+        Returns
+        -------
+        :obj:`generator` of :obj:`GraspableObject3D`
+            the graspable objects for the given keys
+        """
+        if keys is None:
+            keys = self.object_keys
+
+        # synchronous reads
+        if num_prefetch <= 0:
+            for key in keys:
+                yield self.graspable(key)
+            return
+
+        # background reads into a bounded queue
+        queue = Queue.Queue(maxsize=num_prefetch)
+        stop_event = threading.Event()
+
+        def put(item):
+            """ Put an item in the queue, giving up if the consumer stopped iterating """
+            while not stop_event.is_set():
+                try:
+                    queue.put(item, timeout=PREFETCH_TIMEOUT)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def prefetch():
+            try:
+                for key in keys:
+                    try:
+                        with self.file_lock_:
+                            obj = self.graspable(key)
+                    except Exception:
+                        put(_PrefetchError(sys.exc_info()))
+                        return
+                    if not put(obj):
+                        return
+            finally:
+                put(StopIteration)
+
+        prefetch_thread = threading.Thread(target=prefetch, name='prefetch_%s' %(self.dataset_name_))
+        prefetch_thread.daemon = True
+        prefetch_thread.start()
+        try:
+            while True:
+                obj = queue.get()
+                if obj is StopIteration:
+                    break
+                if isinstance(obj, _PrefetchError):
+                    exc_type, exc_value, exc_traceback = obj.exc_info
+                    raise exc_type, exc_value, exc_traceback
+                yield obj
+        finally:
+            stop_event.set()
+            prefetch_thread.join()
 
     # direct reading / writing
     def graspable(self, key):
@@ -432,9 +677,15 @@ class Hdf5Dataset(Dataset):
         ValueError
             If the key is not found in the dataset
         """
-        if key not in self.object_keys:
+        if not self.has_object(key):
             raise ValueError('Key %s not found in dataset %s' % (key, self.name))
 
+        # check the cache
+        if self.graspable_cache_ is not None:
+            obj = self.graspable_cache_.get(key)
+            if obj is not None:
+                return obj
+
         # read in data
         sdf = Hdf5ObjectFactory.sdf_3d(self.sdf_data(key))
         mesh = Hdf5ObjectFactory.mesh_3d(self.mesh_data(key))
@@ -444,10 +695,26 @@ class Hdf5Dataset(Dataset):
             convex_pieces = []
             for piece_key in self.convex_piece_data(key).keys():
                 convex_pieces.append(Hdf5ObjectFactory.mesh_3d(self.convex_piece_data(key)[piece_key]))
-        return GraspableObject3D(sdf, mesh=mesh, key=key,
-                                 model_name=self.obj_mesh_filename(key),
-                                 mass=mass, convex_pieces=convex_pieces)
-
+        # the stored surface index is built on the dense grid, so narrow band objects rebuild a sparse one on demand
+        surface_index = None
+        if self.sdf_band_voxels_ > 0:
+            sdf = NarrowBandSdf3D.from_sdf(sdf, band_voxels=self.sdf_band_voxels_)
+        elif self.surface_index_data(key) is not None:
+            surface_index = Hdf5ObjectFactory.surface_index(self.surface_index_data(key), sdf)
+        obj = GraspableObject3D(sdf, mesh=mesh, key=key,
+                                model_name=self.obj_mesh_filename(key),
+                                mass=mass, convex_pieces=convex_pieces,
+                                surface_index=surface_index)
+        if self.graspable_cache_ is not None:
+            self.graspable_cache_.put(key, obj)
+        return obj
+
+    def _invalidate_graspable(self, key):
+        """ Removes an object from the graspable cache after its data changes """
+        if self.graspable_cache_ is not None:
+            self.graspable_cache_.invalidate(key)
+
+    @_locked
     def create_graspable(self, key, mesh=None, sdf=None, stable_poses=None, mass=1.0):
         """ Creates a graspable object in the given dataset
 
@@ -469,7 +736,7 @@ class Hdf5Dataset(Dataset):
         ValueError
             If the key is already in the dataset
         """
-        if key in self.object_keys:
+        if self.has_object(key):
             raise ValueError('Object %s already exists!' %(key))
 
         # create object tree
@@ -483,19 +750,25 @@ class Hdf5Dataset(Dataset):
 
         # add the different pieces if provided
         if sdf:
-            Hdf5ObjectFactory.write_sdf_3d(sdf, self.sdf_data(key))
+            Hdf5ObjectFactory.write_sdf_3d(sdf, self.sdf_data(key),
+                                           storage_options=self.storage_options_)
+            self.object(key).create_group(SURFACE_INDEX_KEY)
+            Hdf5ObjectFactory.write_surface_index(SurfaceIndex.from_sdf(sdf), self.surface_index_data(key),
+                                                  storage_options=self.storage_options_)
         if mesh:
-            Hdf5ObjectFactory.write_mesh_3d(mesh, self.mesh_data(key))
+            Hdf5ObjectFactory.write_mesh_3d(mesh, self.mesh_data(key),
+                                            storage_options=self.storage_options_)
         if stable_poses:
             Hdf5ObjectFactory.write_stable_poses(stable_poses, self.stable_pose_data(key))
 
         # add the attributes
         self.object(key).attrs.create(MASS_KEY, mass)
 
-        # force re-read of keys
-        self.object_keys_ = None
-        self.end_index_ = len(self.objects.keys())
+        # update key index
+        self._update_object_keys(added_key=key)
+        self._invalidate_graspable(key)
 
+    @_locked
     def store_mesh(self, key, mesh, force_overwrite=False):
         """ Associates a mesh with the given object.
 
@@ -513,7 +786,7 @@ class Hdf5Dataset(Dataset):
         bool
             True if mesh stored for the given object, False otherwise
         """
-        if key not in self.object_keys:
+        if not self.has_object(key):
             raise ValueError('Key %s not found in dataset %s' % (key, self.name))
         if self.mesh_data(key) is not None and not force_overwrite:
             raise ValueError('Mesh for key %s already exist specified and force overwrite not specified' %(key))
@@ -523,9 +796,51 @@ class Hdf5Dataset(Dataset):
 
         # write mesh
         self.object(key).create_group(MESH_KEY)        
-        Hdf5ObjectFactory.write_mesh_3d(mesh, self.mesh_data(key))
+        Hdf5ObjectFactory.write_mesh_3d(mesh, self.mesh_data(key),
+                                        storage_options=self.storage_options_)
+        self._invalidate_graspable(key)
+        return True
+
+    @_locked
+    def store_surface_index(self, key, surface_index=None, force_overwrite=False, with_gradients=False):
+        """ Associates a surface index with the given object, so that it is not rebuilt each time the object is read.
+        Only the surface mask is stored unless with_gradients is set, since the dense SDF gradients are three times the
+        size of the SDF.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of object
+        surface_index : :obj:`SurfaceIndex`
+            surface index to store, built from the stored SDF if None
+        force_overwrite : bool
+            whether or not to overwrite
+        with_gradients : bool
+            whether or not to store the SDF gradients of the surface index as well
+
+        Returns
+        -------
+        bool
+            True if the surface index was stored for the given object, False otherwise
+        """
+        if not self.has_object(key):
+            raise ValueError('Key %s not found in dataset %s' % (key, self.name))
+        if self.surface_index_data(key) is not None:
+            if not force_overwrite:
+                raise ValueError('Surface index for key %s already exists and force overwrite not specified' %(key))
+            del self.object(key)[SURFACE_INDEX_KEY]
+
+        if surface_index is None:
+            surface_index = SurfaceIndex.from_sdf(Hdf5ObjectFactory.sdf_3d(self.sdf_data(key)))
+
+        self.object(key).create_group(SURFACE_INDEX_KEY)
+        Hdf5ObjectFactory.write_surface_index(surface_index, self.surface_index_data(key),
+                                              storage_options=self.storage_options_,
+                                              with_gradients=with_gradients)
+        self._invalidate_graspable(key)
         return True
 
+    @_locked
     def store_convex_pieces(self, key, convex_pieces, force_overwrite=False):
         """ Associates convex pieces with the given object.
 
@@ -543,7 +858,7 @@ class Hdf5Dataset(Dataset):
         bool
             True if convex pieces were stored for the given object, False otherwise
         """
-        if key not in self.object_keys:
+        if not self.has_object(key):
             raise ValueError('Key %s not found in dataset %s' % (key, self.name))
         if self.convex_piece_data(key) is not None and not force_overwrite:
             raise ValueError('Convex pieces for key %s already exist specified and force overwrite not specified' %(key))
@@ -556,9 +871,12 @@ class Hdf5Dataset(Dataset):
         for i, convex_piece in enumerate(convex_pieces):
             piece_key = 'piece_%03d' %(i)
             self.convex_piece_data(key).create_group(piece_key)
-            Hdf5ObjectFactory.write_mesh_3d(convex_piece, self.convex_piece_data(key)[piece_key])
+            Hdf5ObjectFactory.write_mesh_3d(convex_piece, self.convex_piece_data(key)[piece_key],
+                                            storage_options=self.storage_options_)
+        self._invalidate_graspable(key)
         return True
            
+    @_locked
     def store_stable_poses(self, key, stable_poses, force_overwrite=False):
         """ Associates stable poses with the given object.
 
@@ -579,6 +897,7 @@ class Hdf5Dataset(Dataset):
         Hdf5ObjectFactory.write_stable_poses(stable_poses, self.stable_pose_data(key), force_overwrite=force_overwrite)
         return True
 
+    @_locked
     def delete_graspable(self, key):
         """ Delete a graspable from the dataset.
         
@@ -592,7 +911,7 @@ class Hdf5Dataset(Dataset):
         bool
             True if object deleted, False otherwise
         """
-        if key not in self.objects.keys():
+        if key not in self.objects:
             logging.warning('Graspable %s not found. Nothing to delete' %(key))
             return False
 
@@ -604,12 +923,13 @@ class Hdf5Dataset(Dataset):
         del self.object(key)[GRASPS_KEY]
         del self.objects[key]
 
-        # force re-read of keys
-        self.object_keys_ = None
-        self.end_index_ = len(self.objects.keys())
+        # update key index
+        self._update_object_keys(removed_key=key)
+        self._invalidate_graspable(key)
 
         return True
 
+    @_locked
     def delete_convex_pieces(self, key):
         """ Delete convex pieces for an object from the dataset.
         
@@ -623,11 +943,12 @@ class Hdf5Dataset(Dataset):
         bool
             True if object deleted, False otherwise
         """
-        if key not in self.objects.keys():
+        if key not in self.objects:
             logging.warning('Graspable %s not found. Nothing to delete' %(key))
             return False
         if self.convex_piece_data(key) is not None:
             del self.object(key)[CONVEX_PIECES_KEY]
+        self._invalidate_graspable(key)
         return True
 
     def obj_mesh_filename(self, key, scale=1.0, output_dir=None, overwrite=False):
@@ -751,7 +1072,7 @@ class Hdf5Dataset(Dataset):
         ------
         ValueError : If the key is not in the dataset
         """
-        if key not in self.object_keys:
+        if not self.has_object(key):
             raise ValueError('Key %s not found in dataset %s' % (key, self.name))
         return Hdf5ObjectFactory.mesh_3d(self.mesh_data(key))
 
@@ -772,7 +1093,7 @@ class Hdf5Dataset(Dataset):
         ------
         ValueError : If the key is not in the dataset
         """
-        if key not in self.object_keys:
+        if not self.has_object(key):
             raise ValueError('Key %s not found in dataset %s' % (key, self.name))
         if self.convex_piece_data(key) is None:
             return None
@@ -784,6 +1105,7 @@ class Hdf5Dataset(Dataset):
         return convex_pieces
 
     # metric data
+    @_locked
     def create_metric(self, metric_name, metric_config):
         """ Creates a grasp quality metric with the given name for easier access.
 
@@ -857,6 +1179,7 @@ class Hdf5Dataset(Dataset):
             return True
         return False
 
+    @_locked
     def delete_metric(self, metric_name):
         """ Deletes a metric from the database.
 
@@ -913,7 +1236,29 @@ class Hdf5Dataset(Dataset):
             return []
         return Hdf5ObjectFactory.grasps(self.grasp_data(key, gripper))
 
-    def sorted_grasps(self, key, metric, gripper='pr2', stable_pose_id=None):
+    def grasp_set(self, key, gripper='pr2', stable_pose_id=None):
+        """ Returns the grasps for the given graspable and gripper as a GraspSet, optionally associated with the given stable pose.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of object to check metrics for
+        gripper : :obj:`str`
+            name of gripper
+        stable_pose_id : :obj:`str`
+            id of stable pose
+
+        Returns
+        -------
+        :obj:`dexnet.grasping.GraspSet`
+            stored grasps for the object and gripper, empty set if gripper not found
+        """
+        if gripper not in self.grasp_data(key).keys():
+            logging.warning('Gripper type %s not found. Returning empty grasp set' %(gripper))
+            return GraspSet.from_grasps([])
+        return Hdf5ObjectFactory.grasp_set(self.grasp_data(key, gripper))
+
+    def sorted_grasps(self, key, metric, gripper='pr2', stable_pose_id=None, as_grasp_set=False):
         """ Returns the list of grasps for the given graspable sorted by decreasing quality according to the given metric.
 
         Parameters
@@ -926,6 +1271,8 @@ class Hdf5Dataset(Dataset):
             name of gripper
         stable_pose_id : :obj:`str`
             id of stable pose
+        as_grasp_set : bool
+            whether to return the grasps as a GraspSet and the metrics as an array instead of lists
 
         Returns
         -------
@@ -934,14 +1281,24 @@ class Hdf5Dataset(Dataset):
         :obj:`list` of float
             values of metrics for the grasps sorted in descending order, empty list if gripper not found
         """
-        grasps = self.grasps(key, gripper=gripper, stable_pose_id=stable_pose_id)
+        if as_grasp_set:
+            grasps = self.grasp_set(key, gripper=gripper, stable_pose_id=stable_pose_id)
+        else:
+            grasps = self.grasps(key, gripper=gripper, stable_pose_id=stable_pose_id)
         if len(grasps) == 0:
+            if as_grasp_set:
+                return grasps, np.zeros(0)
             return [], []
         
         grasp_metrics = self.grasp_metrics(key, grasps, gripper=gripper, stable_pose_id=stable_pose_id)
         if metric not in grasp_metrics[grasp_metrics.keys()[0]].keys():
             raise ValueError('Metric %s not recognized' %(metric))
 
+        if as_grasp_set:
+            metrics = np.array([grasp_metrics[grasp_id][metric] for grasp_id in grasps.ids])
+            order = np.argsort(-metrics, kind='mergesort')
+            return grasps[order], metrics[order]
+
         grasps_and_metrics = [(g, grasp_metrics[g.id][metric]) for g in grasps]
         grasps_and_metrics.sort(key=lambda x: x[1], reverse=True)
         sorted_grasps = [g[0] for g in grasps_and_metrics]
@@ -969,6 +1326,7 @@ class Hdf5Dataset(Dataset):
             return False
         return True
 
+    @_locked
     def delete_grasps(self, key, gripper='pr2', stable_pose_id=None):
         """ Deletes a set of grasps associated with the given gripper.
 
@@ -992,6 +1350,7 @@ class Hdf5Dataset(Dataset):
         del self.grasp_data(key)[gripper]
         return True
 
+    @_locked
     def store_grasps(self, key, grasps, gripper='pr2', stable_pose_id=None, force_overwrite=False):
         """ Associates grasps in list grasps with the given object. Optionally associates the grasps with a single stable pose.
 
@@ -999,6 +1358,8 @@ class Hdf5Dataset(Dataset):
         ----------
         key : :obj:`str`
             key of object to check metrics for
+        grasps : :obj:`list` of :obj:`dexnet.grasping.ParallelJawPtGrasp3D` or :obj:`dexnet.grasping.GraspSet`
+            grasps to store
         gripper : :obj:`str`
             name of gripper
         stable_pose_id : :obj:`str`
@@ -1046,6 +1407,7 @@ class Hdf5Dataset(Dataset):
         """
         raise NotImplementedError()
 
+    @_locked
     def store_grasp_metrics(self, key, grasp_metric_dict, gripper='pr2', stable_pose_id=None, force_overwrite=False):
         """ Add grasp metrics in grasp_metric_dict to the data associated with grasps.
 
@@ -1190,6 +1552,7 @@ class Hdf5Dataset(Dataset):
             return False
         return True
 
+    @_locked
     def delete_rendered_images(self, key, stable_pose_id=None, render_mode=RenderMode.DEPTH):
         """ Delete previously rendered images.
 
@@ -1212,6 +1575,7 @@ class Hdf5Dataset(Dataset):
             return True
         return False
 
+    @_locked
     def store_rendered_images(self, key, rendered_images, stable_pose_id=None, render_mode=RenderMode.DEPTH, force_overwrite=False):
         """ Store rendered images of the object for a given stable pose.
         Parameters
@@ -1274,6 +1638,7 @@ class Hdf5Dataset(Dataset):
         return render_modes
     
     #connected components
+    @_locked
     def store_connected_components(self, key, connected_components, force_overwrite=False):
         """ Store the connected components of the mesh
         
@@ -1309,6 +1674,7 @@ class Hdf5Dataset(Dataset):
         return Hdf5ObjectFactory.connected_components(self.mesh_data(key))
 
     #metadata
+    @_locked
     def create_metadata(self, metadata_name, metadata_type, metadata_description="No description"):
         """ Creates an object metadata with the given name for easier access.
 
@@ -1347,6 +1713,7 @@ class Hdf5Dataset(Dataset):
         metadata_group.attrs.create(METADATA_DESC_KEY, metadata_description)
         return True
     
+    @_locked
     def attach_metadata_func(self, metadata_name, metadata_func, overwrite=False, store_func=True):
         """ Attach a function that computes a given metadata from a Mesh3D object
         
@@ -1401,6 +1768,7 @@ class Hdf5Dataset(Dataset):
         """ Checks if a metadata type already exists """
         return metadata_name in self.metadata_names
 
+    @_locked
     def delete_metadata(self, metadata_name):
         """ Deletes a metadata type from the database.
 
@@ -1428,6 +1796,7 @@ class Hdf5Dataset(Dataset):
         """
         return Hdf5ObjectFactory.object_metadata(self.mesh_data(key), self.metadata)
     
+    @_locked
     def store_object_metadata(self, key, metadata_dict, force_overwrite=False):
         """ Manually write metadata
 
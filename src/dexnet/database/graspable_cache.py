@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+In-memory LRU cache of graspable objects read from a database
+"""
+import collections
+import logging
+import numpy as np
+import threading
+
+from dexnet.grasping import NarrowBandSdf3D
+
+class GraspableObjectCache(object):
+    """ Least-recently-used cache of GraspableObject3D instances bounded by the number of bytes
+    in their SDF voxels and mesh arrays.
+    The surface index and SDF pyramid of an object are built lazily after it is cached, so objects are measured
+    again on every lookup and insertion and the least recently used objects are evicted when they grow.
+
+    Attributes
+    ----------
+    max_bytes : int
+        maximum number of bytes to hold in the cache
+    num_bytes : int
+        number of bytes currently held in the cache
+    hits : int
+        number of lookups that found the object in the cache
+    misses : int
+        number of lookups that did not find the object in the cache
+    evictions : int
+        number of objects removed to stay within the byte budget
+
+    Notes
+    -----
+    Cached objects are shared between all callers, so they should be treated as read-only. An object that grows
+    past the budget on its own is dropped from the cache, but the lookup that measured it still returns it.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes_ = max_bytes
+        self.num_bytes_ = 0
+        self.objects_ = collections.OrderedDict()
+        self.sizes_ = {}
+        self.lock_ = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def max_bytes(self):
+        return self.max_bytes_
+
+    @property
+    def num_bytes(self):
+        return self.num_bytes_
+
+    @property
+    def hits(self):
+        return self.hits_
+
+    @property
+    def misses(self):
+        return self.misses_
+
+    @property
+    def evictions(self):
+        return self.evictions_
+
+    @property
+    def stats(self):
+        """ :obj:`dict` : cache statistics, including the hit rate """
+        num_lookups = self.hits_ + self.misses_
+        hit_rate = 0.0
+        if num_lookups > 0:
+            hit_rate = float(self.hits_) / num_lookups
+        return {
+            'hits': self.hits_,
+            'misses': self.misses_,
+            'hit_rate': hit_rate,
+            'evictions': self.evictions_,
+            'num_objects': len(self.objects_),
+            'num_bytes': self.num_bytes_,
+            'max_bytes': self.max_bytes_
+        }
+
+    def __len__(self):
+        return len(self.objects_)
+
+    def __contains__(self, key):
+        return key in self.objects_
+
+    def reset_stats(self):
+        """ Reset the hit, miss and eviction counts """
+        self.hits_ = 0
+        self.misses_ = 0
+        self.evictions_ = 0
+
+    @staticmethod
+    def object_bytes(obj):
+        """ Number of bytes in the SDF and mesh arrays of a graspable object.
+
+        Parameters
+        ----------
+        obj : :obj:`GraspableObject3D`
+            object to measure
+
+        Returns
+        -------
+        int
+            total bytes of the SDF voxels or narrow band blocks, surface index, SDF pyramid, mesh vertices, triangles and normals, and convex pieces
+        """
+        num_bytes = 0
+        if isinstance(obj.sdf, NarrowBandSdf3D):
+            num_bytes += obj.sdf.nbytes
+        elif obj.sdf is not None:
+            num_bytes += np.asarray(obj.sdf.data).nbytes
+        if getattr(obj, 'has_surface_index', False):
+            num_bytes += obj.surface_index.nbytes
+        if getattr(obj, 'has_sdf_pyramid', False):
+            num_bytes += obj.sdf_pyramid.nbytes
+        meshes = []
+        if obj.mesh is not None:
+            meshes.append(obj.mesh)
+        if obj.convex_pieces is not None:
+            meshes.extend(obj.convex_pieces)
+        for mesh in meshes:
+            num_bytes += np.asarray(mesh.vertices).nbytes
+            num_bytes += np.asarray(mesh.triangles).nbytes
+            if mesh.normals is not None:
+                num_bytes += np.asarray(mesh.normals).nbytes
+        return num_bytes
+
+    def get(self, key):
+        """ Look up an object, marking it as most recently used.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the object
+
+        Returns
+        -------
+        :obj:`GraspableObject3D`
+            the cached object, or None if the object is not in the cache
+        """
+        with self.lock_:
+            if key not in self.objects_:
+                self.misses_ += 1
+                return None
+            obj = self.objects_.pop(key)
+            self.objects_[key] = obj
+            self.hits_ += 1
+            self._measure(key)
+            self._evict(keep_key=key)
+            return obj
+
+    def put(self, key, obj):
+        """ Add an object to the cache, evicting the least recently used objects to stay within the byte budget.
+        Objects larger than the budget are not cached.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the object
+        obj : :obj:`GraspableObject3D`
+            object to cache
+        """
+        obj_bytes = GraspableObjectCache.object_bytes(obj)
+        with self.lock_:
+            self._remove(key)
+            if obj_bytes > self.max_bytes_:
+                logging.debug('Object %s (%d bytes) exceeds cache size, not caching' %(key, obj_bytes))
+                return
+            for cached_key in self.objects_.keys():
+                self._measure(cached_key)
+            self.objects_[key] = obj
+            self.sizes_[key] = obj_bytes
+            self.num_bytes_ += obj_bytes
+            self._evict(keep_key=key)
+
+    def invalidate(self, key):
+        """ Remove an object from the cache, if present.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the object
+        """
+        with self.lock_:
+            self._remove(key)
+
+    def clear(self):
+        """ Remove all objects from the cache """
+        with self.lock_:
+            self.objects_.clear()
+            self.sizes_ = {}
+            self.num_bytes_ = 0
+
+    def _measure(self, key):
+        """ Update the size of a cached object without locking """
+        obj_bytes = GraspableObjectCache.object_bytes(self.objects_[key])
+        self.num_bytes_ += obj_bytes - self.sizes_[key]
+        self.sizes_[key] = obj_bytes
+
+    def _evict(self, keep_key=None):
+        """ Remove the least recently used objects other than keep_key until the cache is within the byte budget,
+        then keep_key itself if it alone exceeds the budget, without locking """
+        evict_keys = [k for k in self.objects_.keys() if k != keep_key]
+        while self.num_bytes_ > self.max_bytes_ and len(evict_keys) > 0:
+            self._remove(evict_keys.pop(0))
+            self.evictions_ += 1
+        if self.num_bytes_ > self.max_bytes_ and keep_key in self.objects_:
+            logging.debug('Object %s (%d bytes) exceeds cache size, removing' %(keep_key, self.sizes_[keep_key]))
+            self._remove(keep_key)
+            self.evictions_ += 1
+
+    def _remove(self, key):
+        """ Remove an object without locking """
+        if key in self.objects_:
+            del self.objects_[key]
+            self.num_bytes_ -= self.sizes_.pop(key)
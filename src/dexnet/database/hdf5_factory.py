@@ -38,26 +38,104 @@ from perception import BinaryImage, ColorImage, DepthImage, ObjectRender, Render
 import perception as f
 
 from dexnet.database.keys import *
-from dexnet.grasping import ParallelJawPtGrasp3D
+from dexnet.grasping import ParallelJawPtGrasp3D, GraspSet, SurfaceIndex
+
+# default layout of SDF and mesh datasets (contiguous, uncompressed, full precision)
+DEFAULT_STORAGE_OPTIONS = {
+    'compression': None,      # one of None, 'lzf', 'gzip'
+    'compression_level': 4,   # gzip level, from 0 to 9
+    'chunk_size': None,       # edge length of SDF chunks in voxels, None for automatic chunking when compressed
+    'quantize_sdf': False     # store SDFs as float16 normalized by a per-object scale factor
+}
 
 class Hdf5ObjectFactory(object):
     """ Functions for reading and writing new objects from HDF5 fields. Should not be called directly. """
 
+    @staticmethod
+    def storage_options(options=None):
+        """ Returns a complete dictionary of storage options, filling in defaults for unspecified options """
+        full_options = dict(DEFAULT_STORAGE_OPTIONS)
+        if options is not None:
+            for key, value in options.iteritems():
+                if key not in DEFAULT_STORAGE_OPTIONS.keys():
+                    raise ValueError('Storage option %s not supported' %(key))
+                full_options[key] = value
+        if full_options['compression'] not in [None, 'lzf', 'gzip']:
+            raise ValueError('Compression %s not supported' %(full_options['compression']))
+        return full_options
+
+    @staticmethod
+    def _dataset_kwargs(shape, storage_options=None, chunk_size=None):
+        """ Keyword arguments to h5py create_dataset implementing the given storage options """
+        options = Hdf5ObjectFactory.storage_options(storage_options)
+        kwargs = {}
+        if len(shape) == 0 or np.prod(shape) == 0:
+            # empty and scalar datasets cannot be chunked
+            return kwargs
+        if options['compression'] is not None:
+            kwargs['compression'] = options['compression']
+            kwargs['shuffle'] = True
+            if options['compression'] == 'gzip':
+                kwargs['compression_opts'] = options['compression_level']
+            kwargs['chunks'] = True
+        if chunk_size is not None:
+            kwargs['chunks'] = tuple([min(chunk_size, d) for d in shape])
+        return kwargs
+
     @staticmethod
     def sdf_3d(data):
         """ Converts HDF5 data provided in dictionary data to an SDF object """
         sdf_data = np.array(data[SDF_DATA_KEY])
         origin = np.array(data.attrs[SDF_ORIGIN_KEY])
         resolution = data.attrs[SDF_RES_KEY]
+
+        # undo quantization
+        if SDF_QUANTIZATION_SCALE_KEY in data.attrs.keys():
+            sdf_data = data.attrs[SDF_QUANTIZATION_SCALE_KEY] * sdf_data.astype(np.float32)
         
         return sdf.Sdf3D(sdf_data, origin, resolution)
 
     @staticmethod
-    def write_sdf_3d(sdf, data):
-        """ Writes sdf object to HDF5 data provided in data """
-        data.create_dataset(SDF_DATA_KEY, data=sdf.data)
+    def write_sdf_3d(sdf, data, storage_options=None):
+        """ Writes sdf object to HDF5 data provided in data, with the chunking, compression
+        and quantization given in storage_options (see DEFAULT_STORAGE_OPTIONS) """
+        options = Hdf5ObjectFactory.storage_options(storage_options)
+        sdf_data = sdf.data
+        if options['quantize_sdf']:
+            # normalize to [-1, 1] to make full use of the float16 mantissa
+            scale = float(np.max(np.abs(sdf_data)))
+            if scale == 0:
+                scale = 1.0
+            sdf_data = (sdf_data / scale).astype(np.float16)
+            data.attrs.create(SDF_QUANTIZATION_SCALE_KEY, scale)
+        kwargs = Hdf5ObjectFactory._dataset_kwargs(sdf_data.shape, options,
+                                                   chunk_size=options['chunk_size'])
+        data.create_dataset(SDF_DATA_KEY, data=sdf_data, **kwargs)
         data.attrs.create(SDF_ORIGIN_KEY, sdf.origin)
         data.attrs.create(SDF_RES_KEY, sdf.resolution)
+
+    @staticmethod
+    def surface_index(data, sdf):
+        """ Converts HDF5 data provided in dictionary data to a surface index of the given SDF.
+        The SDF gradients are only read if they were stored, and are otherwise computed on first use """
+        surface_mask = np.array(data[SURFACE_MASK_KEY])
+        gradients = None
+        if SURFACE_GRADIENTS_KEY in data.keys():
+            gradients = np.array(data[SURFACE_GRADIENTS_KEY])
+        return SurfaceIndex.from_surface_mask(sdf, surface_mask, gradients=gradients)
+
+    @staticmethod
+    def write_surface_index(surface_index, data, storage_options=None, with_gradients=False):
+        """ Writes the surface mask and, if with_gradients is set, the SDF gradients of a surface index to HDF5 data
+        provided in data, with the chunking and compression given in storage_options """
+        options = Hdf5ObjectFactory.storage_options(storage_options)
+        arrays = [(SURFACE_MASK_KEY, surface_index.surface_mask)]
+        if with_gradients:
+            arrays.append((SURFACE_GRADIENTS_KEY, surface_index.gradients))
+        for key, array in arrays:
+            kwargs = Hdf5ObjectFactory._dataset_kwargs(array.shape, options,
+                                                       chunk_size=options['chunk_size'])
+            data.create_dataset(key, data=array, **kwargs)
         
     @staticmethod
     def mesh_3d(data):
@@ -71,12 +149,15 @@ class Hdf5ObjectFactory(object):
         return mesh.Mesh3D(vertices, triangles, normals=normals)
 
     @staticmethod
-    def write_mesh_3d(mesh, data):
-        """ Writes mesh object to HDF5 data provided in data """
-        data.create_dataset(MESH_VERTICES_KEY, data=mesh.vertices)
-        data.create_dataset(MESH_TRIANGLES_KEY, data=mesh.triangles)
+    def write_mesh_3d(mesh, data, storage_options=None):
+        """ Writes mesh object to HDF5 data provided in data, with the compression given in storage_options """
+        arrays = [(MESH_VERTICES_KEY, np.asarray(mesh.vertices)),
+                  (MESH_TRIANGLES_KEY, np.asarray(mesh.triangles))]
         if mesh.normals is not None:
-            data.create_dataset(MESH_NORMALS_KEY, data=mesh.normals)
+            arrays.append((MESH_NORMALS_KEY, np.asarray(mesh.normals)))
+        for key, array in arrays:
+            kwargs = Hdf5ObjectFactory._dataset_kwargs(array.shape, storage_options)
+            data.create_dataset(key, data=array, **kwargs)
 
     @staticmethod
     def stable_poses(data):
@@ -151,9 +232,35 @@ class Hdf5ObjectFactory(object):
 
         return grasps
 
+    @staticmethod
+    def grasp_set(data):
+        """ Return a GraspSet of the parallel-jaw grasps in the HDF5 dictionary, without creating a grasp object for each """
+        configurations = []
+        grasp_ids = []
+        frame = 'object'
+        num_grasps = data.attrs[NUM_GRASPS_KEY]
+        for i in range(num_grasps):
+            grasp_key = GRASP_KEY + '_' + str(i)
+            if grasp_key in data.keys():
+                grasp_attrs = data[grasp_key].attrs
+                if grasp_attrs[GRASP_TYPE_KEY] != 'ParallelJawPtGrasp3D':
+                    continue
+                configuration = np.zeros(10)
+                grasp_configuration = grasp_attrs[GRASP_CONFIGURATION_KEY]
+                configuration[:grasp_configuration.shape[0]] = grasp_configuration
+                configurations.append(configuration)
+                grasp_ids.append(grasp_attrs[GRASP_ID_KEY])
+                frame = grasp_attrs[GRASP_RF_KEY]
+            else:
+                logging.debug('Grasp %s is corrupt. Skipping' %(grasp_key))
+
+        if len(configurations) == 0:
+            return GraspSet.from_configurations(np.zeros([0, 10]), frame=frame)
+        return GraspSet.from_configurations(np.array(configurations), ids=grasp_ids, frame=frame)
+
     @staticmethod
     def write_grasps(grasps, data, force_overwrite=False):
-        """ Writes grasps to HDF5 data provided in data """
+        """ Writes grasps, given as a list or GraspSet, to HDF5 data provided in data """
         num_grasps = data.attrs[NUM_GRASPS_KEY]
         num_new_grasps = len(grasps)
 
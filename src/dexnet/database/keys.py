@@ -38,6 +38,10 @@ MASS_KEY = 'mass'
 CONVEX_PIECES_KEY = 'convex_pieces'
 
 CREATION_KEY = 'time_created'
+STORAGE_COMPRESSION_KEY = 'storage_compression'
+STORAGE_COMPRESSION_LEVEL_KEY = 'storage_compression_level'
+STORAGE_CHUNK_SIZE_KEY = 'storage_chunk_size'
+STORAGE_QUANTIZE_SDF_KEY = 'storage_quantize_sdf'
 DATASETS_KEY = 'datasets'
 DATASET_KEY = 'dataset'
 
@@ -48,6 +52,11 @@ SDF_RES_KEY = 'resolution'
 SDF_POSE_KEY = 'pose'
 SDF_SCALE_KEY = 'scale'
 SDF_FRAME_KEY = 'frame'
+SDF_QUANTIZATION_SCALE_KEY = 'quantization_scale'
+
+SURFACE_INDEX_KEY = 'surface_index'
+SURFACE_MASK_KEY = 'surface_mask'
+SURFACE_GRADIENTS_KEY = 'gradients'
 
 MESH_VERTICES_KEY = 'vertices'
 MESH_TRIANGLES_KEY = 'triangles'
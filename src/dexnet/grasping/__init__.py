@@ -19,14 +19,19 @@ PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
 HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
 MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """
+from narrow_band_sdf import NarrowBandSdf3D
 from contacts import Contact3D, SurfaceWindow
+from surface_index import SurfaceIndex
+from sdf_pyramid import SdfPyramid
 from graspable_object import GraspableObject, GraspableObject3D
 from grasp import Grasp, PointGrasp, ParallelJawPtGrasp3D
+from grasp_set import GraspSet
 from gripper import RobotGripper
 from grasp_quality_config import GraspQualityConfig, QuasiStaticGraspQualityConfig, RobustQuasiStaticGraspQualityConfig, GraspQualityConfigFactory
 from quality import PointGraspMetrics3D
 from random_variables import GraspableObjectPoseGaussianRV, ParallelJawGraspPoseGaussianRV, ParamsGaussianRV
 from robust_grasp_quality import QuasiStaticGraspQualityRV, RobustPointGraspMetrics3D
+from quality_cache import GraspQualityCache
 from grasp_quality_function import GraspQualityResult, GraspQualityFunction, QuasiStaticQualityFunction, RobustQuasiStaticQualityFunction, GraspQualityFunctionFactory
 
 try:
@@ -37,12 +42,12 @@ except Exception:
 
 from grasp_sampler import GraspSampler, UniformGraspSampler, GaussianGraspSampler, AntipodalGraspSampler
 
-__all__ = ['Contact3D', 'GraspableObject', 'GraspableObject3D', 'ParallelJawPtGrasp3D',
+__all__ = ['NarrowBandSdf3D', 'Contact3D', 'SurfaceIndex', 'SdfPyramid', 'GraspableObject', 'GraspableObject3D', 'ParallelJawPtGrasp3D', 'GraspSet',
            'Grasp', 'PointGrasp', 'RobotGripper', 'PointGraspMetrics3D',
            'GraspQualityConfig', 'QuasiStaticGraspQualityConfig', 'RobustQuasiStaticGraspQualityConfig', 'GraspQualityConfigFactory',
            'GraspSampler', 'UniformGraspSampler', 'GaussianGraspSampler', 'AntipodalGraspSampler',
            'GraspableObjectPoseGaussianRV', 'ParallelJawGraspPoseGaussianRV', 'ParamsGaussianRV',
-           'QuasiStaticGraspQualityRV', 'RobustPointGraspMetrics3D',
+           'QuasiStaticGraspQualityRV', 'RobustPointGraspMetrics3D', 'GraspQualityCache',
            'GraspQualityResult', 'GraspQualityFunction', 'QuasiStaticQualityFunction', 'RobustQuasiStaticQualityFunction', 'GraspQualityFunctionFactory',
            'OpenRaveCollisionChecker', 'GraspCollisionChecker',
 ]
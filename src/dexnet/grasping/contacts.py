@@ -165,17 +165,11 @@ class Contact3D(Contact):
 
         # redefine tangent x axis to automatically align with the object x axis
         if align_axes:
-            max_ip = 0
             max_theta = 0
-            target = np.array([1,0,0])
-            theta = 0
-            d_theta = 2 * np.pi / float(max_samples)
-            for i in range(max_samples):
-                v = np.cos(theta) * x + np.sin(theta) * y
-                if v.dot(target) > max_ip:
-                    max_ip = v.dot(target)
-                    max_theta = theta
-                theta = theta + d_theta
+            thetas = 2 * np.pi * np.arange(max_samples) / float(max_samples)
+            ips = np.cos(thetas) * x[0] + np.sin(thetas) * y[0]
+            if np.max(ips) > 0:
+                max_theta = thetas[np.argmax(ips)]
 
             v = np.cos(max_theta) * x + np.sin(max_theta) * y
             w = np.cross(direction.ravel(), v)
@@ -325,17 +319,73 @@ class Contact3D(Contact):
             return False
 
         scales = np.linspace(-width / 2.0, width / 2.0, num_steps)
-        window = np.zeros(num_steps**2)
-        for i, (c1, c2) in enumerate(it.product(scales, repeat=2)):
-            curr_loc = self.point + c1 * t1 + c2 * t2
-            curr_loc_grid = self.graspable.sdf.transform_pt_obj_to_grid(curr_loc)
-            if self.graspable.sdf.is_out_of_bounds(curr_loc_grid):
-                window[i] = -1e-2
-                continue
-
-            window[i] = self.graspable.sdf[curr_loc_grid]
+        c1, c2 = np.meshgrid(scales, scales, indexing='ij')
+        window_pts = self.point + np.outer(c1.ravel(), t1) + np.outer(c2.ravel(), t2)
+        window_pts_grid = self.graspable.sdf.transform_pt_obj_to_grid(window_pts.T)
+
+        # interpolate the sdf at all window points at once
+        window = self._sdf_values(window_pts_grid)
+        window[self._out_of_bounds(window_pts_grid)] = -1e-2
         return window.reshape((num_steps, num_steps))
 
+    def _sdf_values(self, pts_grid):
+        """ Trilinearly interpolates the sdf at a 3xN array of grid coordinates, snapping points to the grid """
+        return self.graspable.surface_index.interpolate(pts_grid)
+
+    def _out_of_bounds(self, pts_grid):
+        """ Returns a mask of the points in a 3xN array of grid coordinates that lie outside the sdf grid """
+        dims = np.array(self.graspable.sdf.dims_).reshape(3, 1)
+        return np.any(pts_grid < 0, axis=0) | np.any(pts_grid >= dims, axis=0)
+
+    def _cast_window_rays(self, window_pts, direction, max_projection, back_up, num_samples):
+        """ Marches rays from each window point along direction through the sdf at once and finds the first
+        zero crossing of each, interpolating linearly between samples.
+        Rays start one voxel behind the backed up point so that window points on the surface are found.
+
+        Parameters
+        ----------
+        window_pts : Nx3 :obj:`numpy.ndarray`
+            points on the tangent plane in obj frame
+        direction : 3x1 :obj:`numpy.ndarray`
+            normalized direction to cast the rays along in obj frame
+        max_projection : float
+            maximum distance to search forward for a contact (meters)
+        back_up : float
+            distance to back up before searching for a contact (meters)
+        num_samples : int
+            number of sdf samples along each ray
+
+        Returns
+        -------
+        found : :obj:`numpy.ndarray` of bool
+            whether or not each ray hit the surface
+        projections : :obj:`numpy.ndarray`
+            signed distance along direction from each window point to the surface
+        """
+        num_pts = window_pts.shape[0]
+        num_samples = max(num_samples, 2)
+        direction = direction / np.linalg.norm(direction)
+        dists = np.linspace(-back_up - self.graspable.sdf.resolution, max_projection, num_samples)
+
+        # the grid transform is affine, so rays can be sampled in grid coordinates directly
+        window_pts_grid = self.graspable.sdf.transform_pt_obj_to_grid(window_pts.T)
+        direction_grid = self.graspable.sdf.transform_pt_obj_to_grid(direction, direction=True)
+        dists_grid = dists * self.graspable.sdf.transform_pt_obj_to_grid(1.0)
+        ray_pts_grid = window_pts_grid[:,:,np.newaxis] + np.outer(direction_grid, dists_grid)[:,np.newaxis,:]
+        sdf_vals = self._sdf_values(ray_pts_grid.reshape(3, -1)).reshape(num_pts, num_samples)
+
+        # first sign change along each ray
+        inside = sdf_vals <= 0
+        crossings = inside[:,1:] != inside[:,:-1]
+        found = np.any(crossings, axis=1)
+        crossing_ind = np.argmax(crossings, axis=1)
+        rows = np.arange(num_pts)
+        sdf_before = sdf_vals[rows, crossing_ind]
+        sdf_after = sdf_vals[rows, crossing_ind + 1]
+        alpha = sdf_before / np.where(found, sdf_before - sdf_after, 1.0)
+        projections = dists[crossing_ind] + alpha * (dists[1] - dists[0])
+        return found, projections
+
     def _compute_surface_window_projection(self, u1=None, u2=None, width=1e-2,
         num_steps=21, max_projection=0.1, back_up=0, samples_per_grid=2.0,
         sigma_range=0.1, sigma_spatial=1, direction=None, vis=False, compute_weighted_covariance=False, 
@@ -368,7 +418,6 @@ class Contact3D(Contact):
         # number of samples used when looking for contacts
         no_contact = NO_CONTACT_DIST
         num_samples = int(samples_per_grid * (max_projection + back_up) / self.graspable.sdf.resolution)
-        window = np.zeros(num_steps**2)
 
         res = width / num_steps
         scales = np.linspace(-width / 2.0 + res / 2.0, width / 2.0 - res / 2.0, num_steps)
@@ -382,49 +431,29 @@ class Contact3D(Contact):
                     p = (r * np.cos(theta), r * np.sin(theta))
                     scales_it.append(p)
 
-        # start computing weighted covariance matrix
-        if compute_weighted_covariance:
-            cov = np.zeros((3, 3))
-            cov_weight = 0
+        # project all window points onto the surface at once
+        c1, c2 = np.array(list(scales_it)).T
+        window_pts = self.point + np.outer(c1, t1) + np.outer(c2, t2)
+        window_pts_grid = self.graspable.sdf.transform_pt_obj_to_grid(window_pts.T)
+        found, projections = self._cast_window_rays(window_pts, direction, max_projection, back_up, num_samples)
+        found = found & ~self._out_of_bounds(window_pts_grid)
+        logging.debug('%d of %d window points not found.' %(np.sum(~found), found.shape[0]))
+        window = np.where(found, np.minimum(projections, max_projection), no_contact)
 
         if vis:
             ax = plt.gca(projection = '3d')
             self.graspable_.sdf.scatter()
-
-        for i, (c1, c2) in enumerate(scales_it):
-            curr_loc = self.point + c1 * t1 + c2 * t2
-            curr_loc_grid = self.graspable.sdf.transform_pt_obj_to_grid(curr_loc)
-            if self.graspable.sdf.is_out_of_bounds(curr_loc_grid):
-                window[i] = no_contact
-                continue
-
-            if vis:
-                ax.scatter(curr_loc_grid[0], curr_loc_grid[1], curr_loc_grid[2], s=130, c=u'y')
-
-            found, projection_contact = self.graspable._find_projection(
-                curr_loc, direction, max_projection, back_up, num_samples, vis=vis)
-
-            if found:
-                # logging.debug('%d found.' %(i))
-                sign = direction.dot(projection_contact.point - curr_loc)
-                projection = (sign / abs(sign)) * np.linalg.norm(projection_contact.point - curr_loc)
-                projection = min(projection, max_projection)
-
-                if compute_weighted_covariance:
-                    # weight according to SHOT: R - d_i
-                    weight = width / np.sqrt(2) - np.sqrt(c1**2 + c2**2)
-                    diff = (projection_contact.point - self.point).reshape((3, 1))
-                    cov += weight * np.dot(diff, diff.T)
-                    cov_weight += weight
-            else:
-                logging.debug('%d not found.' %(i))
-                projection = no_contact
-
-            window[i] = projection
-
-        if vis:
+            ax.scatter(window_pts_grid[0,:], window_pts_grid[1,:], window_pts_grid[2,:], s=130, c=u'y')
             plt.show()
 
+        # weighted covariance of the contact points, weighted according to SHOT: R - d_i
+        if compute_weighted_covariance:
+            weights = width / np.sqrt(2) - np.sqrt(c1[found]**2 + c2[found]**2)
+            direction = direction / np.linalg.norm(direction)
+            diffs = window_pts[found] + projections[found,np.newaxis] * direction - self.point
+            cov = np.dot(weights * diffs.T, diffs)
+            cov_weight = np.sum(weights)
+
         if not disc:
             window = window.reshape((num_steps, num_steps)).T # transpose to make x-axis along columns
             if debug_objs is not None:
@@ -598,15 +627,9 @@ class Contact3D(Contact):
         hess_x = np.gradient(grad_win[0])
         hess_y = np.gradient(grad_win[1])
 
-        gauss_curvature = np.zeros(proj_window.shape)
-        for i in range(num_steps):
-            for j in range(num_steps):
-                local_hess = np.array([[hess_x[0][i, j], hess_x[1][i, j]],
-                                       [hess_y[0][i, j], hess_y[1][i, j]]])
-                # symmetrize
-                local_hess = (local_hess + local_hess.T) / 2.0
-                # curvature
-                gauss_curvature[i, j] = np.linalg.det(local_hess)
+        # curvature from the determinant of the symmetrized hessian at each pixel
+        hess_xy = (hess_x[1] + hess_y[0]) / 2.0
+        gauss_curvature = hess_x[0] * hess_y[1] - hess_xy**2
 
         return SurfaceWindow(proj_window, grad_win, hess_x, hess_y, gauss_curvature)
 
@@ -400,22 +400,40 @@ class ParallelJawPtGrasp3D(PointGrasp):
         phi : float
             grasp x axis rotation from z axis in stable pose
         """
-        T_grasp_obj = self.T_grasp_obj
+        table_normal = ParallelJawPtGrasp3D.table_normal(stable_pose)
+        grasp_axis_angles, grasp_approach_angles, nus = \
+            ParallelJawPtGrasp3D.grasp_angles_from_table_normals(self.rotated_full_axis[np.newaxis,...],
+                                                                 table_normal[np.newaxis,:])
+        return grasp_axis_angles[0,0], grasp_approach_angles[0,0], nus[0,0]
 
-        if isinstance(stable_pose, StablePose):
-            R_stp_obj = stable_pose.r
-        else:
-            R_stp_obj = stable_pose.rotation            
-        T_stp_obj = RigidTransform(R_stp_obj, from_frame='obj', to_frame='stp')
-
-        T_stp_grasp = T_stp_obj * T_grasp_obj
+    @staticmethod
+    def grasp_angles_from_table_normals(R_grasp_obj, table_normals):
+        """ Get the angles of many grasps from many table planes at once (see grasp_angles_from_stp_z).
+        The z axis of a stable pose frame is the table normal in the object frame, so each angle
+        only requires the dot product of a grasp frame axis with a table normal.
 
-        stp_z = np.array([0,0,1])
-        grasp_axis_angle = np.arccos(stp_z.dot(T_stp_grasp.y_axis))
-        grasp_approach_angle = np.arccos(abs(stp_z.dot(T_stp_grasp.x_axis)))
-        nu = stp_z.dot(T_stp_grasp.z_axis)
+        Parameters
+        ----------
+        R_grasp_obj : :obj:`numpy.ndarray`
+            Nx3x3 rotations from the grasp frames to the object frame (e.g. GraspSet.rotated_full_axes)
+        table_normals : :obj:`numpy.ndarray`
+            Px3 table normals in the object frame, which are the last rows of the stable pose rotations
 
-        return grasp_axis_angle, grasp_approach_angle, nu
+        Returns
+        -------
+        grasp_axis_angles : :obj:`numpy.ndarray`
+            NxP angles between the grasp y axes and the table normals
+        grasp_approach_angles : :obj:`numpy.ndarray`
+            NxP angles between the grasp x axes and the table normals, up to sign
+        nus : :obj:`numpy.ndarray`
+            NxP dot products of the grasp z axes with the table normals
+        """
+        # dot products of every grasp axis with every table normal, indexed by grasp, pose, and axis
+        axis_dots = np.einsum('nij,pi->npj', R_grasp_obj, table_normals)
+        grasp_axis_angles = np.arccos(np.clip(axis_dots[:,:,1], -1, 1))
+        grasp_approach_angles = np.arccos(np.clip(np.abs(axis_dots[:,:,0]), 0, 1))
+        nus = axis_dots[:,:,2]
+        return grasp_axis_angles, grasp_approach_angles, nus
 
     def close_fingers(self, obj, vis = False, check_approach=True, approach_dist = 0.2):
         """ Steps along grasp axis to find the locations of contact with an object
@@ -525,6 +543,7 @@ class ParallelJawPtGrasp3D(PointGrasp):
     def find_contact(line_of_action, obj, vis=True):
         """
         Find the point at which a point traveling along a given line of action hits a surface.
+        Points that the object's SDF pyramid shows are off the surface are skipped without querying the SDF.
 
         Parameters
         ----------
@@ -548,18 +567,19 @@ class ParallelJawPtGrasp3D(PointGrasp):
         contact = None
         num_pts = len(line_of_action)
         sdf_here = 0
-        sdf_before = 0
         pt_grid = None
-        pt_before = None
+
+        # coarse-to-fine search for the points whose cells the surface may pass through
+        # the pyramid is built on first use, from the blocks for narrow band SDFs so their full grid is never rebuilt
+        candidates = np.arange(num_pts)
+        if isinstance(obj, GraspableObject3D):
+            near_surface = obj.sdf_pyramid.near_surface(np.array(line_of_action).T)
+            candidates = candidates[near_surface]
 
         # step along line of action, get points on surface when possible
-        i = 0
-        while i < num_pts and not contact_found:
-            # update loop vars
-            pt_before_before = pt_before
-            pt_before = pt_grid
-            sdf_before_before = sdf_before
-            sdf_before = sdf_here
+        k = 0
+        while k < candidates.shape[0] and not contact_found:
+            i = candidates[k]
             pt_grid = line_of_action[i]
 
             # visualize
@@ -587,12 +607,18 @@ class ParallelJawPtGrasp3D(PointGrasp):
 
 
                 elif i == len(line_of_action) - 1:
+                    pt_before = line_of_action[i-1]
+                    sdf_before = obj.sdf[pt_before]
+                    pt_before_before = line_of_action[i-2]
+                    sdf_before_before = obj.sdf[pt_before_before]
                     pt_zc = Sdf3D.find_zero_crossing_quadratic(pt_before_before, sdf_before_before, pt_before, sdf_before, pt_grid, sdf_here)
 
                     if pt_zc is None:
                         contact_found = False
 
                 else:
+                    pt_before = line_of_action[i-1]
+                    sdf_before = obj.sdf[pt_before]
                     pt_after = line_of_action[i+1]
                     sdf_after = obj.sdf[pt_after]
                     pt_zc = Sdf3D.find_zero_crossing_quadratic(pt_before, sdf_before, pt_grid, sdf_here, pt_after, sdf_after)
@@ -600,7 +626,7 @@ class ParallelJawPtGrasp3D(PointGrasp):
                     # contact not yet found if next sdf value is smaller
                     if pt_zc is None or (np.sign(sdf_after) == np.sign(sdf_here) and np.abs(sdf_after) < np.abs(sdf_here)):
                         contact_found = False
-            i = i+1
+            k = k+1
 
         # visualization
         if vis and contact_found:
@@ -617,34 +643,84 @@ class ParallelJawPtGrasp3D(PointGrasp):
                 contact_found = False
         return contact_found, contact
         
+    @staticmethod
+    def table_normal(stable_pose):
+        """ Returns the normal of the table in the object frame for a stable pose.
+
+        Parameters
+        ----------
+        stable_pose : :obj:`StablePose` or :obj:`RigidTransform`
+            the pose specifying the orientation of the table
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            3-vector normal to the table
+        """
+        if isinstance(stable_pose, StablePose):
+            return stable_pose.r[2,:]
+        return stable_pose.rotation[2,:]
+
+    @staticmethod
+    def perpendicular_approach_angles(normals):
+        """ Approach angles that point the grasp approach axis along the given directions as closely as possible.
+        At approach angle theta the approach axis is (cos theta, 0, sin theta) in the unrotated grasp frame,
+        so its dot product with a direction (a, b, c) is a*cos(theta) + c*sin(theta), which is maximized at atan2(c, a).
+
+        Parameters
+        ----------
+        normals : :obj:`numpy.ndarray`
+            array of 3-vector directions in the unrotated grasp frames, with the coordinates in the last dimension
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            approach angles in [0, 2*pi) for each direction
+        """
+        return np.mod(np.arctan2(normals[...,2], normals[...,0]), 2*np.pi)
+
+    @staticmethod
+    def parallel_approach_angles(normals):
+        """ Approach angles that make the grasp approach axis orthogonal to the given directions.
+        The dot product a*cos(theta) + c*sin(theta) with a direction (a, b, c) in the unrotated grasp frame
+        is zero at atan2(-a, c) and at that angle plus pi, and the root in [0, pi) is returned.
+
+        Parameters
+        ----------
+        normals : :obj:`numpy.ndarray`
+            array of 3-vector directions in the unrotated grasp frames, with the coordinates in the last dimension
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            approach angles in [0, pi) for each direction
+        """
+        return np.mod(np.arctan2(-normals[...,0], normals[...,2]), np.pi)
+
     def _angle_aligned_with_stable_pose(self, stable_pose):
         """
         Returns the y-axis rotation angle that'd allow the current pose to align with stable pose.
         """    
-        def _argmin(f, a, b, n):
-            #finds the argmax x of f(x) in the range [a, b) with n samples
-            delta = (b - a) / n
-            min_y = f(a)
-            min_x = a
-            for i in range(1, n):
-                x = i * delta
-                y = f(x)
-                if y <= min_y:
-                    min_y = y
-                    min_x = x
-            return min_x
-    
-        def _get_matrix_product_x_axis(grasp_axis, normal):
-            def matrix_product(theta):
-                R = ParallelJawPtGrasp3D._get_rotation_matrix_y(theta)
-                grasp_axis_rotated = np.dot(R, grasp_axis)
-                return abs(np.dot(normal, grasp_axis_rotated))
-            return matrix_product
-    
-        stable_pose_normal = stable_pose.r[2,:]
-        
-        theta = _argmin(_get_matrix_product_x_axis(np.array([1,0,0]), np.dot(inv(self.unrotated_full_axis), stable_pose_normal)), 0, 2*np.pi, 1000)
-        return theta
+        stable_pose_normal = ParallelJawPtGrasp3D.table_normal(stable_pose)
+        normal = self.unrotated_full_axis.T.dot(stable_pose_normal)
+        return float(ParallelJawPtGrasp3D.parallel_approach_angles(normal))
+
+    def with_approach_angle(self, theta):
+        """ Return a copy of the grasp with the given approach angle.
+
+        Parameters
+        ----------
+        theta : float
+            approach angle for the new grasp
+
+        Returns
+        -------
+        :obj:`ParallelJawPtGrasp3D`
+            grasp with the given approach angle
+        """
+        configuration = ParallelJawPtGrasp3D.configuration_from_params(self.center_, self.axis_, self.max_grasp_width_,
+                                                                       theta, self.jaw_width_, self.min_grasp_width_)
+        return ParallelJawPtGrasp3D(configuration, frame=self.frame_, grasp_id=self.grasp_id_)
 
     def grasp_y_axis_offset(self, theta):
         """ Return a new grasp with the given approach angle.
@@ -659,9 +735,7 @@ class ParallelJawPtGrasp3D(PointGrasp):
         :obj:`ParallelJawPtGrasp3D`
             grasp with the given approach angle
         """
-        new_grasp = deepcopy(self)
-        new_grasp.approach_angle = theta + self.approach_angle
-        return new_grasp
+        return self.with_approach_angle(theta + self.approach_angle)
         
     def parallel_table(self, stable_pose):
         """
@@ -669,7 +743,7 @@ class ParallelJawPtGrasp3D(PointGrasp):
 
         Parameters
         ----------
-        stable_pose : :obj:`StablePose`
+        stable_pose : :obj:`StablePose` or :obj:`RigidTransform`
             the pose specifying the table
 
         Returns
@@ -678,36 +752,14 @@ class ParallelJawPtGrasp3D(PointGrasp):
             aligned grasp
         """
         theta = self._angle_aligned_with_stable_pose(stable_pose)
-        new_grasp = deepcopy(self)
-        new_grasp.approach_angle = theta
-        return new_grasp
+        return self.with_approach_angle(theta)
 
     def _angle_aligned_with_table(self, table_normal):
         """
         Returns the y-axis rotation angle that'd allow the current pose to align with the table normal.
         """
-        def _argmax(f, a, b, n):
-            #finds the argmax x of f(x) in the range [a, b) with n samples
-            delta = (b - a) / n
-            max_y = f(a)
-            max_x = a
-            for i in range(1, n):
-                x = i * delta
-                y = f(x)
-                if y >= max_y:
-                    max_y = y
-                    max_x = x
-            return max_x
-    
-        def _get_matrix_product_x_axis(grasp_axis, normal):
-            def matrix_product(theta):
-                R = ParallelJawPtGrasp3D._get_rotation_matrix_y(theta)
-                grasp_axis_rotated = np.dot(R, grasp_axis)
-                return np.dot(normal, grasp_axis_rotated)
-            return matrix_product
-    
-        theta = _argmax(_get_matrix_product_x_axis(np.array([1,0,0]), np.dot(inv(self.unrotated_full_axis), -table_normal)), 0, 2*np.pi, 64)        
-        return theta
+        normal = self.unrotated_full_axis.T.dot(-table_normal)
+        return float(ParallelJawPtGrasp3D.perpendicular_approach_angles(normal))
 
     def perpendicular_table(self, stable_pose):
         """
@@ -723,14 +775,9 @@ class ParallelJawPtGrasp3D(PointGrasp):
         :obj:`ParallelJawPtGrasp3D`
             aligned grasp
         """
-        if isinstance(stable_pose, StablePose):
-            table_normal = stable_pose.r[2,:]
-        else:
-            table_normal = stable_pose.rotation[2,:]
+        table_normal = ParallelJawPtGrasp3D.table_normal(stable_pose)
         theta = self._angle_aligned_with_table(table_normal)
-        new_grasp = deepcopy(self)
-        new_grasp.approach_angle = theta
-        return new_grasp
+        return self.with_approach_angle(theta)
 
     def project_camera(self, T_obj_camera, camera_intr):
         """ Project a grasp for a given gripper into the camera specified by a set of intrinsics.
@@ -39,7 +39,7 @@ import scipy.stats
 import sys
 import time
 
-from dexnet.grasping import Grasp, GraspableObject, GraspQualityConfig, RobustPointGraspMetrics3D, GraspableObjectPoseGaussianRV, ParallelJawGraspPoseGaussianRV, ParamsGaussianRV, PointGraspMetrics3D
+from dexnet.grasping import Grasp, GraspableObject, GraspQualityConfig, RobustPointGraspMetrics3D, GraspableObjectPoseGaussianRV, ParallelJawGraspPoseGaussianRV, ParamsGaussianRV, PointGraspMetrics3D, GraspQualityCache
 
 from autolab_core import RigidTransform
 import IPython
@@ -70,10 +70,12 @@ class GraspQualityFunction(object):
         object to evaluate grasp quality on
     quality_config : :obj:`GraspQualityConfig`
         set of parameters to evaluate grasp quality
+    quality_cache : :obj:`GraspQualityCache`
+        persistent cache of quality results, or None to always compute the quality
     """
     __metaclass__ = ABCMeta
 
-    def __init__(self, graspable, quality_config):
+    def __init__(self, graspable, quality_config, quality_cache=None):
         # check valid types
         if not isinstance(graspable, GraspableObject):
             raise ValueError('Must provide GraspableObject')
@@ -83,11 +85,75 @@ class GraspQualityFunction(object):
         # set member variables
         self.graspable_ = graspable
         self.quality_config_ = quality_config
+        self.quality_cache_ = quality_cache
+        self.object_digest_ = None
+
+        # hash the config before any evaluation adds derived parameters to it
+        self.config_digest_ = None
+        if quality_cache is not None:
+            self.config_digest_ = GraspQualityCache.config_digest(quality_config)
 
         self._setup()
 
     def __call__(self, grasp):
-        return self.quality(grasp)
+        if self.quality_cache_ is None:
+            return self.quality(grasp)
+
+        # look up the result by the grasp, object and current config
+        if self.object_digest_ is None:
+            self.object_digest_ = self._object_digest()
+        key = GraspQualityCache.key(grasp, self.object_digest_, self.config_digest_)
+        quality, uncertainty = self.quality_cache_.get(key)
+        if quality is not None:
+            return GraspQualityResult(quality, uncertainty, quality_config=self.quality_config_)
+
+        result = self.quality(grasp)
+        self.quality_cache_.put(key, result.quality, result.uncertainty)
+        return result
+
+    def evaluate_batch(self, grasps):
+        """ Computes the quality of many grasps, reading cached results and computing the rest together with quality_batch.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`Grasp`
+            grasps to compute the quality of
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspQualityResult`
+            result of quality computation for each grasp
+        """
+        if self.quality_cache_ is None:
+            return self.quality_batch(grasps)
+
+        # look up the results by the grasps, object and current config
+        if self.object_digest_ is None:
+            self.object_digest_ = self._object_digest()
+        keys = [GraspQualityCache.key(grasp, self.object_digest_, self.config_digest_) for grasp in grasps]
+        results = [None] * len(grasps)
+        uncached_inds = []
+        for i, key in enumerate(keys):
+            quality, uncertainty = self.quality_cache_.get(key)
+            if quality is not None:
+                results[i] = GraspQualityResult(quality, uncertainty, quality_config=self.quality_config_)
+            else:
+                uncached_inds.append(i)
+
+        # compute the rest
+        uncached_results = self.quality_batch([grasps[i] for i in uncached_inds])
+        for i, result in zip(uncached_inds, uncached_results):
+            self.quality_cache_.put(keys[i], result.quality, result.uncertainty)
+            results[i] = result
+        return results
+
+    @property
+    def quality_cache(self):
+        return self.quality_cache_
+
+    def _object_digest(self):
+        """ Digest of the object for the quality cache """
+        return GraspQualityCache.object_digest(self.graspable_)
 
     @abstractmethod
     def _setup(self):
@@ -109,12 +175,27 @@ class GraspQualityFunction(object):
             result of quality computation
         """
         pass
+
+    def quality_batch(self, grasps):
+        """ Compute the quality of many grasps. Computes each grasp with quality unless overridden.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`Grasp`
+            grasps to compute the quality of
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspQualityResult`
+            result of quality computation for each grasp
+        """
+        return [self.quality(grasp) for grasp in grasps]
         
 class QuasiStaticQualityFunction(GraspQualityFunction):
     """ Grasp quality metric using a quasi-static model.
     """
-    def __init__(self, graspable, quality_config):
-        GraspQualityFunction.__init__(self, graspable, quality_config)
+    def __init__(self, graspable, quality_config, quality_cache=None):
+        GraspQualityFunction.__init__(self, graspable, quality_config, quality_cache=quality_cache)
 
     @property
     def graspable(self):
@@ -123,6 +204,7 @@ class QuasiStaticQualityFunction(GraspQualityFunction):
     @graspable.setter
     def graspable(self, obj):
         self.graspable_ = obj
+        self.object_digest_ = None
 
     def _setup(self):
         if self.quality_config_.quality_type != 'quasi_static':
@@ -148,12 +230,34 @@ class QuasiStaticQualityFunction(GraspQualityFunction):
                                                     self.quality_config_)
         return GraspQualityResult(quality, quality_config=self.quality_config_)
 
+    def quality_batch(self, grasps):
+        """ Compute the quality of many grasps using a quasistatic method, solving their wrench programs together.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`Grasp`
+            grasps to compute the quality of
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspQualityResult`
+            result of quality computation for each grasp
+        """
+        for grasp in grasps:
+            if not isinstance(grasp, Grasp):
+                raise ValueError('Must provide Grasp object to compute quality')
+
+        qualities = PointGraspMetrics3D.grasp_quality_batch(grasps, self.graspable_,
+                                                            self.quality_config_)
+        return [GraspQualityResult(quality, quality_config=self.quality_config_) for quality in qualities]
+
 class RobustQuasiStaticQualityFunction(GraspQualityFunction):
     """ Grasp quality metric using a robust quasi-static model (average over random perturbations)
     """
-    def __init__(self, graspable, quality_config, T_obj_world=RigidTransform(from_frame='obj', to_frame='world')):
+    def __init__(self, graspable, quality_config, T_obj_world=RigidTransform(from_frame='obj', to_frame='world'),
+                 quality_cache=None):
         self.T_obj_world_ = T_obj_world
-        GraspQualityFunction.__init__(self, graspable, quality_config)
+        GraspQualityFunction.__init__(self, graspable, quality_config, quality_cache=quality_cache)
 
     @property
     def graspable(self):
@@ -162,8 +266,12 @@ class RobustQuasiStaticQualityFunction(GraspQualityFunction):
     @graspable.setter
     def graspable(self, obj):
         self.graspable_ = obj
+        self.object_digest_ = None
         self._setup()
 
+    def _object_digest(self):
+        return GraspQualityCache.object_digest(self.graspable_, T_obj_world=self.T_obj_world_)
+
     def _setup(self):
         if self.quality_config_.quality_type != 'robust_quasi_static':
             raise ValueError('Quality configuration must be robust quasi static')
@@ -198,7 +306,7 @@ class RobustQuasiStaticQualityFunction(GraspQualityFunction):
 
 class GraspQualityFunctionFactory:
     @staticmethod
-    def create_quality_function(graspable, quality_config):
+    def create_quality_function(graspable, quality_config, quality_cache=None):
         """ Creates a quality function for a particular object based on a configuration, which can be passed directly from a configuration file.
 
         Parameters
@@ -207,6 +315,8 @@ class GraspQualityFunctionFactory:
             object to create quality function for
         quality_config : :obj:`GraspQualityConfig`
             parameters for quality function
+        quality_cache : :obj:`GraspQualityCache`
+            persistent cache of quality results, or None to always compute the quality
         """
         # check valid types
         if not isinstance(graspable, GraspableObject):
@@ -215,8 +325,8 @@ class GraspQualityFunctionFactory:
             raise ValueError('Must provide GraspQualityConfig')
         
         if quality_config.quality_type == 'quasi_static':
-            return QuasiStaticQualityFunction(graspable, quality_config)
+            return QuasiStaticQualityFunction(graspable, quality_config, quality_cache=quality_cache)
         elif quality_config.quality_type == 'robust_quasi_static':
-            return RobustQuasiStaticQualityFunction(graspable, quality_config)
+            return RobustQuasiStaticQualityFunction(graspable, quality_config, quality_cache=quality_cache)
         else:
             raise ValueError('Grasp quality type %s not supported' %(quality_config.quality_type))
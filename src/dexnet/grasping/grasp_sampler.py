@@ -46,6 +46,7 @@ except:
 import scipy.stats as stats
 
 from dexnet.grasping import Contact3D, ParallelJawPtGrasp3D, PointGraspMetrics3D, GraspableObject3D
+from dexnet.profiler import PROFILER
 
 class GraspSampler:
     """ Base class for various methods to sample a number of grasps on an object.
@@ -101,15 +102,13 @@ class GraspSampler:
 
     @staticmethod
     def down_sample_grasps(graspable, grasps, gamma_center=1, gamma_axis=0.05, gamma_variances=0.2, gamma_width=0.2, num_samples=50, max_iter=20):
-        surface_points, _ = graspable.sdf.surface_points(grid_basis=False)
-        np.random.shuffle(surface_points)
+        surface_index = graspable.surface_index
         pca = sklearn.decomposition.PCA(n_components = 3)
 
         datapoints = []
         for grasp in grasps:
             local_radius = grasp.max_grasp_width_
-            distances = grasp.center - surface_points
-            local_points = surface_points[np.where(np.linalg.norm(distances, axis=1) < local_radius)]
+            local_points = surface_index.surface_points_in_radius(grasp.center, local_radius)
             pca.fit(local_points)
             variances_ratio = pca.explained_variance_ratio_
             datapoints.append(np.hstack((gamma_center*grasp.center, gamma_axis*grasp.axis, gamma_variances*variances_ratio, gamma_width*grasp.max_grasp_width_)))
@@ -180,7 +179,7 @@ class GraspSampler:
         for stable_pose in stable_poses:
             grasps[stable_pose.id] = []
             for grasp in unaligned_grasps:
-                aligned_grasp = grasp.perpendicular_table(grasp)
+                aligned_grasp = grasp.perpendicular_table(stable_pose)
                 grasps[stable_pose.id].append(copy.deepcopy(aligned_grasp))
         return grasps
         
@@ -261,7 +260,7 @@ class UniformGraspSampler(GraspSampler):
         # import IPython
         # IPython.embed()
         # get all surface points
-        surface_points, _ = graspable.sdf.surface_points(grid_basis=False)
+        surface_points = graspable.surface_index.surface_points
         num_surface = surface_points.shape[0]
         i = 0
         grasps = []
@@ -454,8 +453,11 @@ class AntipodalGraspSampler(GraspSampler):
             the sampled grasps
         """
         # get surface points
-        grasps = []
-        surface_points, _ = graspable.sdf.surface_points(grid_basis=False)
+        candidate_grasps = []
+        candidate_points = []
+        candidate_normals = []
+        with PROFILER.timer('antipodal_sampler/surface_points'):
+            surface_points = graspable.surface_index.surface_points.copy()
         np.random.shuffle(surface_points)
         shuffled_surface_points = surface_points[:min(self.max_num_surface_points_, len(surface_points))]
         logging.info('Num surface: %d' %(len(surface_points)))
@@ -479,6 +481,7 @@ class AntipodalGraspSampler(GraspSampler):
                 # sample grasp axes from friction cone
                 v_samples = self.sample_from_cone(n1, tx1, ty1, num_samples=1)
                 sample_time = time.clock()
+                PROFILER.record('antipodal_sampler/cone_sample', sample_time - cone_time)
 
                 for v in v_samples:
                     if vis:
@@ -530,18 +533,35 @@ class AntipodalGraspSampler(GraspSampler):
                     if not cone_succeeded:
                         continue
 
-                    # check friction cone
-                    if PointGraspMetrics3D.force_closure(c1, c2, self.friction_coef):
-                        # try to find minimum possible openning width
-                        original_max_width = grasp.max_grasp_width_
-                        for index in range(openning_ratio_id):
-                            grasp.max_grasp_width_ = openning_ratios[index] * self.gripper.max_width
-                            success, _ = grasp.close_fingers(graspable)
-                            if success:
-                                break
-                            else:
-                                grasp.max_grasp_width_ = original_max_width
-                        grasps.append(grasp)
+                    # store contacts to check friction cones for all candidates at once
+                    candidate_grasps.append(grasp)
+                    candidate_points.append([c1.point, c2.point])
+                    candidate_normals.append([c1.normal, c2.normal])
+
+            PROFILER.record('antipodal_sampler/surface_point', time.clock() - start_time)
+
+        # check friction cones
+        grasps = []
+        if len(candidate_grasps) > 0:
+            in_force_closure = PointGraspMetrics3D.force_closure_batch(np.array(candidate_points), np.array(candidate_normals),
+                                                                       self.friction_coef)
+            for grasp, antipodal in zip(candidate_grasps, in_force_closure):
+                if not antipodal:
+                    continue
+
+                # try to find minimum possible openning width
+                original_max_width = grasp.max_grasp_width_
+                for index in range(openning_ratio_id):
+                    grasp.max_grasp_width_ = openning_ratios[index] * self.gripper.max_width
+                    success, _ = grasp.close_fingers(graspable)
+                    if success:
+                        break
+                    else:
+                        grasp.max_grasp_width_ = original_max_width
+                grasps.append(grasp)
+
+        PROFILER.increment('antipodal_sampler/surface_points', len(shuffled_surface_points))
+        PROFILER.increment('antipodal_sampler/grasps', len(grasps))
 
         # randomly sample max num grasps from total list
         random.shuffle(grasps)
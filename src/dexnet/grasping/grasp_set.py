@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Struct-of-arrays container for sets of parallel-jaw grasps
+"""
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from dexnet.grasping import ParallelJawPtGrasp3D
+
+# id of grasps that have not been assigned one
+NO_GRASP_ID = -1
+
+class GraspSet(object):
+    """ Set of N parallel-jaw grasps stored as contiguous arrays, one row per grasp.
+    Indexing with an integer returns a new ParallelJawPtGrasp3D for that row, and indexing with a slice,
+    boolean mask, or index array returns a GraspSet of the selected grasps.
+
+    Attributes
+    ----------
+    centers : :obj:`numpy.ndarray`
+        Nx3 array of the centers of the jaws
+    axes : :obj:`numpy.ndarray`
+        Nx3 array of normalized axes between the jaws
+    open_widths : :obj:`numpy.ndarray`
+        maximum opening widths of the jaws
+    approach_angles : :obj:`numpy.ndarray`
+        approach angles of the grasps
+    jaw_widths : :obj:`numpy.ndarray`
+        widths of the jaws in the tangent plane to the grasp axis
+    close_widths : :obj:`numpy.ndarray`
+        minimum opening widths of the jaws
+    ids : :obj:`numpy.ndarray`
+        integer ids of the grasps, with NO_GRASP_ID for grasps without an id
+    frame : :obj:`str`
+        name of the reference frame of all grasps in the set
+    """
+    def __init__(self, centers, axes, open_widths, approach_angles=None, jaw_widths=None,
+                 close_widths=None, ids=None, frame='object'):
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        axes = np.asarray(axes, dtype=np.float64).reshape(-1, 3)
+        num_grasps = centers.shape[0]
+        if axes.shape[0] != num_grasps:
+            raise ValueError('Must provide one axis per grasp center')
+        axis_norms = np.linalg.norm(axes, axis=1)
+        if np.any(np.abs(axis_norms - 1.0) > 1e-5):
+            raise ValueError('Illegal grasp axis. Must be norm one')
+
+        self.centers_ = centers
+        self.axes_ = axes / axis_norms[:,np.newaxis]
+        self.open_widths_ = self._per_grasp(open_widths, num_grasps)
+        self.approach_angles_ = self._per_grasp(approach_angles, num_grasps)
+        self.jaw_widths_ = self._per_grasp(jaw_widths, num_grasps)
+        self.close_widths_ = self._per_grasp(close_widths, num_grasps)
+        if ids is None:
+            self.ids_ = NO_GRASP_ID * np.ones(num_grasps, dtype=np.int64)
+        else:
+            self.ids_ = self._per_grasp(ids, num_grasps, dtype=np.int64)
+        self.frame_ = frame
+
+    @staticmethod
+    def _per_grasp(values, num_grasps, dtype=np.float64):
+        """ Broadcasts a scalar or array of values to one value per grasp. """
+        if values is None:
+            return np.zeros(num_grasps, dtype=dtype)
+        values = np.asarray(values, dtype=dtype)
+        if values.ndim == 0:
+            return values * np.ones(num_grasps, dtype=dtype)
+        if values.shape != (num_grasps,):
+            raise ValueError('Expected %d values but got array of shape %s' %(num_grasps, str(values.shape)))
+        return values
+
+    @staticmethod
+    def from_configurations(configurations, ids=None, frame='object'):
+        """ Creates a grasp set from an array of ParallelJawPtGrasp3D configuration vectors.
+
+        Parameters
+        ----------
+        configurations : :obj:`numpy.ndarray`
+            Nx9 or Nx10 array of grasp configurations
+        ids : :obj:`list` of int
+            ids of the grasps, with None for grasps without an id
+        frame : :obj:`str`
+            name of the reference frame of the grasps
+
+        Returns
+        -------
+        :obj:`GraspSet`
+            set of the grasps
+        """
+        configurations = np.asarray(configurations, dtype=np.float64)
+        if configurations.ndim != 2 or (configurations.shape[1] != 9 and configurations.shape[1] != 10):
+            raise ValueError('Configurations must be an array of size Nx9 or Nx10')
+        close_widths = None
+        if configurations.shape[1] == 10:
+            close_widths = configurations[:,9]
+        if ids is not None:
+            ids = [NO_GRASP_ID if grasp_id is None else grasp_id for grasp_id in ids]
+        return GraspSet(configurations[:,0:3], configurations[:,3:6], configurations[:,6],
+                        approach_angles=configurations[:,7], jaw_widths=configurations[:,8],
+                        close_widths=close_widths, ids=ids, frame=frame)
+
+    @staticmethod
+    def from_grasps(grasps):
+        """ Creates a grasp set from a list of grasps.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`ParallelJawPtGrasp3D`
+            grasps to store, which must share a reference frame
+
+        Returns
+        -------
+        :obj:`GraspSet`
+            set of the grasps
+        """
+        if len(grasps) == 0:
+            return GraspSet.from_configurations(np.zeros([0, 10]))
+        frame = grasps[0].frame
+        for grasp in grasps:
+            if grasp.frame != frame:
+                raise ValueError('All grasps in a set must be in the same frame')
+        configurations = np.array([grasp.configuration for grasp in grasps])
+        return GraspSet.from_configurations(configurations, ids=[grasp.id for grasp in grasps], frame=frame)
+
+    @property
+    def centers(self):
+        return self.centers_
+
+    @property
+    def axes(self):
+        return self.axes_
+
+    @property
+    def open_widths(self):
+        return self.open_widths_
+
+    @property
+    def approach_angles(self):
+        return self.approach_angles_
+
+    @property
+    def jaw_widths(self):
+        return self.jaw_widths_
+
+    @property
+    def close_widths(self):
+        return self.close_widths_
+
+    @property
+    def ids(self):
+        return self.ids_
+
+    @property
+    def frame(self):
+        return self.frame_
+
+    @property
+    def num_grasps(self):
+        return self.centers_.shape[0]
+
+    @property
+    def nbytes(self):
+        """ int : number of bytes in the grasp arrays """
+        return self.centers_.nbytes + self.axes_.nbytes + self.open_widths_.nbytes + self.approach_angles_.nbytes + \
+            self.jaw_widths_.nbytes + self.close_widths_.nbytes + self.ids_.nbytes
+
+    @property
+    def configurations(self):
+        """ :obj:`numpy.ndarray` : Nx10 array of the ParallelJawPtGrasp3D configuration vectors of the grasps """
+        return np.c_[self.centers_, self.axes_, self.open_widths_, self.approach_angles_,
+                     self.jaw_widths_, self.close_widths_]
+
+    def __len__(self):
+        return self.num_grasps
+
+    def __iter__(self):
+        for i in range(self.num_grasps):
+            yield self.grasp(i)
+
+    def __getitem__(self, ind):
+        """ Returns the grasp at an integer index or a GraspSet of the grasps selected by a slice, mask, or index array. """
+        if isinstance(ind, (int, long, np.integer)):
+            return self.grasp(ind)
+        return GraspSet(self.centers_[ind], self.axes_[ind], self.open_widths_[ind],
+                        approach_angles=self.approach_angles_[ind], jaw_widths=self.jaw_widths_[ind],
+                        close_widths=self.close_widths_[ind], ids=self.ids_[ind], frame=self.frame_)
+
+    def grasp(self, ind):
+        """ Creates a ParallelJawPtGrasp3D for a single grasp in the set.
+
+        Parameters
+        ----------
+        ind : int
+            index of the grasp
+
+        Returns
+        -------
+        :obj:`ParallelJawPtGrasp3D`
+            the grasp, which does not share memory with the set
+        """
+        grasp_id = int(self.ids_[ind])
+        if grasp_id == NO_GRASP_ID:
+            grasp_id = None
+        configuration = np.r_[self.centers_[ind], self.axes_[ind], self.open_widths_[ind], self.approach_angles_[ind],
+                              self.jaw_widths_[ind], self.close_widths_[ind]]
+        return ParallelJawPtGrasp3D(configuration, frame=self.frame_, grasp_id=grasp_id)
+
+    def to_grasps(self):
+        """ Returns a list of ParallelJawPtGrasp3D objects for the grasps in the set. """
+        return [g for g in self]
+
+    def with_approach_angles(self, approach_angles):
+        """ Returns a grasp set with new approach angles that shares all other arrays with this set.
+
+        Parameters
+        ----------
+        approach_angles : float or :obj:`numpy.ndarray`
+            new approach angle for every grasp
+
+        Returns
+        -------
+        :obj:`GraspSet`
+            the rotated grasps
+        """
+        return GraspSet(self.centers_, self.axes_, self.open_widths_, approach_angles=approach_angles,
+                        jaw_widths=self.jaw_widths_, close_widths=self.close_widths_, ids=self.ids_, frame=self.frame_)
+
+    @property
+    def endpoints(self):
+        """
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Nx3 locations of the first jaws at max opening width
+        :obj:`numpy.ndarray`
+            Nx3 locations of the second jaws at max opening width
+        """
+        offsets = (self.open_widths_ / 2.0)[:,np.newaxis] * self.axes_
+        return self.centers_ - offsets, self.centers_ + offsets
+
+    @property
+    def unrotated_full_axes(self):
+        """ :obj:`numpy.ndarray` : Nx3x3 rotation matrices from the canonical grasp frames at zero approach angle to the object frame
+        (see ParallelJawPtGrasp3D.unrotated_full_axis) """
+        grasp_axes_y = self.axes_
+        grasp_axes_x = np.c_[grasp_axes_y[:,1], -grasp_axes_y[:,0], np.zeros(self.num_grasps)]
+        x_norms = np.linalg.norm(grasp_axes_x, axis=1)
+        degenerate = x_norms == 0
+        grasp_axes_x[degenerate,:] = np.array([1,0,0])
+        x_norms[degenerate] = 1.0
+        grasp_axes_x = grasp_axes_x / x_norms[:,np.newaxis]
+        grasp_axes_z = np.cross(grasp_axes_x, grasp_axes_y)
+        return np.stack([grasp_axes_x, grasp_axes_y, grasp_axes_z], axis=2)
+
+    @property
+    def rotated_full_axes(self):
+        """ :obj:`numpy.ndarray` : Nx3x3 rotation matrices from the grasp frames to the object frame
+        (see ParallelJawPtGrasp3D.rotated_full_axis) """
+        R = self.unrotated_full_axes
+        cos_t = np.cos(self.approach_angles_)[:,np.newaxis]
+        sin_t = np.sin(self.approach_angles_)[:,np.newaxis]
+        grasp_axes_x = cos_t * R[:,:,0] + sin_t * R[:,:,2]
+        grasp_axes_z = -sin_t * R[:,:,0] + cos_t * R[:,:,2]
+        return np.stack([grasp_axes_x, R[:,:,1], grasp_axes_z], axis=2)
+
+    @property
+    def T_grasp_obj(self):
+        """ :obj:`numpy.ndarray` : Nx4x4 homogeneous transformations from the grasp frames to the object frame
+        (see ParallelJawPtGrasp3D.T_grasp_obj) """
+        T = np.zeros([self.num_grasps, 4, 4])
+        T[:,:3,:3] = self.rotated_full_axes
+        T[:,:3,3] = self.centers_
+        T[:,3,3] = 1.0
+        return T
+
+    def normals_in_grasp_frames(self, normals):
+        """ Expresses directions in the object frame in the unrotated frame of every grasp.
+
+        Parameters
+        ----------
+        normals : :obj:`numpy.ndarray`
+            Px3 array of directions in the object frame, such as table normals
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxPx3 array of the directions in the unrotated grasp frames
+        """
+        normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+        return np.einsum('nij,pi->npj', self.unrotated_full_axes, normals)
+
+    def perpendicular_table_angles(self, table_normals):
+        """ Computes the approach angles that align every grasp with every table (see ParallelJawPtGrasp3D.perpendicular_table).
+
+        Parameters
+        ----------
+        table_normals : :obj:`numpy.ndarray`
+            Px3 array of table normals in the object frame
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxP array of approach angles
+        """
+        return ParallelJawPtGrasp3D.perpendicular_approach_angles(-self.normals_in_grasp_frames(table_normals))
+
+    def parallel_table_angles(self, table_normals):
+        """ Computes the approach angles that make every grasp approach parallel to every table (see ParallelJawPtGrasp3D.parallel_table).
+
+        Parameters
+        ----------
+        table_normals : :obj:`numpy.ndarray`
+            Px3 array of table normals in the object frame
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxP array of approach angles
+        """
+        return ParallelJawPtGrasp3D.parallel_approach_angles(self.normals_in_grasp_frames(table_normals))
+
+    def perpendicular_table(self, stable_pose):
+        """ Returns the grasps with approach angles aligned with the table normal of a stable pose.
+
+        Parameters
+        ----------
+        stable_pose : :obj:`StablePose` or :obj:`RigidTransform`
+            the pose specifying the orientation of the table
+
+        Returns
+        -------
+        :obj:`GraspSet`
+            aligned grasps
+        """
+        table_normal = ParallelJawPtGrasp3D.table_normal(stable_pose)
+        return self.with_approach_angles(self.perpendicular_table_angles(table_normal)[:,0])
+
+    def parallel_table(self, stable_pose):
+        """ Returns the grasps with approach angles perpendicular to the table normal of a stable pose.
+
+        Parameters
+        ----------
+        stable_pose : :obj:`StablePose` or :obj:`RigidTransform`
+            the pose specifying the orientation of the table
+
+        Returns
+        -------
+        :obj:`GraspSet`
+            aligned grasps
+        """
+        table_normal = ParallelJawPtGrasp3D.table_normal(stable_pose)
+        return self.with_approach_angles(self.parallel_table_angles(table_normal)[:,0])
+
+    def grasp_angles_from_stp_z(self, stable_poses):
+        """ Get the angles of every grasp from the table plane of every stable pose (see ParallelJawPtGrasp3D.grasp_angles_from_stp_z).
+
+        Parameters
+        ----------
+        stable_poses : :obj:`list` of :obj:`StablePose` or :obj:`RigidTransform`, or :obj:`numpy.ndarray`
+            stable poses or a Px3x3 stack of their rotations from the object frame to the stable pose frame
+
+        Returns
+        -------
+        grasp_axis_angles : :obj:`numpy.ndarray`
+            NxP angles between the grasp axes and the table normals
+        grasp_approach_angles : :obj:`numpy.ndarray`
+            NxP angles between the grasp approach directions and the table normals, up to sign
+        nus : :obj:`numpy.ndarray`
+            NxP dot products of the grasp z axes with the table normals
+        """
+        if isinstance(stable_poses, np.ndarray):
+            table_normals = stable_poses.reshape(-1, 3, 3)[:,2,:]
+        else:
+            table_normals = np.array([ParallelJawPtGrasp3D.table_normal(stable_pose) for stable_pose in stable_poses]).reshape(-1, 3)
+        return ParallelJawPtGrasp3D.grasp_angles_from_table_normals(self.rotated_full_axes, table_normals)
+
+    def distance(self, other=None, alpha=0.05):
+        """ Evaluates the distances between all pairs of grasps (see ParallelJawPtGrasp3D.distance).
+
+        Parameters
+        ----------
+        other : :obj:`GraspSet`
+            grasps to measure the distance to, defaults to this set
+        alpha : float
+            parameter weighting rotational versus spatial distance
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxM matrix of distances from the grasps in this set to the grasps in the other set
+        """
+        if other is None:
+            other = self
+        center_dists = cdist(self.centers_, other.centers_)
+        axis_dots = np.clip(np.abs(self.axes_.dot(other.axes_.T)), 0, 1)
+        axis_dists = (2.0 / np.pi) * np.arccos(axis_dots)
+        return center_dists + alpha * axis_dists
@@ -37,6 +37,8 @@ import matplotlib.pyplot as plt
 
 from autolab_core import RigidTransform, SimilarityTransform
 
+from dexnet.grasping import SdfPyramid, SurfaceIndex
+
 class GraspableObject:
     """ Encapsulates geometric structures for computing contact in grasping.
     
@@ -107,10 +109,15 @@ class GraspableObject3D(GraspableObject):
         mass of the object
     convex_pieces : :obj:`list` of :obj:`Mesh3D`
         convex decomposition of the object geom for collision checking
+    surface_index : :obj:`SurfaceIndex`
+        surface points, KD-tree and normal field of the SDF, built on first use if not provided
+    sdf_pyramid : :obj:`SdfPyramid`
+        conservative multi-resolution distance bounds of the SDF for contact search, built on first use if not provided
     """
     def __init__(self, sdf, mesh, key='',
                  model_name='', mass=1.0,
-                 convex_pieces=None):
+                 convex_pieces=None, surface_index=None,
+                 sdf_pyramid=None):
         if not isinstance(sdf, s.Sdf3D):
             raise ValueError('Must initialize 3D graspable object with 3D sdf')
         if not isinstance(mesh, m.Mesh3D):
@@ -119,6 +126,30 @@ class GraspableObject3D(GraspableObject):
         GraspableObject.__init__(self, sdf, mesh, key=key,
                                  model_name=model_name, mass=mass,
                                  convex_pieces=convex_pieces)
+        self.surface_index_ = surface_index
+        self.sdf_pyramid_ = sdf_pyramid
+
+    @property
+    def surface_index(self):
+        if self.surface_index_ is None:
+            self.surface_index_ = SurfaceIndex.from_sdf(self.sdf_)
+        return self.surface_index_
+
+    @property
+    def has_surface_index(self):
+        """ bool : whether or not the surface index has been built or loaded """
+        return self.surface_index_ is not None
+
+    @property
+    def sdf_pyramid(self):
+        if self.sdf_pyramid_ is None:
+            self.sdf_pyramid_ = SdfPyramid.from_sdf(self.sdf_)
+        return self.sdf_pyramid_
+
+    @property
+    def has_sdf_pyramid(self):
+        """ bool : whether or not the SDF pyramid has been built """
+        return self.sdf_pyramid_ is not None
 
     def moment_arm(self, x):
         """ Computes the moment arm to a point x.
@@ -156,9 +187,13 @@ class GraspableObject3D(GraspableObject):
             for convex_piece in self.convex_pieces_:
                 convex_piece_rescaled = convex_piece.transform(stf)
                 convex_pieces_rescaled.append(convex_piece_rescaled)
+        sdf_pyramid_rescaled = None
+        if self.sdf_pyramid_ is not None:
+            sdf_pyramid_rescaled = self.sdf_pyramid_.rescale(scale)
         return GraspableObject3D(sdf_rescaled, mesh_rescaled, key=self.key,
                                  model_name=self.model_name, mass=self.mass,
-                                 convex_pieces=convex_pieces_rescaled)
+                                 convex_pieces=convex_pieces_rescaled,
+                                 sdf_pyramid=sdf_pyramid_rescaled)
 
     def transform(self, delta_T):
         """ Transform by a delta transform.
@@ -182,9 +217,14 @@ class GraspableObject3D(GraspableObject):
             for convex_piece in self.convex_pieces_:
                 convex_piece_tf = convex_piece.transform(delta_T)
                 convex_pieces_tf.append(convex_piece_tf)
+        # the pyramid and the surface mask and gradients are in grid coordinates, so they are unchanged by the transform.
+        # build them here once so that every transformed copy (e.g. each sampled pose) shares them
+        surface_index_tf = self.surface_index.transform(sdf_tf)
         return GraspableObject3D(sdf_tf, mesh_tf, key=self.key,
                                  model_name=self.model_name, mass=self.mass,
-                                 convex_pieces=convex_pieces_tf)
+                                 convex_pieces=convex_pieces_tf,
+                                 surface_index=surface_index_tf,
+                                 sdf_pyramid=self.sdf_pyramid)
 
     def surface_information(self, grasp, width, num_steps, plot=False, direction1=None, direction2=None):
         """ Returns the patches on this object for a given grasp.
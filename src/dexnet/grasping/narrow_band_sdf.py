@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Sparse narrow-band signed distance fields for holding many graspable objects in memory
+"""
+import numpy as np
+
+from meshpy_berkeley import Sdf3D
+
+class NarrowBandSdf3D(Sdf3D):
+    """ Signed distance field that only stores the voxels within a narrow band of the surface.
+    The grid is divided into cubic blocks and only the blocks containing a voxel closer to the surface than the band
+    width are allocated. All other voxels read as the band width with the sign of their block, so the field equals the
+    dense SDF clamped to [-band_width, band_width].
+
+    Implements the query interface of Sdf3D used for contact finding, contact windows, grasp sampling and object
+    transforms, so it can be used in place of a dense SDF in a GraspableObject3D.
+
+    Attributes
+    ----------
+    blocks : Mx(B)x(B)x(B) :obj:`numpy.ndarray`
+        clamped signed distances of the allocated blocks
+    block_table : :obj:`numpy.ndarray` of int
+        index of each block in blocks, or OUTSIDE / INSIDE for unallocated blocks
+    dims : 3 :obj:`numpy.ndarray` of int
+        dimensions of the full grid
+    resolution : float
+        side length of a voxel in the object frame
+    origin : 3 :obj:`numpy.ndarray`
+        origin of the grid
+    grid_to_obj : 3x4 :obj:`numpy.ndarray`
+        affine transform from grid coordinates to the object frame
+    band_width : float
+        distance from the surface within which values are stored exactly
+    surface_thresh : float
+        max absolute signed distance of surface voxels
+    surface_points_grid : Nx3 :obj:`numpy.ndarray` of int
+        voxels on the surface, in the order of Sdf3D.surface_points
+
+    Notes
+    -----
+    Queries that need the full grid, such as the data property, reconstruct it on every call, so the grasping code
+    uses interpolate, interpolate_gradient and block_bounds instead.
+    """
+    OUTSIDE = -1
+    INSIDE = -2
+
+    def __init__(self, blocks, block_table, dims, resolution, origin, grid_to_obj,
+                 band_width, surface_thresh, surface_points_grid):
+        if blocks.ndim != 4 or blocks.shape[1] != blocks.shape[2] or blocks.shape[1] != blocks.shape[3]:
+            raise ValueError('Blocks must be an array of cubes')
+        self.block_table_ = block_table
+        self.block_size_ = blocks.shape[1]
+        self.num_blocks_ = blocks.shape[0]
+        self.dims_ = np.array(dims).astype(np.int)
+        if np.any(self.block_size_ * np.array(block_table.shape) < self.dims_):
+            raise ValueError('Block table of shape %s does not cover grid of shape %s' %(str(block_table.shape), str(self.dims_)))
+        self.resolution_ = resolution
+        self.origin_ = np.array(origin)
+        self.band_width_ = band_width
+        self.surface_thresh_ = surface_thresh
+        self.surface_points_grid_ = surface_points_grid
+
+        # unallocated blocks point at one of two constant blocks appended to the allocated ones,
+        # so that lookups are a single gather into the flattened blocks
+        constant_blocks = np.ones((2,) + blocks.shape[1:], dtype=blocks.dtype)
+        constant_blocks[0] *= band_width
+        constant_blocks[1] *= -band_width
+        self.blocks_ = np.concatenate([blocks, constant_blocks])
+        self.block_lookup_ = block_table.astype(np.intp)
+        self.block_lookup_[block_table == NarrowBandSdf3D.OUTSIDE] = self.num_blocks_
+        self.block_lookup_[block_table == NarrowBandSdf3D.INSIDE] = self.num_blocks_ + 1
+
+        self.grid_to_obj_ = np.array(grid_to_obj, dtype=np.float64)
+        self.scale_ = np.linalg.norm(self.grid_to_obj_[:,0])
+        linear = self.grid_to_obj_[:,:3]
+        self.obj_to_grid_ = np.c_[np.linalg.inv(linear), -np.linalg.solve(linear, self.grid_to_obj_[:,3])]
+
+    @staticmethod
+    def from_sdf(sdf, band_voxels=3, block_size=8, dtype=np.float32):
+        """ Converts a dense SDF to a narrow band SDF.
+
+        Parameters
+        ----------
+        sdf : :obj:`Sdf3D`
+            dense signed distance field
+        band_voxels : float
+            width of the narrow band in voxels
+        block_size : int
+            side length of the allocated blocks in voxels
+        dtype : :obj:`numpy.dtype`
+            type to store the signed distances with
+
+        Returns
+        -------
+        :obj:`NarrowBandSdf3D`
+            narrow band version of the SDF
+        """
+        if isinstance(sdf, NarrowBandSdf3D):
+            return sdf
+        data = np.asarray(sdf.data)
+        dims = np.array(data.shape)
+        band_width = band_voxels * sdf.resolution
+        surface_thresh = getattr(sdf, 'surface_thresh_', sdf.resolution * np.sqrt(2) / 2)
+        if band_width < surface_thresh:
+            raise ValueError('Band of %f voxels is narrower than the surface threshold' %(band_voxels))
+
+        # pad the grid to a whole number of blocks and split it into blocks
+        num_blocks = (dims + block_size - 1) / block_size
+        padded = np.full(num_blocks * block_size, band_width, dtype=dtype)
+        padded[:dims[0], :dims[1], :dims[2]] = np.clip(data, -band_width, band_width)
+        padded = padded.reshape(num_blocks[0], block_size, num_blocks[1], block_size, num_blocks[2], block_size)
+        padded = padded.transpose(0, 2, 4, 1, 3, 5)
+
+        # allocate the blocks that intersect the band, recording the sign of the rest
+        active = np.any(np.abs(padded) < band_width, axis=(3, 4, 5))
+        block_table = np.where(padded[:,:,:,0,0,0] > 0, NarrowBandSdf3D.OUTSIDE, NarrowBandSdf3D.INSIDE).astype(np.int32)
+        block_table[active] = np.arange(np.sum(active))
+        blocks = np.ascontiguousarray(padded[active])
+
+        # the transform from grid to object coordinates is affine, so recover it from the basis vectors
+        basis = np.c_[np.zeros(3), np.eye(3)]
+        basis_obj = np.asarray(sdf.transform_pt_grid_to_obj(basis), dtype=np.float64)
+        grid_to_obj = np.c_[basis_obj[:,1:] - basis_obj[:,:1], basis_obj[:,0]]
+
+        surface_points_grid = np.array(np.nonzero(np.abs(data) < surface_thresh)).T.astype(np.int32)
+        return NarrowBandSdf3D(blocks, block_table, dims, sdf.resolution, sdf.origin, grid_to_obj,
+                               band_width, surface_thresh, surface_points_grid)
+
+    @property
+    def dimensions(self):
+        return self.dims_
+
+    @property
+    def dims(self):
+        return self.dims_
+
+    @property
+    def resolution(self):
+        return self.resolution_
+
+    @property
+    def origin(self):
+        return self.origin_
+
+    @property
+    def band_width(self):
+        return self.band_width_
+
+    @property
+    def surface_thresh(self):
+        return self.surface_thresh_
+
+    @property
+    def blocks(self):
+        return self.blocks_[:self.num_blocks_]
+
+    @property
+    def block_table(self):
+        return self.block_table_
+
+    @property
+    def block_size(self):
+        return self.block_size_
+
+    @property
+    def grid_to_obj(self):
+        return self.grid_to_obj_
+
+    @property
+    def num_blocks(self):
+        """ int : number of allocated blocks """
+        return self.num_blocks_
+
+    @property
+    def nbytes(self):
+        """ int : number of bytes in the arrays of the SDF """
+        return self.blocks_.nbytes + self.block_table_.nbytes + self.block_lookup_.nbytes + \
+            self.surface_points_grid_.nbytes
+
+    @property
+    def data(self):
+        """ :obj:`numpy.ndarray` : the clamped signed distances on the full grid, reconstructed on each access """
+        voxels = np.indices(self.dims_).reshape(3, -1)
+        return self._voxel_values(voxels).reshape(self.dims_)
+
+    def _voxel_values(self, voxels):
+        """ Signed distances at a 3xN array of integer voxel coordinates inside the grid """
+        block_coords, local_coords = np.divmod(voxels, self.block_size_)
+        index = self.block_lookup_[block_coords[0], block_coords[1], block_coords[2]]
+        flat_index = ((index * self.block_size_ + local_coords[0]) * self.block_size_ + local_coords[1]) * self.block_size_ + local_coords[2]
+        return self.blocks_.take(flat_index)
+
+    def interpolate(self, pts_grid):
+        """ Trilinearly interpolates the signed distance at points, snapping points outside the grid to the boundary.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            signed distance at each point
+        """
+        pts_grid = np.asarray(pts_grid, dtype=np.float64).reshape(3, -1)
+        upper = self.dims_.reshape(3, 1) - 1
+        pts_grid = np.clip(pts_grid, 0, upper)
+        min_coords = np.minimum(np.floor(pts_grid), np.maximum(upper - 1, 0)).astype(np.int)
+        weights = pts_grid - min_coords
+
+        # look up all eight corners of every cell at once
+        offsets = np.array(list(np.ndindex(2, 2, 2))).T[:,:,np.newaxis]
+        corners = min_coords[:,np.newaxis,:] + offsets
+        corner_weights = np.prod(np.where(offsets, weights[:,np.newaxis,:], 1 - weights[:,np.newaxis,:]), axis=0)
+        corner_values = self._voxel_values(corners.reshape(3, -1)).reshape(corner_weights.shape)
+        return np.sum(corner_weights * corner_values, axis=0)
+
+    def interpolate_gradient(self, pts_grid, delta=0.5):
+        """ Gradient of the signed distance at points by central differences of the interpolated field.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+        delta : float
+            step size, in voxels, of the central differences
+
+        Returns
+        -------
+        3xN :obj:`numpy.ndarray`
+            gradient along each grid axis at each point, per voxel
+        """
+        pts_grid = np.asarray(pts_grid, dtype=np.float64).reshape(3, -1)
+        steps = delta * np.eye(3)[:,:,np.newaxis]
+        pts = np.concatenate([pts_grid[:,np.newaxis,:] + steps, pts_grid[:,np.newaxis,:] - steps], axis=1)
+        sd = self.interpolate(pts.reshape(3, -1)).reshape(6, -1)
+        return (sd[:3] - sd[3:]) / (2 * delta)
+
+    def block_bounds(self):
+        """ Min and max signed distance over the voxels used to interpolate inside each block, which are the voxels
+        of the block and the first voxels of the following blocks along each axis, computed without building the full grid.
+        Blocks on the far boundary of the grid also include the padding voxels past the grid, so their range is
+        conservative.
+
+        Returns
+        -------
+        min_vals : :obj:`numpy.ndarray`
+            min signed distance of each block, same shape as block_table
+        max_vals : :obj:`numpy.ndarray`
+            max signed distance of each block, same shape as block_table
+        """
+        table_dims = self.block_lookup_.shape
+        min_vals = np.full(table_dims, np.inf, dtype=np.float32)
+        max_vals = np.full(table_dims, -np.inf, dtype=np.float32)
+        for offset in np.ndindex(2, 2, 2):
+            # range of the first voxels of the neighboring block at the offset, for all stored blocks at once
+            local = tuple([slice(0, 1) if o else slice(None) for o in offset])
+            neighbor_blocks = self.blocks_[(slice(None),) + local]
+            neighbor_min = np.min(neighbor_blocks.reshape(neighbor_blocks.shape[0], -1), axis=1)
+            neighbor_max = np.max(neighbor_blocks.reshape(neighbor_blocks.shape[0], -1), axis=1)
+
+            # combine with the blocks that have a neighbor at the offset
+            src = tuple([slice(o, None) for o in offset])
+            dst = tuple([slice(0, d - o) for d, o in zip(table_dims, offset)])
+            neighbors = self.block_lookup_[src]
+            min_vals[dst] = np.minimum(min_vals[dst], neighbor_min[neighbors])
+            max_vals[dst] = np.maximum(max_vals[dst], neighbor_max[neighbors])
+        return min_vals, max_vals
+
+    def __getitem__(self, coords):
+        """ Returns the signed distance at the given coordinates, interpolating if necessary.
+
+        Parameters
+        ----------
+        coords : :obj:`numpy.ndarray` of int
+            A 3-dimensional ndarray that indicates the desired
+            coordinates in the grid.
+
+        Returns
+        -------
+        float
+            The signed distance associated with the given coordinates
+            (interpolated if coords are not integers).
+
+        Raises
+        ------
+        ValueError
+            If coords is not 3-dimensional.
+        """
+        if len(coords) != 3:
+            raise ValueError('Must provide 3D coordinates to index 3D SDF')
+        return float(self.interpolate(np.array(coords, dtype=np.float64).reshape(3, 1))[0])
+
+    def is_out_of_bounds(self, coords):
+        """ Returns True if coords is an out of bounds access.
+
+        Parameters
+        ----------
+        coords : :obj:`numpy.ndarray` of int
+            A 3-dimensional ndarray that indicates the desired
+            coordinates in the grid.
+
+        Returns
+        -------
+        bool
+            Are the coordinates in coords out of bounds?
+        """
+        coords = np.asarray(coords)
+        return np.any(coords < 0) or np.any(coords >= self.dims_)
+
+    def on_surface(self, coords):
+        """ Determines whether or not a point is on the object surface.
+
+        Parameters
+        ----------
+        coords : :obj:`numpy.ndarray` of int
+            A 3-dimensional ndarray that indicates the desired
+            coordinates in the grid.
+
+        Returns
+        -------
+        :obj:`tuple` of bool, float
+            Is the point on the object's surface, and what
+            is the signed distance at that point?
+        """
+        sd = self[coords]
+        return abs(sd) < self.surface_thresh_, sd
+
+    def surface_normal(self, coords, delta=0.5):
+        """ Returns the sdf surface normal at the given coordinates by central differences of the interpolated field.
+
+        Parameters
+        ----------
+        coords : :obj:`numpy.ndarray` of int
+            A 3-dimensional ndarray that indicates the desired
+            coordinates in the grid.
+        delta : float
+            step size, in voxels, of the central differences
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            The 3-dimensional ndarray that represents the surface normal, or None if the point is out of bounds
+            or the gradient vanishes.
+        """
+        coords = np.asarray(coords, dtype=np.float64).ravel()
+        if self.is_out_of_bounds(coords):
+            return None
+        grad = self.interpolate_gradient(coords, delta=delta)[:,0]
+        norm = np.linalg.norm(grad)
+        if norm == 0:
+            return None
+        return grad / norm
+
+    def surface_points(self, grid_basis=True):
+        """ Returns the points on the surface.
+
+        Parameters
+        ----------
+        grid_basis : bool
+            If False, the surface points are transformed to the world frame.
+            If True (default), the surface points are left in grid coordinates.
+
+        Returns
+        -------
+        :obj:`tuple` of :obj:`numpy.ndarray` of int, :obj:`numpy.ndarray` of float
+            The points on the surface and the signed distances at those points.
+        """
+        surface_vals = self._voxel_values(self.surface_points_grid_.T)
+        surface_points = self.surface_points_grid_
+        if not grid_basis:
+            surface_points = self.transform_pt_grid_to_obj(surface_points.T).T
+        return surface_points, surface_vals
+
+    def transform_pt_obj_to_grid(self, x_sdf, direction=False):
+        """ Converts a point in sdf coords to the grid basis. If direction then don't translate.
+
+        Parameters
+        ----------
+        x_sdf : numpy 3xN ndarray or numeric scalar
+            points to transform from sdf basis in meters to grid basis
+        direction : bool
+            whether or not the points are directions
+
+        Returns
+        -------
+        x_grid : numpy 3xN ndarray or scalar
+            points in grid basis
+        """
+        if np.isscalar(x_sdf):
+            return x_sdf / self.scale_
+        x_sdf = np.asarray(x_sdf, dtype=np.float64)
+        linear = self.obj_to_grid_[:,:3]
+        if direction:
+            return (self.scale_ * linear).dot(x_sdf)
+        x_grid = linear.dot(x_sdf.reshape(3, -1)) + self.obj_to_grid_[:,3:]
+        return x_grid.reshape(x_sdf.shape)
+
+    def transform_pt_grid_to_obj(self, x_grid, direction=False):
+        """ Converts a point in grid coords to the obj basis. If direction then don't translate.
+
+        Parameters
+        ----------
+        x_grid : numpy 3xN ndarray or numeric scalar
+            points to transform from grid basis to sdf basis in meters
+        direction : bool
+            whether or not the points are directions
+
+        Returns
+        -------
+        x_sdf : numpy 3xN ndarray
+            points in sdf basis (meters)
+        """
+        if np.isscalar(x_grid):
+            return x_grid * self.scale_
+        x_grid = np.asarray(x_grid, dtype=np.float64)
+        linear = self.grid_to_obj_[:,:3]
+        if direction:
+            return (linear / self.scale_).dot(x_grid)
+        x_sdf = linear.dot(x_grid.reshape(3, -1)) + self.grid_to_obj_[:,3:]
+        return x_sdf.reshape(x_grid.shape)
+
+    def transform(self, delta_T):
+        """ Creates a new SDF with a given pose with respect to world coordinates.
+        The stored blocks are shared with the new SDF.
+
+        Parameters
+        ----------
+        delta_T : :obj:`autolab_core.RigidTransform`
+            transform from cur sdf to transformed sdf coords
+
+        Returns
+        -------
+        :obj:`NarrowBandSdf3D`
+            new sdf with grid warped by T
+        """
+        scale = getattr(delta_T, 'scale', 1.0)
+        linear = scale * delta_T.rotation
+        grid_to_obj = np.c_[linear.dot(self.grid_to_obj_[:,:3]),
+                            linear.dot(self.grid_to_obj_[:,3]) + delta_T.translation]
+        blocks = self.blocks
+        band_width = self.band_width_
+        surface_thresh = self.surface_thresh_
+        if scale != 1.0:
+            blocks = (scale * blocks).astype(blocks.dtype)
+            band_width = scale * band_width
+            surface_thresh = scale * surface_thresh
+        return NarrowBandSdf3D(blocks, self.block_table_, self.dims_, scale * self.resolution_, self.origin_,
+                               grid_to_obj, band_width, surface_thresh, self.surface_points_grid_)
+
+    def rescale(self, scale):
+        """ Rescale an SDF by a given scale factor.
+
+        Parameters
+        ----------
+        scale : float
+            the amount to scale the SDF
+
+        Returns
+        -------
+        :obj:`NarrowBandSdf3D`
+            new sdf with given scale
+        """
+        return NarrowBandSdf3D((scale * self.blocks).astype(self.blocks_.dtype), self.block_table_,
+                               self.dims_, scale * self.resolution_, self.origin_,
+                               scale * self.grid_to_obj_, scale * self.band_width_,
+                               scale * self.surface_thresh_, self.surface_points_grid_)
+
+    def scatter(self):
+        """ Plots the SDF surface points as a matplotlib 3D scatter plot """
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D
+        surface_points, _ = self.surface_points(grid_basis=True)
+        ax = plt.gca(projection='3d')
+        ax.scatter(surface_points[:,0], surface_points[:,1], surface_points[:,2])
+        ax.set_xlim3d(0, self.dims_[0])
+        ax.set_ylim3d(0, self.dims_[1])
+        ax.set_zlim3d(0, self.dims_[2])
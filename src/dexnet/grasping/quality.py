@@ -39,6 +39,7 @@ import sys
 import time
 
 from dexnet.grasping import PointGrasp, GraspableObject3D, GraspQualityConfig
+from dexnet.profiler import PROFILER
 
 import meshpy_berkeley.obj_file as obj_file
 import meshpy_berkeley.sdf_file as sdf_file
@@ -54,6 +55,9 @@ import IPython
 # turn off output logging
 cvx.solvers.options['show_progress'] = False
 
+# metrics whose wrench programs grasp_quality_batch solves together
+BATCH_QUALITY_METHODS = ['partial_closure']
+
 class PointGraspMetrics3D:
     """ Class to wrap functions for quasistatic point grasp quality metrics.
     """
@@ -83,7 +87,6 @@ class PointGraspMetrics3D:
         # read in params
         method = params.quality_method
         friction_coef = params.friction_coef
-        num_cone_faces = params.num_cone_faces
         soft_fingers = params.soft_fingers
         check_approach = params.check_approach
         if not hasattr(PointGraspMetrics3D, method):
@@ -96,6 +99,7 @@ class PointGraspMetrics3D:
                                                        vis=vis)
         if not contacts_found:
             logging.debug('Contacts not found')
+            PROFILER.increment('grasp_quality/contacts_not_found')
             return 0
 
         if method == 'force_closure':
@@ -109,6 +113,155 @@ class PointGraspMetrics3D:
 
         # add the forces, torques, etc at each contact point
         forces_start = time.time()
+        wrenches = PointGraspMetrics3D._contact_wrenches(contacts, params, vis=vis)
+        if wrenches is None:
+            return 0
+        forces, torques, normals = wrenches
+
+        # normalize torques
+        if 'torque_scaling' not in params.keys():
+            torque_scaling = 1.0
+            if method == 'ferrari_canny_L1':
+                mn, mx = obj.mesh.bounding_box()
+                torque_scaling = 1.0 / np.median(mx)
+            params.torque_scaling = torque_scaling 
+
+        if vis:
+            ax = plt.gca()
+            ax.set_xlim3d(0, obj.sdf.dims_[0])
+            ax.set_ylim3d(0, obj.sdf.dims_[1])
+            ax.set_zlim3d(0, obj.sdf.dims_[2])
+            plt.show()
+
+        # evaluate the desired quality metric
+        quality_start = time.time()
+        Q_func = getattr(PointGraspMetrics3D, method)
+        quality = Q_func(forces, torques, normals,
+                         soft_fingers=soft_fingers,
+                         params=params)
+
+        end = time.time()
+        logging.debug('Contacts took %.3f sec' %(forces_start - contacts_start))
+        logging.debug('Forces took %.3f sec' %(quality_start - forces_start))
+        logging.debug('Quality eval took %.3f sec' %(end - quality_start))
+        logging.debug('Everything took %.3f sec' %(end - start))
+        PROFILER.record('grasp_quality/contacts', forces_start - contacts_start)
+        PROFILER.record('grasp_quality/forces', quality_start - forces_start)
+        PROFILER.record('grasp_quality/%s' %(method), end - quality_start)
+        PROFILER.record('grasp_quality/total', end - start)
+
+        return quality
+
+    @staticmethod
+    def grasp_quality_batch(grasps, objs, params):
+        """
+        Computes the quality of many two-finger point grasps using a quasi-static model (see grasp_quality).
+        The wrench programs of the partial closure metric are solved together for all grasps with the same number of
+        contact wrenches, and other metrics are computed one grasp at a time. Wrench resistance depends on the norm of
+        the minimizer, which is not unique for grasp maps with more than six columns, so it is computed one grasp at
+        a time with the same solver as grasp_quality.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`ParallelJawPtGrasp3D`
+            grasps to evaluate
+        objs : :obj:`GraspableObject3D` or :obj:`list` of :obj:`GraspableObject3D`
+            object to evaluate quality on, or one object per grasp (e.g. samples of the object pose)
+        params : :obj:`GraspQualityConfig` or :obj:`list` of :obj:`GraspQualityConfig`
+            parameters of grasp quality function, or one set of parameters per grasp
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            quality of each grasp
+        """
+        num_grasps = len(grasps)
+        if not isinstance(objs, list):
+            objs = [objs] * num_grasps
+        if not isinstance(params, list):
+            params = [params] * num_grasps
+        if len(objs) != num_grasps or len(params) != num_grasps:
+            raise ValueError('Must provide one object and one set of parameters per grasp')
+        if num_grasps == 0:
+            return np.zeros(0)
+
+        method = params[0].quality_method
+        if method not in BATCH_QUALITY_METHODS:
+            return np.array([PointGraspMetrics3D.grasp_quality(grasp, obj, grasp_params)
+                             for grasp, obj, grasp_params in zip(grasps, objs, params)])
+
+        # compute the contact wrenches of each grasp, grouped by their shape
+        start = time.time()
+        qualities = np.zeros(num_grasps)
+        groups = {}
+        for i, (grasp, obj, grasp_params) in enumerate(zip(grasps, objs, params)):
+            if not isinstance(grasp, PointGrasp):
+                raise ValueError('Must provide a point grasp object')
+            if not isinstance(obj, GraspableObject3D):
+                raise ValueError('Must provide a 3D graspable object')
+            if not isinstance(grasp_params, GraspQualityConfig):
+                raise ValueError('Must provide GraspQualityConfig')
+
+            contacts_found, contacts = grasp.close_fingers(obj, check_approach=grasp_params.check_approach)
+            if not contacts_found:
+                logging.debug('Contacts not found')
+                PROFILER.increment('grasp_quality/contacts_not_found')
+                continue
+            wrenches = PointGraspMetrics3D._contact_wrenches(contacts, grasp_params)
+            if wrenches is None:
+                continue
+            if 'torque_scaling' not in grasp_params.keys():
+                grasp_params.torque_scaling = 1.0
+
+            forces, torques, normals = wrenches
+            key = (forces.shape[1], normals.shape[1], bool(grasp_params.soft_fingers))
+            if key not in groups:
+                groups[key] = []
+            groups[key].append((i, wrenches))
+
+        # solve the wrench programs of each group together
+        quality_start = time.time()
+        Q_batch_func = getattr(PointGraspMetrics3D, method + '_batch')
+        for (_, _, soft_fingers), group in groups.iteritems():
+            inds = [i for i, _ in group]
+            forces = np.array([wrenches[0] for _, wrenches in group])
+            torques = np.array([wrenches[1] for _, wrenches in group])
+            normals = np.array([wrenches[2] for _, wrenches in group])
+            qualities[inds] = Q_batch_func(forces, torques, normals,
+                                           soft_fingers=soft_fingers,
+                                           params=[params[i] for i in inds])
+
+        end = time.time()
+        logging.debug('Contacts for %d grasps took %.3f sec' %(num_grasps, quality_start - start))
+        logging.debug('Quality eval for %d grasps took %.3f sec' %(num_grasps, end - quality_start))
+        PROFILER.record('grasp_quality_batch/contacts', quality_start - start)
+        PROFILER.record('grasp_quality_batch/%s' %(method), end - quality_start)
+        return qualities
+
+    @staticmethod
+    def _contact_wrenches(contacts, params, vis=False):
+        """ Stacks the friction cone forces, torques and inward surface normals of a set of contacts,
+        each scaled by the magnitude of the normal force the contact could apply.
+
+        Parameters
+        ----------
+        contacts : :obj:`list` of :obj:`Contact3D`
+            contacts of a grasp with an object
+        params : :obj:`GraspQualityConfig`
+            parameters of grasp quality function
+        vis : bool
+            whether or not to plot the friction cones
+
+        Returns
+        -------
+        forces : 3xN :obj:`numpy.ndarray`
+            set of forces on object in object basis
+        torques : 3xN :obj:`numpy.ndarray`
+            set of torques on object in object basis
+        normals : 3xC :obj:`numpy.ndarray`
+            surface normals at the contact points,
+            or None if the wrenches could not be computed and the grasp has zero quality
+        """
         num_contacts = len(contacts)
         forces = np.zeros([3,0])
         torques = np.zeros([3,0])
@@ -122,19 +275,19 @@ class PointGraspMetrics3D:
                     contact.plot_friction_cone(color='c')
 
             # get contact forces
-            force_success, contact_forces, contact_outward_normal = contact.friction_cone(num_cone_faces, friction_coef)
+            force_success, contact_forces, contact_outward_normal = contact.friction_cone(params.num_cone_faces, params.friction_coef)
 
             if not force_success:
                 logging.debug('Force computation failed')
                 if params.all_contacts_required:
-                    return 0
+                    return None
                 
             # get contact torques
             torque_success, contact_torques = contact.torques(contact_forces)
             if not torque_success:
                 logging.debug('Torque computation failed')
                 if params.all_contacts_required:
-                    return 0
+                    return None
 
             # get the magnitude of the normal force that the contacts could apply
             n = contact.normal_force_magnitude()
@@ -143,40 +296,10 @@ class PointGraspMetrics3D:
             torques = np.c_[torques, n * contact_torques]
             normals = np.c_[normals, n * -contact_outward_normal] # store inward pointing normals
 
-
         if normals.shape[1] == 0:
             logging.debug('No normals')
-            return 0
-
-        # normalize torques
-        if 'torque_scaling' not in params.keys():
-            torque_scaling = 1.0
-            if method == 'ferrari_canny_L1':
-                mn, mx = obj.mesh.bounding_box()
-                torque_scaling = 1.0 / np.median(mx)
-            params.torque_scaling = torque_scaling 
-
-        if vis:
-            ax = plt.gca()
-            ax.set_xlim3d(0, obj.sdf.dims_[0])
-            ax.set_ylim3d(0, obj.sdf.dims_[1])
-            ax.set_zlim3d(0, obj.sdf.dims_[2])
-            plt.show()
-
-        # evaluate the desired quality metric
-        quality_start = time.time()
-        Q_func = getattr(PointGraspMetrics3D, method)
-        quality = Q_func(forces, torques, normals,
-                         soft_fingers=soft_fingers,
-                         params=params)
-
-        end = time.time()
-        logging.debug('Contacts took %.3f sec' %(forces_start - contacts_start))
-        logging.debug('Forces took %.3f sec' %(quality_start - forces_start))
-        logging.debug('Quality eval took %.3f sec' %(end - quality_start))
-        logging.debug('Everything took %.3f sec' %(end - start))
-
-        return quality
+            return None
+        return forces, torques, normals
 
     @staticmethod
     def grasp_matrix(forces, torques, normals, soft_fingers=False,
@@ -203,31 +326,61 @@ class PointGraspMetrics3D:
         G : 6xM :obj:`numpy.ndarray`
             grasp map
         """
+        if normals.ndim == 1:
+            normals = normals.reshape(3, 1)
+        G = PointGraspMetrics3D.grasp_matrix_batch(forces[np.newaxis,...], torques[np.newaxis,...], normals[np.newaxis,...],
+                                                   soft_fingers=soft_fingers, finger_radius=finger_radius, params=params)
+        return G[0,...]
+
+    @staticmethod
+    def grasp_matrix_batch(forces, torques, normals, soft_fingers=False,
+                           finger_radius=0.005, params=None):
+        """ Computes the grasp maps of many grasps with the same number of contact forces at once (see grasp_matrix).
+
+        Parameters
+        ----------
+        forces : Nx3xK :obj:`numpy.ndarray`
+            set of forces on object in object basis for each grasp
+        torques : Nx3xK :obj:`numpy.ndarray`
+            set of torques on object in object basis for each grasp
+        normals : Nx3xC :obj:`numpy.ndarray`
+            surface normals at the contact points of each grasp
+        soft_fingers : bool
+            whether or not to use the soft finger contact model
+        finger_radius : float
+            the radius of the fingers to use
+        params : :obj:`GraspQualityConfig`
+            set of parameters for grasp matrix and contact model
+
+        Returns
+        -------
+        G : Nx6xM :obj:`numpy.ndarray`
+            grasp maps, with M = K + 2C columns for soft fingers and M = K otherwise
+        """
         if params is not None and 'finger_radius' in params.keys():
             finger_radius = params.finger_radius
-        num_forces = forces.shape[1]
-        num_torques = torques.shape[1]
+        torque_scaling = 1.0
+        if params is not None:
+            torque_scaling = params.torque_scaling
+        num_grasps = forces.shape[0]
+        num_forces = forces.shape[2]
+        num_torques = torques.shape[2]
         if num_forces != num_torques:
             raise ValueError('Need same number of forces and torques')
 
         num_cols = num_forces
         if soft_fingers:
-            num_normals = 2
-            if normals.ndim > 1:
-                num_normals = 2*normals.shape[1]
-            num_cols = num_cols + num_normals
+            num_normals = normals.shape[2]
+            num_cols = num_cols + 2 * num_normals
 
-        G = np.zeros([6, num_cols])
-        for i in range(num_forces):
-            G[:3,i] = forces[:,i]
-            G[3:,i] = params.torque_scaling * torques[:,i]
+        G = np.zeros([num_grasps, 6, num_cols])
+        G[:,:3,:num_forces] = forces
+        G[:,3:,:num_forces] = torque_scaling * torques
 
         if soft_fingers:
-            torsion = np.pi * finger_radius**2 * params.friction_coef * normals * params.torque_scaling
-            pos_normal_i = -num_normals
-            neg_normal_i = -num_normals + num_normals / 2
-            G[3:,pos_normal_i:neg_normal_i] = torsion
-            G[3:,neg_normal_i:] = -torsion
+            torsion = np.pi * finger_radius**2 * params.friction_coef * normals * torque_scaling
+            G[:,3:,num_forces:num_forces+num_normals] = torsion
+            G[:,3:,num_forces+num_normals:] = -torsion
 
         return G
 
@@ -252,24 +405,48 @@ class PointGraspMetrics3D:
         """
         if c1.point is None or c2.point is None or c1.normal is None or c2.normal is None:
             return 0
-        p1, p2 = c1.point, c2.point
-        n1, n2 = -c1.normal, -c2.normal # inward facing normals
+        points = np.array([[c1.point, c2.point]])
+        normals = np.array([[c1.normal, c2.normal]])
+        in_force_closure = PointGraspMetrics3D.force_closure_batch(points, normals, friction_coef,
+                                                                   use_abs_value=use_abs_value)
+        return 1 * in_force_closure[0]
 
-        if (p1 == p2).all(): # same point
-            return 0
+    @staticmethod
+    def force_closure_batch(points, normals, friction_coefs, use_abs_value=False):
+        """" Checks force closure of many two-contact grasps at once using the antipodality trick (see force_closure).
 
-        for normal, contact, other_contact in [(n1, p1, p2), (n2, p2, p1)]:
-            diff = other_contact - contact
-            normal_proj = normal.dot(diff) / np.linalg.norm(normal)
-            if use_abs_value:
-                normal_proj = abs(normal.dot(diff)) / np.linalg.norm(normal)
+        Parameters
+        ----------
+        points : Nx2x3 :obj:`numpy.ndarray`
+            contact points of each grasp
+        normals : Nx2x3 :obj:`numpy.ndarray`
+            outward facing surface normals at the contact points of each grasp
+        friction_coefs : float or :obj:`numpy.ndarray`
+            coefficient of friction at the contact points, either shared or one per grasp
+        use_abs_value : bool
+            whether or not to use directoinality of the surface normal (useful when mesh is not oriented)
 
-            if normal_proj < 0:
-                return 0 # wrong side
-            alpha = np.arccos(normal_proj / np.linalg.norm(diff))
-            if alpha > np.arctan(friction_coef):
-                return 0 # outside of friction cone
-        return 1
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            whether or not each grasp is in force closure
+        """
+        points = np.asarray(points, dtype=np.float64)
+        normals = -np.asarray(normals, dtype=np.float64) # inward facing normals
+        max_angles = np.arctan(friction_coefs)
+
+        diffs = points[:,::-1,:] - points # vector from each contact to the other contact
+        diff_norms = np.linalg.norm(diffs, axis=2)
+        normal_projs = np.sum(normals * diffs, axis=2)
+        if use_abs_value:
+            normal_projs = np.abs(normal_projs)
+        normal_projs = normal_projs / np.linalg.norm(normals, axis=2)
+
+        # the angle between each inward normal and the line to the other contact must be within the friction cone
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alphas = np.arccos(np.clip(normal_projs / diff_norms, -1, 1))
+            in_cone = (normal_projs >= 0) & (alphas <= np.reshape(max_angles, [-1, 1]))
+        return np.all(in_cone, axis=1) & (diff_norms[:,0] > 0)
 
     @staticmethod
     def force_closure_qp(forces, torques, normals, soft_fingers=False,
@@ -424,6 +601,182 @@ class PointGraspMetrics3D:
             Q = 1.0 / (finger_force_norm + finger_force_eps) - 1.0 / (2 * force_limit)
         return Q
 
+    @staticmethod
+    def _finger_grasp_matrix_batch(forces, torques, normals, soft_fingers=False, params=None):
+        """ Stacks the grasp maps of each finger of many grasps so that the columns of each finger are contiguous,
+        as required by the L1 finger force constraint of wrench_in_positive_span.
+        """
+        num_fingers = normals.shape[2]
+        num_wrenches_per_finger = forces.shape[2] / num_fingers
+        G = []
+        for i in range(num_fingers):
+            start_i = num_wrenches_per_finger * i
+            end_i = num_wrenches_per_finger * (i + 1)
+            G.append(PointGraspMetrics3D.grasp_matrix_batch(forces[:,:,start_i:end_i], torques[:,:,start_i:end_i],
+                                                            normals[:,:,i:i+1], soft_fingers, params=params))
+        return np.concatenate(G, axis=2)
+
+    @staticmethod
+    def _target_wrenches_in_positive_span_batch(forces, torques, normals, soft_fingers, params,
+                                                wrench_norm_thresh, wrench_regularizer, resolve_resisted=False):
+        """ Checks whether each of many grasps can resist the target wrench of its parameters (see wrench_in_positive_span_batch).
+        The programs of grasps that share a force limit and solver settings are solved together.
+        If resolve_resisted is set, the programs of the grasps found to resist their wrench are solved again with cvxopt,
+        so that their results and finger force norms match wrench_in_positive_span.
+
+        Parameters
+        ----------
+        forces : Nx3xK :obj:`numpy.ndarray`
+            set of forces on object in object basis for each grasp
+        torques : Nx3xK :obj:`numpy.ndarray`
+            set of torques on object in object basis for each grasp
+        normals : Nx3xC :obj:`numpy.ndarray`
+            surface normals at the contact points of each grasp
+        soft_fingers : bool
+            whether or not to use the soft finger contact model
+        params : :obj:`list` of :obj:`GraspQualityConfig`
+            set of parameters for each grasp
+        wrench_norm_thresh : float
+            default threshold to use to determine equivalence of target wrenches
+        wrench_regularizer : float
+            default small float to make quadratic program positive semidefinite
+        resolve_resisted : bool
+            whether or not to solve the programs of the resisted wrenches again with cvxopt
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            whether or not each target wrench can be resisted
+        :obj:`numpy.ndarray`
+            minimum norm of the finger forces required to resist each target wrench
+        """
+        num_grasps = forces.shape[0]
+        num_fingers = normals.shape[2]
+
+        # grasp maps, built once if every grasp shares the same parameters
+        if all([grasp_params is params[0] for grasp_params in params]):
+            G = PointGraspMetrics3D._finger_grasp_matrix_batch(forces, torques, normals, soft_fingers, params=params[0])
+        else:
+            G = np.concatenate([PointGraspMetrics3D._finger_grasp_matrix_batch(forces[i:i+1], torques[i:i+1], normals[i:i+1],
+                                                                               soft_fingers, params=params[i])
+                                for i in range(num_grasps)], axis=0)
+
+        # read the target wrench and solver settings of each grasp
+        target_wrenches = np.zeros([num_grasps, 6])
+        settings = []
+        for i, grasp_params in enumerate(params):
+            grasp_wrench_norm_thresh = wrench_norm_thresh
+            grasp_wrench_regularizer = wrench_regularizer
+            if 'wrench_norm_thresh' in grasp_params.keys():
+                grasp_wrench_norm_thresh = grasp_params.wrench_norm_thresh
+            if 'wrench_regularizer' in grasp_params.keys():
+                grasp_wrench_regularizer = grasp_params.wrench_regularizer
+            target_wrenches[i,:] = np.ravel(grasp_params.target_wrench)
+            settings.append((float(grasp_params.force_limits), grasp_wrench_norm_thresh, grasp_wrench_regularizer))
+
+        wrench_resisted = np.zeros(num_grasps, dtype=np.bool)
+        finger_force_norms = np.zeros(num_grasps)
+        for setting in set(settings):
+            inds = np.array([i for i in range(num_grasps) if settings[i] == setting])
+            force_limit, grasp_wrench_norm_thresh, grasp_wrench_regularizer = setting
+            wrench_resisted[inds], finger_force_norms[inds] = \
+                PointGraspMetrics3D.wrench_in_positive_span_batch(G[inds], target_wrenches[inds], force_limit, num_fingers,
+                                                                  wrench_norm_thresh=grasp_wrench_norm_thresh,
+                                                                  wrench_regularizer=grasp_wrench_regularizer)
+            if resolve_resisted:
+                for i in inds[wrench_resisted[inds]]:
+                    wrench_resisted[i], finger_force_norms[i] = \
+                        PointGraspMetrics3D.wrench_in_positive_span(G[i], target_wrenches[i], force_limit, num_fingers,
+                                                                    wrench_norm_thresh=grasp_wrench_norm_thresh,
+                                                                    wrench_regularizer=grasp_wrench_regularizer)
+        return wrench_resisted, finger_force_norms
+
+    @staticmethod
+    def partial_closure_batch(forces, torques, normals, soft_fingers=False,
+                              wrench_norm_thresh=1e-3, wrench_regularizer=1e-10,
+                              params=None):
+        """ Evalutes partial closure for many grasps with the same number of contacts at once (see partial_closure).
+
+        Parameters
+        ----------
+        forces : Nx3xK :obj:`numpy.ndarray`
+            set of forces on object in object basis for each grasp
+        torques : Nx3xK :obj:`numpy.ndarray`
+            set of torques on object in object basis for each grasp
+        normals : Nx3xC :obj:`numpy.ndarray`
+            surface normals at the contact points of each grasp
+        soft_fingers : bool
+            whether or not to use the soft finger contact model
+        wrench_norm_thresh : float
+            threshold to use to determine equivalence of target wrenches
+        wrench_regularizer : float
+            small float to make quadratic program positive semidefinite
+        params : :obj:`GraspQualityConfig` or :obj:`list` of :obj:`GraspQualityConfig`
+            set of parameters for grasp matrix and contact model, or one set of parameters per grasp
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            1 for each grasp in partial closure, 0 otherwise
+        """
+        num_grasps = forces.shape[0]
+        if params is None:
+            return np.zeros(num_grasps, dtype=np.int)
+        if not isinstance(params, list):
+            params = [params] * num_grasps
+
+        wrench_resisted, _ = PointGraspMetrics3D._target_wrenches_in_positive_span_batch(forces, torques, normals, soft_fingers, params,
+                                                                                         wrench_norm_thresh, wrench_regularizer)
+        return 1 * wrench_resisted
+
+    @staticmethod
+    def wrench_resistance_batch(forces, torques, normals, soft_fingers=False,
+                                wrench_norm_thresh=1e-3, wrench_regularizer=1e-10,
+                                finger_force_eps=1e-9, params=None):
+        """ Evalutes wrench resistance for many grasps with the same number of contacts at once (see wrench_resistance).
+        The batched solver only rules out the grasps that cannot resist their wrench. The norm of the finger forces is
+        not unique when the grasp map has more than six columns, so the remaining grasps are solved with cvxopt as in
+        wrench_resistance, which keeps the metric values unchanged.
+
+        Parameters
+        ----------
+        forces : Nx3xK :obj:`numpy.ndarray`
+            set of forces on object in object basis for each grasp
+        torques : Nx3xK :obj:`numpy.ndarray`
+            set of torques on object in object basis for each grasp
+        normals : Nx3xC :obj:`numpy.ndarray`
+            surface normals at the contact points of each grasp
+        soft_fingers : bool
+            whether or not to use the soft finger contact model
+        wrench_norm_thresh : float
+            threshold to use to determine equivalence of target wrenches
+        wrench_regularizer : float
+            small float to make quadratic program positive semidefinite
+        finger_force_eps : float
+            small float to prevent numeric issues in wrench resistance metric
+        params : :obj:`GraspQualityConfig` or :obj:`list` of :obj:`GraspQualityConfig`
+            set of parameters for grasp matrix and contact model, or one set of parameters per grasp
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            value of the wrench resistance metric for each grasp
+        """
+        num_grasps = forces.shape[0]
+        if params is None:
+            return np.zeros(num_grasps)
+        if not isinstance(params, list):
+            params = [params] * num_grasps
+        force_limits = np.array([grasp_params.force_limits for grasp_params in params], dtype=np.float64)
+        finger_force_eps = np.array([grasp_params.finger_force_eps if 'finger_force_eps' in grasp_params.keys() else finger_force_eps
+                                     for grasp_params in params])
+
+        wrench_resisted, finger_force_norms = PointGraspMetrics3D._target_wrenches_in_positive_span_batch(forces, torques, normals, soft_fingers, params,
+                                                                                                          wrench_norm_thresh, wrench_regularizer,
+                                                                                                          resolve_resisted=True)
+        Q = 1.0 / (finger_force_norms + finger_force_eps) - 1.0 / (2 * force_limits)
+        return np.where(wrench_resisted, Q, 0.0)
+
     @staticmethod
     def min_singular(forces, torques, normals, soft_fingers=False, params=None):
         """ Min singular value of grasp matrix - measure of wrench that grasp is "weakest" at resisting.
@@ -551,6 +904,7 @@ class PointGraspMetrics3D:
         # TODO: suppress ridiculous amount of output for perfectly valid input to qhull
         e = time.time()
         logging.debug('CVH took %.3f sec' %(e - s))
+        PROFILER.record('ferrari_canny_L1/convex_hull', e - s)
         
         debug = False
         if debug:
@@ -576,6 +930,7 @@ class PointGraspMetrics3D:
         min_norm_in_hull, v = PointGraspMetrics3D.min_norm_vector_in_facet(G, wrench_regularizer=wrench_regularizer)
         e = time.time()
         logging.debug('Min norm took %.3f sec' %(e - s))
+        PROFILER.record('ferrari_canny_L1/min_norm', e - s)
 
         # if norm is greater than 0 then forces are outside of hull
         if min_norm_in_hull > wrench_norm_thresh:
@@ -602,6 +957,8 @@ class PointGraspMetrics3D:
                     closest_facet = v
         e = time.time()
         logging.debug('Min dist took %.3f sec for %d vertices' %(e - s, len(hull.vertices)))
+        PROFILER.record('ferrari_canny_L1/min_dist', e - s)
+        PROFILER.increment('ferrari_canny_L1/facets', len(hull.vertices))
 
         return min_dist
 
@@ -632,6 +989,16 @@ class PointGraspMetrics3D:
         float
             minimum norm of the finger forces required to resist the wrench
         """
+        v = PointGraspMetrics3D._wrench_in_positive_span_qp(wrench_basis, target_wrench, force_limit, num_fingers,
+                                                            wrench_regularizer)
+        min_dist = np.linalg.norm(wrench_basis.dot(v).ravel() - target_wrench)**2
+
+        # add back in the target wrench
+        return min_dist < wrench_norm_thresh, np.linalg.norm(v)
+
+    @staticmethod
+    def _wrench_in_positive_span_qp(wrench_basis, target_wrench, force_limit, num_fingers, wrench_regularizer):
+        """ Solves the quadratic program of wrench_in_positive_span with cvxopt and returns the finger forces. """
         num_wrenches = wrench_basis.shape[1]
 
         # quadratic and linear costs
@@ -659,12 +1026,145 @@ class PointGraspMetrics3D:
         G = cvx.matrix(G)
         h = cvx.matrix(h)
         sol = cvx.solvers.qp(P, q, G, h)
-        v = np.array(sol['x'])
+        return np.array(sol['x'])
 
-        min_dist = np.linalg.norm(wrench_basis.dot(v).ravel() - target_wrench)**2
+    @staticmethod
+    def _project_finger_forces(forces, force_limit):
+        """ Projects each row of finger forces onto the set {f >= 0, sum(f) <= force_limit}.
 
-        # add back in the target wrench
-        return min_dist < wrench_norm_thresh, np.linalg.norm(v)
+        Parameters
+        ----------
+        forces : :obj:`numpy.ndarray`
+            array of finger forces, with the forces of each finger in the last dimension
+        force_limit : float
+            L1 upper bound on the forces per finger
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            projected forces
+        """
+        projected_forces = np.maximum(forces, 0)
+        over_limit = np.sum(projected_forces, axis=-1) > force_limit
+        if np.any(over_limit):
+            # project onto the simplex sum(f) = force_limit by thresholding the sorted forces
+            f = forces[over_limit]
+            num_forces = f.shape[1]
+            f_sorted = -np.sort(-f, axis=1)
+            cum_excess = np.cumsum(f_sorted, axis=1) - force_limit
+            support = f_sorted - cum_excess / np.arange(1, num_forces+1) > 0
+            last_support = num_forces - 1 - np.argmax(support[:,::-1], axis=1)
+            thresholds = cum_excess[np.arange(f.shape[0]), last_support] / (last_support + 1)
+            projected_forces[over_limit] = np.maximum(f - thresholds[:,np.newaxis], 0)
+        return projected_forces
+
+    @staticmethod
+    def wrench_in_positive_span_batch(wrench_bases, target_wrenches, force_limit, num_fingers=1,
+                                      wrench_norm_thresh=1e-4, wrench_regularizer=1e-10,
+                                      tol=1e-6, max_iters=5000, use_fallback=True):
+        """ Solves the quadratic programs of wrench_in_positive_span for many wrench bases with the same shape at once
+        using accelerated projected gradient descent on all problems together.
+        Each solve stops when the Frank-Wolfe duality gap certifies that its objective is within tol of the optimum,
+        so the squared wrench distances match an exact solver to within 2 * tol.
+        Problems that do not converge in max_iters iterations are re-solved individually with cvxopt if use_fallback is set.
+
+        Parameters
+        ----------
+        wrench_bases : Bx6xN :obj:`numpy.ndarray`
+            bases for the wrench space
+        target_wrenches : Bx6 or 6 :obj:`numpy.ndarray`
+            target wrench to resist for each basis, or one shared target wrench
+        force_limit : float
+            L1 upper bound on the forces per finger (aka contact point)
+        num_fingers : int
+            number of contacts, used to enforce L1 finger constraint
+        wrench_norm_thresh : float
+            threshold to use to determine equivalence of target wrenches
+        wrench_regularizer : float
+            small float to make quadratic program positive semidefinite
+        tol : float
+            maximum suboptimality of the objective of each program
+        max_iters : int
+            maximum number of gradient iterations
+        use_fallback : bool
+            whether or not to solve programs that do not converge with cvxopt
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            whether or not each wrench can be resisted
+        :obj:`numpy.ndarray`
+            minimum norm of the finger forces required to resist each wrench
+        """
+        num_problems, wrench_dim, num_wrenches = wrench_bases.shape
+        target_wrenches = np.broadcast_to(target_wrenches, [num_problems, wrench_dim])
+        num_wrenches_per_finger = num_wrenches / num_fingers
+
+        # quadratic and linear costs, and step sizes from the largest eigenvalue of each quadratic cost
+        P = np.einsum('bki,bkj->bij', wrench_bases, wrench_bases) + wrench_regularizer * np.eye(num_wrenches)
+        q = -np.einsum('bki,bk->bi', wrench_bases, target_wrenches)
+        step_sizes = 1.0 / np.linalg.eigvalsh(P)[:,-1]
+
+        # the squared wrench distance is twice the objective plus the squared target norm, less the regularization
+        target_norms = np.sum(target_wrenches**2, axis=1)
+        max_regularization = wrench_regularizer * (num_fingers * force_limit)**2
+
+        def objective(v):
+            return 0.5 * np.einsum('bi,bij,bj->b', v, P, v) + np.einsum('bi,bi->b', q, v)
+
+        def project(v):
+            v = v.reshape(-1, num_fingers, num_wrenches_per_finger)
+            return PointGraspMetrics3D._project_finger_forces(v, force_limit).reshape(-1, num_wrenches)
+
+        def duality_gap(v, grad):
+            # the best vertex of the feasible set puts the full force limit on the most negative gradient entry of each finger
+            min_grads = np.min(grad.reshape(-1, num_fingers, num_wrenches_per_finger), axis=2)
+            return np.einsum('bi,bi->b', grad, v) - force_limit * np.sum(np.minimum(min_grads, 0), axis=1)
+
+        # accelerated projected gradient with restarts, iterating only on the unconverged programs
+        v = np.zeros([num_problems, num_wrenches])
+        y = v.copy()
+        t = np.ones(num_problems)
+        f = objective(v)
+        active = np.arange(num_problems)
+        for k in range(max_iters):
+            P_a, q_a, y_a = P[active], q[active], y[active]
+            grad_y = np.einsum('bij,bj->bi', P_a, y_a) + q_a
+            v_next = project(y_a - step_sizes[active,np.newaxis] * grad_y)
+            f_next = 0.5 * np.einsum('bi,bij,bj->b', v_next, P_a, v_next) + np.einsum('bi,bi->b', q_a, v_next)
+
+            # restart momentum for programs whose objective increased
+            restart = f_next > f[active]
+            t_next = (1.0 + np.sqrt(1.0 + 4.0 * t[active]**2)) / 2.0
+            momentum = np.where(restart, 0.0, (t[active] - 1.0) / t_next)
+            y_next = v_next + momentum[:,np.newaxis] * (v_next - v[active])
+            t[active] = np.where(restart, 1.0, t_next)
+            v[active] = v_next
+            f[active] = f_next
+            y[active] = y_next
+
+            # check convergence, stopping early on programs whose lower bound already rules out resisting the wrench
+            grad_v = np.einsum('bij,bj->bi', P_a, v_next) + q_a
+            gaps = duality_gap(v_next, grad_v)
+            min_dist_bounds = 2 * (f_next - gaps) + target_norms[active] - max_regularization
+            converged = (gaps < tol) | (min_dist_bounds >= wrench_norm_thresh)
+            active = active[~converged]
+            if active.shape[0] == 0:
+                break
+
+        # re-solve programs that did not converge
+        if active.shape[0] > 0:
+            if use_fallback:
+                logging.debug('%d of %d wrench programs did not converge, solving with cvxopt' %(active.shape[0], num_problems))
+                for i in active:
+                    v_i = PointGraspMetrics3D._wrench_in_positive_span_qp(wrench_bases[i], target_wrenches[i], force_limit,
+                                                                          num_fingers, wrench_regularizer)
+                    v[i] = v_i.ravel()
+            else:
+                logging.warning('%d of %d wrench programs did not converge' %(active.shape[0], num_problems))
+
+        min_dists = np.sum((np.einsum('bki,bi->bk', wrench_bases, v) - target_wrenches)**2, axis=1)
+        return min_dists < wrench_norm_thresh, np.linalg.norm(v, axis=1)
 
     @staticmethod
     def min_norm_vector_in_facet(facet, wrench_regularizer=1e-10):
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Persistent cache of grasp quality results keyed by grasp, object and quality configuration
+"""
+import hashlib
+import json
+import logging
+import numpy as np
+import sqlite3
+import threading
+
+from dexnet.grasping.narrow_band_sdf import NarrowBandSdf3D
+
+QUALITY_TABLE = 'qualities'
+
+# parameters that quality evaluations add to their configs, with the values that leave the results unchanged
+DERIVED_CONFIG_DEFAULTS = {'torque_scaling': 1.0}
+
+class GraspQualityCache(object):
+    """ Least-recently-used cache of grasp quality results stored in an SQLite database, so that results
+    persist across runs. Results are keyed by a hash of the grasp configuration, the object key, a digest of
+    the object SDF and pose, and the quality configuration, so any change to one of these is recomputed.
+
+    Attributes
+    ----------
+    filename : :obj:`str`
+        path to the SQLite database backing the cache
+    max_entries : int
+        maximum number of results to hold in the cache
+    num_entries : int
+        number of results currently held in the cache
+    hits : int
+        number of lookups that found the result in the cache
+    misses : int
+        number of lookups that did not find the result in the cache
+    evictions : int
+        number of results removed to stay within max_entries
+
+    Notes
+    -----
+    Results of robust metrics are the estimate from the run that computed them, so cached values do not
+    resample the perturbations.
+    """
+    def __init__(self, filename, max_entries=1000000, commit_rate=1000):
+        self.filename_ = filename
+        self.max_entries_ = max_entries
+        self.commit_rate_ = commit_rate
+        self.num_uncommitted_ = 0
+        self.lock_ = threading.Lock()
+        self.reset_stats()
+
+        # open the database
+        self.conn_ = sqlite3.connect(filename, check_same_thread=False)
+        self.conn_.execute('PRAGMA synchronous = NORMAL')
+        self.conn_.execute('CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, quality REAL, uncertainty REAL, last_access INTEGER)' %(QUALITY_TABLE))
+        self.conn_.execute('CREATE INDEX IF NOT EXISTS %s_last_access ON %s (last_access)' %(QUALITY_TABLE, QUALITY_TABLE))
+        self.conn_.commit()
+        self.num_entries_, last_access = self.conn_.execute('SELECT COUNT(*), MAX(last_access) FROM %s' %(QUALITY_TABLE)).fetchone()
+        self.access_count_ = 0
+        if last_access is not None:
+            self.access_count_ = last_access
+        self._evict()
+
+    @property
+    def filename(self):
+        return self.filename_
+
+    @property
+    def max_entries(self):
+        return self.max_entries_
+
+    @property
+    def num_entries(self):
+        return self.num_entries_
+
+    @property
+    def hits(self):
+        return self.hits_
+
+    @property
+    def misses(self):
+        return self.misses_
+
+    @property
+    def evictions(self):
+        return self.evictions_
+
+    @property
+    def stats(self):
+        """ :obj:`dict` : cache statistics, including the hit rate """
+        num_lookups = self.hits_ + self.misses_
+        hit_rate = 0.0
+        if num_lookups > 0:
+            hit_rate = float(self.hits_) / num_lookups
+        return {
+            'hits': self.hits_,
+            'misses': self.misses_,
+            'hit_rate': hit_rate,
+            'evictions': self.evictions_,
+            'num_entries': self.num_entries_,
+            'max_entries': self.max_entries_
+        }
+
+    def __len__(self):
+        return self.num_entries_
+
+    def __contains__(self, key):
+        with self.lock_:
+            return self.conn_.execute('SELECT 1 FROM %s WHERE key = ?' %(QUALITY_TABLE), (key,)).fetchone() is not None
+
+    def reset_stats(self):
+        """ Reset the hit, miss and eviction counts """
+        self.hits_ = 0
+        self.misses_ = 0
+        self.evictions_ = 0
+
+    @staticmethod
+    def _canonical(value):
+        """ Converts a configuration value to JSON-serializable types with a unique representation """
+        if isinstance(value, dict):
+            return dict([(str(k), GraspQualityCache._canonical(v)) for k, v in value.iteritems()])
+        if isinstance(value, (list, tuple)):
+            return [GraspQualityCache._canonical(v) for v in value]
+        if isinstance(value, np.ndarray):
+            return {'shape': list(value.shape), 'data': value.ravel().tolist()}
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def config_digest(quality_config):
+        """ Hash of the parameters of a quality configuration.
+        Derived parameters set to their default values are left out, so that the digest is the same
+        before and after the config is first used to compute a quality.
+
+        Parameters
+        ----------
+        quality_config : :obj:`GraspQualityConfig`
+            configuration to hash
+
+        Returns
+        -------
+        :obj:`str`
+            hex digest of the configuration
+        """
+        params = dict([(k, quality_config[k]) for k in quality_config.keys()
+                       if k not in DERIVED_CONFIG_DEFAULTS.keys() or quality_config[k] != DERIVED_CONFIG_DEFAULTS[k]])
+        params_str = json.dumps(GraspQualityCache._canonical(params), sort_keys=True)
+        return hashlib.sha1(params_str).hexdigest()
+
+    @staticmethod
+    def object_digest(obj, T_obj_world=None):
+        """ Hash of the key, SDF and, optionally, the pose of a graspable object.
+        Narrow band SDFs are hashed by their blocks so that the full grid is never built.
+
+        Parameters
+        ----------
+        obj : :obj:`GraspableObject3D`
+            object to hash
+        T_obj_world : :obj:`autolab_core.RigidTransform`
+            pose of the object in the world
+
+        Returns
+        -------
+        :obj:`str`
+            hex digest of the object
+        """
+        h = hashlib.sha1()
+        h.update(str(obj.key))
+        if obj.sdf is not None:
+            if isinstance(obj.sdf, NarrowBandSdf3D):
+                h.update(np.ascontiguousarray(obj.sdf.blocks).tostring())
+                h.update(np.ascontiguousarray(obj.sdf.block_table).tostring())
+            else:
+                h.update(np.ascontiguousarray(obj.sdf.data).tostring())
+            h.update(np.asarray(obj.sdf.origin, dtype=np.float64).tostring())
+            h.update(np.asarray(obj.sdf.resolution, dtype=np.float64).tostring())
+        if T_obj_world is not None:
+            h.update(np.asarray(T_obj_world.rotation, dtype=np.float64).tostring())
+            h.update(np.asarray(T_obj_world.translation, dtype=np.float64).tostring())
+        return h.hexdigest()
+
+    @staticmethod
+    def key(grasp, object_digest, config_digest):
+        """ Cache key of the quality of a grasp.
+
+        Parameters
+        ----------
+        grasp : :obj:`Grasp`
+            grasp to evaluate
+        object_digest : :obj:`str`
+            digest of the object, from object_digest
+        config_digest : :obj:`str`
+            digest of the quality configuration, from config_digest
+
+        Returns
+        -------
+        :obj:`str`
+            hex digest identifying the quality result
+        """
+        h = hashlib.sha1()
+        h.update(type(grasp).__name__)
+        h.update(np.asarray(grasp.configuration, dtype=np.float64).tostring())
+        h.update(object_digest)
+        h.update(config_digest)
+        return h.hexdigest()
+
+    def get(self, key):
+        """ Look up a quality result, marking it as most recently used.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the result
+
+        Returns
+        -------
+        float
+            the cached quality, or None if the result is not in the cache
+        float
+            the cached uncertainty, or None if the result is not in the cache
+        """
+        with self.lock_:
+            row = self.conn_.execute('SELECT quality, uncertainty FROM %s WHERE key = ?' %(QUALITY_TABLE), (key,)).fetchone()
+            if row is None:
+                self.misses_ += 1
+                return None, None
+            self.access_count_ += 1
+            self.conn_.execute('UPDATE %s SET last_access = ? WHERE key = ?' %(QUALITY_TABLE), (self.access_count_, key))
+            self.hits_ += 1
+            self._mark_uncommitted()
+            return row
+
+    def put(self, key, quality, uncertainty=0.0):
+        """ Add a quality result to the cache, evicting the least recently used results to stay within max_entries.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the result
+        quality : float
+            value of the quality
+        uncertainty : float
+            uncertainty of the quality
+        """
+        with self.lock_:
+            exists = self.conn_.execute('SELECT 1 FROM %s WHERE key = ?' %(QUALITY_TABLE), (key,)).fetchone() is not None
+            self.access_count_ += 1
+            self.conn_.execute('INSERT OR REPLACE INTO %s (key, quality, uncertainty, last_access) VALUES (?, ?, ?, ?)' %(QUALITY_TABLE),
+                               (key, float(quality), float(uncertainty), self.access_count_))
+            if not exists:
+                self.num_entries_ += 1
+            self._evict()
+            self._mark_uncommitted()
+
+    def invalidate(self, key):
+        """ Remove a quality result from the cache, if present.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+            key of the result
+        """
+        with self.lock_:
+            num_removed = self.conn_.execute('DELETE FROM %s WHERE key = ?' %(QUALITY_TABLE), (key,)).rowcount
+            self.num_entries_ -= num_removed
+            self._mark_uncommitted()
+
+    def clear(self):
+        """ Remove all results from the cache """
+        with self.lock_:
+            self.conn_.execute('DELETE FROM %s' %(QUALITY_TABLE))
+            self.conn_.commit()
+            self.num_entries_ = 0
+            self.num_uncommitted_ = 0
+
+    def flush(self):
+        """ Write all pending changes to disk """
+        with self.lock_:
+            self.conn_.commit()
+            self.num_uncommitted_ = 0
+
+    def close(self):
+        """ Write all pending changes to disk and close the database """
+        self.flush()
+        self.conn_.close()
+
+    def _mark_uncommitted(self):
+        """ Count a change, committing every commit_rate changes. Does not lock """
+        self.num_uncommitted_ += 1
+        if self.num_uncommitted_ >= self.commit_rate_:
+            self.conn_.commit()
+            self.num_uncommitted_ = 0
+
+    def _evict(self):
+        """ Remove the least recently used results in excess of max_entries. Does not lock """
+        num_excess = self.num_entries_ - self.max_entries_
+        if num_excess <= 0:
+            return
+        self.conn_.execute('DELETE FROM %s WHERE key IN (SELECT key FROM %s ORDER BY last_access ASC LIMIT ?)' %(QUALITY_TABLE, QUALITY_TABLE),
+                           (num_excess,))
+        self.num_entries_ -= num_excess
+        self.evictions_ += num_excess
+        logging.debug('Evicted %d grasp qualities from %s' %(num_excess, self.filename_))
@@ -42,7 +42,7 @@ import time
 
 import autolab_core.random_variables as rvs
 from dexnet.grasping import PointGraspMetrics3D
-from dexnet.learning import MaxIterTerminationCondition, GaussianUniformAllocationMean, RandomContinuousObjective
+from dexnet.profiler import PROFILER
 
 import IPython
 
@@ -81,38 +81,64 @@ class QuasiStaticGraspQualityRV(rvs.RandomVariable):
 
     def sample(self, size=1):
         """ Samples deterministic quasi-static point grasp quality metrics.
+        The qualities of all samples are computed together with PointGraspMetrics3D.grasp_quality_batch.
 
         Parameters
         ----------
         size : int
             number of samples to take
-        """
-        # sample grasp
-        cur_time = time.time()
-        grasp_sample = self.grasp_rv_.rvs(size=1, iteration=self.sample_count_)
-        grasp_time = time.time()
-
-        # sample object
-        obj_sample = self.obj_rv_.rvs(size=1, iteration=self.sample_count_)
-        obj_time = time.time()
 
-        # sample params
-        params_sample = None
-        if self.params_rv_ is not None:
-            params_sample = self.params_rv_.rvs(size=1, iteration=self.sample_count_)
-        params_time = time.time()
-
-        logging.debug('Sampling took %.3f sec' %(params_time - cur_time))
+        Returns
+        -------
+        float or :obj:`numpy.ndarray`
+            sampled quality, or array of the sampled qualities if size is greater than one
+        """
+        grasp_samples = []
+        obj_samples = []
+        params_samples = []
+        grasp_duration = 0.0
+        obj_duration = 0.0
+        params_duration = 0.0
+        for i in range(size):
+            iteration = self.sample_count_ + i
+
+            # sample grasp
+            cur_time = time.time()
+            grasp_samples.append(self.grasp_rv_.rvs(size=1, iteration=iteration))
+            grasp_time = time.time()
+
+            # sample object
+            obj_samples.append(self.obj_rv_.rvs(size=1, iteration=iteration))
+            obj_time = time.time()
+
+            # sample params
+            params_sample = None
+            if self.params_rv_ is not None:
+                params_sample = self.params_rv_.rvs(size=1, iteration=iteration)
+            params_samples.append(params_sample)
+            params_time = time.time()
+
+            grasp_duration += grasp_time - cur_time
+            obj_duration += obj_time - grasp_time
+            params_duration += params_time - obj_time
+
+        logging.debug('Sampling took %.3f sec' %(grasp_duration + obj_duration + params_duration))
+        PROFILER.record('quality_rv_sample/grasp', grasp_duration)
+        PROFILER.record('quality_rv_sample/obj', obj_duration)
+        PROFILER.record('quality_rv_sample/params', params_duration)
 
         # compute deterministic quality
         start = time.time()
-        q = PointGraspMetrics3D.grasp_quality(grasp_sample, obj_sample,
-                                              params_sample)
+        q = PointGraspMetrics3D.grasp_quality_batch(grasp_samples, obj_samples,
+                                                    params_samples)
         quality_time = time.time()
 
         logging.debug('Quality comp took %.3f sec' %(quality_time - start))
+        PROFILER.record('quality_rv_sample/quality', quality_time - start)
 
-        self.sample_count_ = self.sample_count_ + 1
+        self.sample_count_ = self.sample_count_ + size
+        if size == 1:
+            return q[0]
         return q
 
 class RobustPointGraspMetrics3D:
@@ -145,19 +171,13 @@ class RobustPointGraspMetrics3D:
         # set up random variable
         q_rv = QuasiStaticGraspQualityRV(grasp_rv, graspable_rv,
                                          params_rv, quality_config)
-        candidates = [q_rv]
-        
-        # brute force with uniform allocation
-        snapshot_rate = quality_config['sampling_snapshot_rate']
+
+        # brute force: draw every sample at once so that their wrench programs are solved together
         num_samples = quality_config['num_quality_samples']
-        objective = RandomContinuousObjective()
-        ua = GaussianUniformAllocationMean(objective, candidates)
-        ua_result = ua.solve(termination_condition = MaxIterTerminationCondition(num_samples),
-                             snapshot_rate = snapshot_rate)
+        q_samples = np.atleast_1d(q_rv.sample(size=num_samples))
 
         # convert to estimated prob success
-        final_model = ua_result.models[-1]
-        mn_q = final_model.means
-        std_q = final_model.sample_vars
-        return mn_q[0], std_q[0]
+        mn_q = np.mean(q_samples)
+        std_q = np.mean(q_samples**2) - mn_q**2
+        return mn_q, std_q
         
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Multi-resolution conservative distance bounds of a signed distance field for coarse-to-fine contact search
+"""
+import numpy as np
+
+class SdfPyramid(object):
+    """ Pyramid of conservative signed distance bounds over cells of an SDF grid.
+    The cell at index c of level l covers grid coordinates [c * 2^l, (c+1) * 2^l] along each axis. Its bound is the
+    signed distance closest to zero over the voxels of the cell when they all have the same sign, and zero otherwise,
+    so the trilinearly interpolated SDF at any point in the cell is at least as far from zero as the bound.
+
+    Attributes
+    ----------
+    levels : :obj:`list` of :obj:`numpy.ndarray`
+        bounds of each level, from finest to coarsest
+    min_level : int
+        level of the first entry of levels, each level doubling the side length of the cells
+    dims : 3 :obj:`numpy.ndarray` of int
+        dimensions of the SDF grid
+    surface_thresh : float
+        max absolute signed distance of points on the surface of the SDF
+
+    Notes
+    -----
+    Points outside the grid are snapped to its boundary, matching SDF lookups.
+    Pyramids of block-sparse SDFs, such as NarrowBandSdf3D, are built from the ranges of the blocks and start at the
+    level of the blocks.
+    """
+    def __init__(self, levels, min_level, dims, surface_thresh):
+        self.levels_ = levels
+        self.min_level_ = min_level
+        self.dims_ = np.array(dims).astype(np.int)
+        self.surface_thresh_ = surface_thresh
+
+    @staticmethod
+    def from_sdf(sdf, num_levels=4, min_level=1):
+        """ Builds the pyramid for an SDF.
+
+        Parameters
+        ----------
+        sdf : :obj:`Sdf3D`
+            signed distance field
+        num_levels : int
+            number of levels to store
+        min_level : int
+            finest level to store, cells of level zero are single voxels
+
+        Returns
+        -------
+        :obj:`SdfPyramid`
+            pyramid of the SDF
+        """
+        if min_level < 0 or num_levels < 1:
+            raise ValueError('Pyramid must have at least one level at or above level zero')
+        if hasattr(sdf, 'block_bounds'):
+            return SdfPyramid.from_blocks(sdf, num_levels=num_levels, min_level=min_level)
+        data = np.asarray(sdf.data)
+        surface_thresh = getattr(sdf, 'surface_thresh_', sdf.resolution * np.sqrt(2) / 2)
+
+        # level zero cells span the eight voxels used to interpolate inside them
+        min_vals = data.astype(np.float32)
+        max_vals = data.astype(np.float32)
+        for axis in range(3):
+            min_vals = SdfPyramid._reduce_pairs(min_vals, axis, np.minimum, overlap=True)
+            max_vals = SdfPyramid._reduce_pairs(max_vals, axis, np.maximum, overlap=True)
+
+        levels = SdfPyramid._levels_from_ranges(min_vals, max_vals, 0, min_level, min_level + num_levels)
+        return SdfPyramid(levels, min_level, data.shape, surface_thresh)
+
+    @staticmethod
+    def from_blocks(sdf, num_levels=4, min_level=1):
+        """ Builds the pyramid for a block-sparse SDF from the ranges of its blocks, without building the full grid.
+        The finest level is raised to the level of the blocks, keeping the same coarsest level.
+
+        Parameters
+        ----------
+        sdf : :obj:`NarrowBandSdf3D`
+            signed distance field stored in cubic blocks with a power of two side length
+        num_levels : int
+            number of levels to store, counting from min_level
+        min_level : int
+            finest level to store, cells of level zero are single voxels
+
+        Returns
+        -------
+        :obj:`SdfPyramid`
+            pyramid of the SDF
+        """
+        block_level = int(np.log2(sdf.block_size))
+        if 2**block_level != sdf.block_size:
+            raise ValueError('Block size %d is not a power of two' %(sdf.block_size))
+        max_level = max(min_level + num_levels, block_level + 1)
+        min_level = max(min_level, block_level)
+        min_vals, max_vals = sdf.block_bounds()
+        levels = SdfPyramid._levels_from_ranges(min_vals, max_vals, block_level, min_level, max_level)
+        return SdfPyramid(levels, min_level, sdf.dims, sdf.surface_thresh)
+
+    @staticmethod
+    def _levels_from_ranges(min_vals, max_vals, level, min_level, max_level):
+        """ Bounds of the levels in [min_level, max_level) from the min and max signed distance over the cells of the
+        given level """
+        levels = []
+        while level < max_level:
+            if level >= min_level:
+                levels.append(np.where(min_vals > 0, min_vals, np.where(max_vals < 0, max_vals, 0)).astype(np.float32))
+            for axis in range(3):
+                min_vals = SdfPyramid._reduce_pairs(min_vals, axis, np.minimum)
+                max_vals = SdfPyramid._reduce_pairs(max_vals, axis, np.maximum)
+            level += 1
+        return levels
+
+    @staticmethod
+    def _reduce_pairs(array, axis, op, overlap=False):
+        """ Combines neighboring entries along an axis, either overlapping pairs (i, i+1) or disjoint pairs (2i, 2i+1).
+        Odd lengths are padded with the last entry """
+        array = np.swapaxes(array, 0, axis)
+        if overlap:
+            if array.shape[0] > 1:
+                array = op(array[:-1], array[1:])
+        else:
+            if array.shape[0] % 2 == 1:
+                array = np.concatenate([array, array[-1:]])
+            array = op(array[0::2], array[1::2])
+        return np.swapaxes(array, 0, axis)
+
+    @property
+    def levels(self):
+        return self.levels_
+
+    @property
+    def num_levels(self):
+        return len(self.levels_)
+
+    @property
+    def min_level(self):
+        return self.min_level_
+
+    @property
+    def dims(self):
+        return self.dims_
+
+    @property
+    def surface_thresh(self):
+        return self.surface_thresh_
+
+    @property
+    def nbytes(self):
+        """ int : number of bytes in the levels of the pyramid """
+        return sum([level.nbytes for level in self.levels_])
+
+    def bounds(self, pts_grid, level):
+        """ Conservative signed distance bounds at points.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+        level : int
+            pyramid level to look up, at least min_level
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            bound of the cell containing each point
+        """
+        bounds = self.levels_[level - self.min_level_]
+        pts_grid = np.clip(np.asarray(pts_grid, dtype=np.float64).reshape(3, -1), 0, self.dims_.reshape(3, 1) - 1)
+        cells = np.floor(pts_grid / 2**level).astype(np.int)
+        cells = np.minimum(cells, np.array(bounds.shape).reshape(3, 1) - 1)
+        return bounds[cells[0], cells[1], cells[2]]
+
+    def near_surface(self, pts_grid):
+        """ Finds the points that may lie on the surface, checking the coarsest level first and refining
+        only the points whose cells the surface may pass through.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            False for points whose signed distance is guaranteed to exceed the surface threshold
+        """
+        pts_grid = np.asarray(pts_grid, dtype=np.float64).reshape(3, -1)
+        near = np.ones(pts_grid.shape[1], dtype=np.bool)
+        for level in range(self.min_level_ + self.num_levels - 1, self.min_level_ - 1, -1):
+            indices = np.nonzero(near)[0]
+            if indices.shape[0] == 0:
+                break
+            near[indices] = np.abs(self.bounds(pts_grid[:,indices], level)) < self.surface_thresh_
+        return near
+
+    def rescale(self, scale):
+        """ Rescales the bounds along with the SDF.
+
+        Parameters
+        ----------
+        scale : float
+            the amount to scale the SDF
+
+        Returns
+        -------
+        :obj:`SdfPyramid`
+            pyramid of the rescaled SDF
+        """
+        levels = [scale * level for level in self.levels_]
+        return SdfPyramid(levels, self.min_level_, self.dims_, scale * self.surface_thresh_)
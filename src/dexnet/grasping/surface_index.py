@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Precomputed surface geometry of a signed distance field for fast contact and sampling queries
+"""
+import numpy as np
+import scipy.ndimage as ndimage
+import scipy.spatial as ss
+
+class SurfaceIndex(object):
+    """ Acceleration structure over the surface of a graspable object's SDF.
+    Holds the surface points with a KD-tree over them, the mask of on-surface voxels, and the SDF gradient volume
+    used to look up surface normals by trilinear interpolation.
+    The mask and gradients are built from the SDF on first use unless provided, so indexes of sparse SDFs that are
+    only used for sampling stay small. SDFs that implement interpolate and interpolate_gradient themselves, such as
+    NarrowBandSdf3D, are queried directly and never get a gradient volume.
+
+    Attributes
+    ----------
+    sdf : :obj:`Sdf3D`
+        signed distance field the index was built from
+    surface_points_grid : Nx3 :obj:`numpy.ndarray`
+        surface points in grid coordinates
+    surface_points : Nx3 :obj:`numpy.ndarray`
+        surface points in the object frame
+    surface_mask : :obj:`numpy.ndarray` of bool
+        mask of the voxels on the surface, same shape as the SDF
+    gradients : 3xDxHxW :obj:`numpy.ndarray`
+        gradient of the SDF along each grid axis, None for SDFs that interpolate their own gradient
+    kd_tree : :obj:`scipy.spatial.cKDTree`
+        KD-tree over the surface points in the object frame, built on first use
+
+    Notes
+    -----
+    The arrays are shared between all users of the index, so they should be treated as read-only.
+    """
+    def __init__(self, sdf, surface_points_grid, surface_mask=None, gradients=None):
+        dims = tuple(sdf.dims_)
+        if surface_mask is not None and surface_mask.shape != dims:
+            raise ValueError('Surface mask shape %s does not match SDF shape %s' %(str(surface_mask.shape), str(dims)))
+        if gradients is not None and gradients.shape != (3,) + dims:
+            raise ValueError('Gradient shape %s does not match SDF shape %s' %(str(gradients.shape), str(dims)))
+        self.sdf_ = sdf
+        self.surface_points_grid_ = np.asarray(surface_points_grid).astype(np.int, copy=False)
+        self.surface_points_ = sdf.transform_pt_grid_to_obj(self.surface_points_grid_.T).T
+        self.surface_mask_ = surface_mask
+        if surface_mask is not None:
+            self.surface_mask_ = surface_mask.astype(np.bool, copy=False)
+        self.gradients_ = gradients
+        self.kd_tree_ = None
+
+    @staticmethod
+    def from_sdf(sdf):
+        """ Builds the index for an SDF.
+
+        Parameters
+        ----------
+        sdf : :obj:`Sdf3D`
+            signed distance field to index
+
+        Returns
+        -------
+        :obj:`SurfaceIndex`
+            index of the surface of the SDF
+        """
+        surface_points_grid, _ = sdf.surface_points(grid_basis=True)
+        return SurfaceIndex(sdf, surface_points_grid)
+
+    @staticmethod
+    def from_surface_mask(sdf, surface_mask, gradients=None):
+        """ Builds the index from a precomputed surface mask.
+
+        Parameters
+        ----------
+        sdf : :obj:`Sdf3D`
+            signed distance field to index
+        surface_mask : :obj:`numpy.ndarray` of bool
+            mask of the voxels on the surface, same shape as the SDF
+        gradients : 3xDxHxW :obj:`numpy.ndarray`
+            gradient of the SDF along each grid axis, None to compute on first use
+
+        Returns
+        -------
+        :obj:`SurfaceIndex`
+            index of the surface of the SDF
+        """
+        surface_points_grid = np.array(np.nonzero(surface_mask)).T
+        return SurfaceIndex(sdf, surface_points_grid, surface_mask=surface_mask, gradients=gradients)
+
+    def transform(self, sdf_tf):
+        """ Index of a transformed copy of the SDF, such as the result of Sdf3D.transform.
+        The surface mask and gradients are in grid coordinates, so they are built here if necessary and shared
+        with the new index, and only the surface points in the object frame and the KD-tree are recomputed.
+
+        Parameters
+        ----------
+        sdf_tf : :obj:`Sdf3D`
+            transformed SDF with the same grid as the indexed SDF
+
+        Returns
+        -------
+        :obj:`SurfaceIndex`
+            index of the surface of the transformed SDF
+        """
+        if tuple(sdf_tf.dims_) != tuple(self.sdf_.dims_):
+            raise ValueError('Transformed SDF shape %s does not match SDF shape %s' %(str(tuple(sdf_tf.dims_)), str(tuple(self.sdf_.dims_))))
+        return SurfaceIndex(sdf_tf, self.surface_points_grid_,
+                            surface_mask=self.surface_mask,
+                            gradients=self.gradients)
+
+    @property
+    def sdf(self):
+        return self.sdf_
+
+    @property
+    def surface_mask(self):
+        if self.surface_mask_ is None:
+            self.surface_mask_ = np.zeros(tuple(self.sdf_.dims_), dtype=np.bool)
+            self.surface_mask_[self.surface_points_grid_[:,0], self.surface_points_grid_[:,1], self.surface_points_grid_[:,2]] = True
+        return self.surface_mask_
+
+    @property
+    def interpolates_sdf(self):
+        """ bool : whether or not the SDF interpolates its own values and gradient """
+        return hasattr(self.sdf_, 'interpolate') and hasattr(self.sdf_, 'interpolate_gradient')
+
+    @property
+    def gradients(self):
+        if self.gradients_ is None and not self.interpolates_sdf:
+            self.gradients_ = np.array(np.gradient(self.sdf_.data)).astype(np.float32)
+        return self.gradients_
+
+    @property
+    def surface_points(self):
+        return self.surface_points_
+
+    @property
+    def surface_points_grid(self):
+        return self.surface_points_grid_
+
+    @property
+    def num_surface_points(self):
+        return self.surface_points_.shape[0]
+
+    @property
+    def kd_tree(self):
+        if self.kd_tree_ is None:
+            self.kd_tree_ = ss.cKDTree(self.surface_points_)
+        return self.kd_tree_
+
+    @property
+    def nbytes(self):
+        """ int : number of bytes in the arrays of the index that have been built, counting the KD-tree as a copy of
+        the surface points and their indices """
+        num_bytes = self.surface_points_.nbytes + self.surface_points_grid_.nbytes
+        for array in [self.surface_mask_, self.gradients_]:
+            if array is not None:
+                num_bytes += array.nbytes
+        if self.kd_tree_ is not None:
+            num_bytes += self.surface_points_.nbytes + self.num_surface_points * np.dtype(np.intp).itemsize
+        return num_bytes
+
+    def on_surface(self, pts_grid):
+        """ Checks whether or not points lie in on-surface voxels.
+
+        Parameters
+        ----------
+        pts_grid : 3xN or 3 :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            whether or not the nearest voxel to each point is on the surface, False outside the grid
+        """
+        pts_grid = np.asarray(pts_grid)
+        voxels = np.round(pts_grid).astype(np.int).reshape(3, -1)
+        surface_mask = self.surface_mask
+        dims = np.array(surface_mask.shape).reshape(3, 1)
+        in_bounds = np.all(voxels >= 0, axis=0) & np.all(voxels < dims, axis=0)
+        on_surface = np.zeros(voxels.shape[1], dtype=np.bool)
+        voxels = voxels[:,in_bounds]
+        on_surface[in_bounds] = surface_mask[voxels[0], voxels[1], voxels[2]]
+        if pts_grid.ndim == 1:
+            return on_surface[0]
+        return on_surface
+
+    def interpolate(self, pts_grid):
+        """ Trilinearly interpolates the SDF at points, snapping points outside the grid to its boundary.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            signed distance at each point
+        """
+        if self.interpolates_sdf:
+            return self.sdf_.interpolate(pts_grid)
+        return ndimage.map_coordinates(self.sdf_.data, pts_grid, order=1, mode='nearest')
+
+    def interpolate_gradient(self, pts_grid):
+        """ Trilinearly interpolates the SDF gradient at points, snapping points outside the grid to its boundary.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        3xN :obj:`numpy.ndarray`
+            gradient along each grid axis at each point, per voxel
+        """
+        if self.interpolates_sdf:
+            return self.sdf_.interpolate_gradient(pts_grid)
+        return np.array([ndimage.map_coordinates(g, pts_grid, order=1, mode='nearest') for g in self.gradients])
+
+    def surface_normals(self, pts_grid):
+        """ Outward surface normals from the interpolated SDF gradient.
+
+        Parameters
+        ----------
+        pts_grid : 3xN :obj:`numpy.ndarray`
+            points in grid coordinates
+
+        Returns
+        -------
+        normals : 3xN :obj:`numpy.ndarray`
+            normalized gradients in grid coordinates
+        valid : :obj:`numpy.ndarray` of bool
+            whether or not each gradient was large enough to normalize
+        """
+        grads = self.interpolate_gradient(pts_grid)
+        norms = np.linalg.norm(grads, axis=0)
+        valid = norms > np.finfo(np.float32).eps
+        normals = grads / np.where(valid, norms, 1.0)
+        return normals, valid
+
+    def surface_normal(self, pt_grid):
+        """ Outward surface normal at a single point from the interpolated SDF gradient.
+
+        Parameters
+        ----------
+        pt_grid : 3 :obj:`numpy.ndarray`
+            point in grid coordinates
+
+        Returns
+        -------
+        3 :obj:`numpy.ndarray`
+            normal in grid coordinates, or None if the gradient vanishes at the point
+        """
+        normals, valid = self.surface_normals(np.asarray(pt_grid, dtype=np.float64).reshape(3, 1))
+        if not valid[0]:
+            return None
+        return normals[:,0]
+
+    def surface_points_in_radius(self, point, radius):
+        """ Surface points within a radius of a point.
+
+        Parameters
+        ----------
+        point : 3 :obj:`numpy.ndarray`
+            query point in the object frame
+        radius : float
+            search radius in the object frame
+
+        Returns
+        -------
+        Mx3 :obj:`numpy.ndarray`
+            surface points within the radius, in the object frame
+        """
+        indices = self.kd_tree.query_ball_point(point, radius)
+        return self.surface_points_[np.sort(indices).astype(np.int)]
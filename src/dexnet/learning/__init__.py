@@ -19,22 +19,28 @@ PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
 HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
 MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """
+from segment_tree import MaxSegmentTree
 from models import Model, DiscreteModel, Snapshot, BernoulliSnapshot, BetaBernoulliSnapshot, GaussianSnapshot, BernoulliModel, BetaBernoulliModel, GaussianModel, CorrelatedBetaBernoulliModel
 from termination_conditions import TerminationCondition, MaxIterTerminationCondition, ProgressTerminationCondition, ConfidenceTerminationCondition, OrTerminationCondition, AndTerminationCondition
-from discrete_selection_policies import DiscreteSelectionPolicy, UniformSelectionPolicy, MaxDiscreteSelectionPolicy, ThompsonSelectionPolicy, BetaBernoulliGittinsIndex98Policy, BetaBernoulliBayesUCBPolicy, GaussianUCBPolicy
+from gittins import compute_gittins_index_table, gittins_index_table
+from discrete_selection_policies import DiscreteSelectionPolicy, UniformSelectionPolicy, MaxDiscreteSelectionPolicy, ThompsonSelectionPolicy, BetaBernoulliGittinsIndexPolicy, BetaBernoulliGittinsIndex98Policy, BetaBernoulliBayesUCBPolicy, GaussianUCBPolicy
 from objectives import Objective, DifferentiableObjective, MaximizationObjective, MinimizationObjective, NonDeterministicObjective, ZeroOneObjective, IdentityObjective, RandomBinaryObjective, RandomContinuousObjective, LeastSquaresObjective, LogisticCrossEntropyObjective, CrossEntropyLoss, SquaredErrorLoss, WeightedSquaredErrorLoss, CCBPLogLikelihood
+from snapshot_policies import snapshot_bytes, SnapshotPolicy, KeepAllSnapshotPolicy, BestOnlySnapshotPolicy, RingBufferSnapshotPolicy, SinkSnapshotPolicy
 from solvers import Solver, TopKSolver, SamplingSolver, DiscreteSamplingSolver, OptimizationSolver
 from discrete_adaptive_samplers import AdaptiveSamplingResult, DiscreteAdaptiveSampler, BetaBernoulliBandit, UniformAllocationMean, ThompsonSampling, GittinsIndex98, GaussianBandit, GaussianUniformAllocationMean, GaussianThompsonSampling, GaussianUCBSampling, CorrelatedBetaBernoulliBandit, CorrelatedThompsonSampling, CorrelatedBayesUCB, CorrelatedGittins
-from analysis import ConfusionMatrix, ClassificationResult, RegressionResult
+from analysis import ConfusionMatrix, ClassificationResult, StreamingClassificationResult, RegressionResult
 
-from tensor_dataset import Tensor, TensorDataset
+from tensor_dataset import Tensor, TensorDataset, TensorDatasetView
 
-__all__ = ['Model', 'DiscreteModel', 'Snapshot', 'BernoulliSnapshot', 'BetaBernoulliSnapshot', 'GaussianSnapshot', 'BernoulliModel', 'BetaBernoulliModel', 'GaussianModel', 'CorrelatedBetaBernoulliModel',
+__all__ = ['MaxSegmentTree',
+           'Model', 'DiscreteModel', 'Snapshot', 'BernoulliSnapshot', 'BetaBernoulliSnapshot', 'GaussianSnapshot', 'BernoulliModel', 'BetaBernoulliModel', 'GaussianModel', 'CorrelatedBetaBernoulliModel',
            'TerminationCondition', 'MaxIterTerminationCondition', 'ProgressTerminationCondition', 'ConfidenceTerminationCondition', 'OrTerminationCondition', 'AndTerminationCondition',
-           'DiscreteSelectionPolicy', 'UniformSelectionPolicy', 'MaxDiscreteSelectionPolicy', 'ThompsonSelectionPolicy', 'BetaBernoulliGittinsIndex98Policy', 'BetaBernoulliBayesUCBPolicy', 'GaussianUCBPolicy',
+           'compute_gittins_index_table', 'gittins_index_table',
+           'DiscreteSelectionPolicy', 'UniformSelectionPolicy', 'MaxDiscreteSelectionPolicy', 'ThompsonSelectionPolicy', 'BetaBernoulliGittinsIndexPolicy', 'BetaBernoulliGittinsIndex98Policy', 'BetaBernoulliBayesUCBPolicy', 'GaussianUCBPolicy',
            'Objective', 'DifferentiableObjective', 'MaximizationObjective', 'MinimizationObjective', 'NonDeterministicObjective', 'ZeroOneObjective', 'IdentityObjective', 'RandomBinaryObjective', 'RandomContinuousObjective', 'LeastSquaresObjective', 'LogisticCrossEntropyObjective', 'CrossEntropyLoss', 'SquaredErrorLoss', 'WeightedSquaredErrorLoss', 'CCBPLogLikelihood',
+           'snapshot_bytes', 'SnapshotPolicy', 'KeepAllSnapshotPolicy', 'BestOnlySnapshotPolicy', 'RingBufferSnapshotPolicy', 'SinkSnapshotPolicy',
            'Solver', 'TopKSolver', 'SamplingSolver', 'DiscreteSamplingSolver', 'OptimizationSolver',
            'AdaptiveSamplingResult', 'DiscreteAdaptiveSampler', 'BetaBernoulliBandit', 'UniformAllocationMean', 'ThompsonSampling', 'GittinsIndex98', 'GaussianBandit', 'GaussianUniformAllocationMean', 'GaussianThompsonSampling', 'GaussianUCBSampling', 'CorrelatedBetaBernoulliBandit', 'CorrelatedThompsonSampling', 'CorrelatedBayesUCB', 'CorrelatedGittins',
-           'ConfusionMatrix', 'ClassificationResult', 'RegressionResult',
-           'Tensor', 'TensorDataset'
+           'ConfusionMatrix', 'ClassificationResult', 'StreamingClassificationResult', 'RegressionResult',
+           'Tensor', 'TensorDataset', 'TensorDatasetView'
 ]
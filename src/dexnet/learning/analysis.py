@@ -38,22 +38,19 @@ class ConfusionMatrix(object):
         self.matrix = np.zeros([num_categories, num_categories])
 
     def update(self, predictions, labels):
-        num_pred = predictions.shape[0]
-        for i in range(num_pred):
-            self.matrix[labels[i].astype(np.uint16), predictions[i].astype(np.uint16)] += 1
+        labels = np.asarray(labels).astype(np.uint16)
+        predictions = np.asarray(predictions).astype(np.uint16)
+        np.add.at(self.matrix, (labels, predictions), 1)
 
 class ClassificationResult(object):
     def __init__(self, pred_probs_list, labels_list):
         self.pred_probs = None
         self.labels = None
+        self.predictions_ = None
         
-        for pred_probs, labels in zip(pred_probs_list, labels_list):
-            if self.pred_probs is None:
-                self.pred_probs = pred_probs
-                self.labels = labels
-            else:
-                self.pred_probs = np.r_[self.pred_probs, pred_probs]
-                self.labels = np.r_[self.labels, labels]
+        if len(pred_probs_list) > 0:
+            self.pred_probs = np.concatenate(pred_probs_list)
+            self.labels = np.concatenate(labels_list)
 
     @property
     def error_rate(self):
@@ -101,7 +98,11 @@ class ClassificationResult(object):
         
     @property
     def predictions(self):
-        return np.argmax(self.pred_probs, 1)
+        # cache the argmax, recomputing only if the probabilities are replaced
+        if self.predictions_ is None or self.predictions_probs_ is not self.pred_probs:
+            self.predictions_ = np.argmax(self.pred_probs, 1)
+            self.predictions_probs_ = self.pred_probs
+        return self.predictions_
 
     def top_k_predictions(self, k):
         return np.argpartition(self.pred_probs, -k, axis=1)[:, -k:]
@@ -191,6 +192,147 @@ class ClassificationResult(object):
         labels = np.load(labels_filename)['arr_0']
         return ClassificationResult([pred_probs], [labels])
 
+class StreamingClassificationResult(object):
+    """ Accumulates classification metrics batch by batch in constant memory.
+    Keeps a confusion matrix and histograms of the predicted probability of category 1 for the positive (label 1)
+    and negative datapoints, so the precision-recall and ROC curves are approximated at the histogram bin edges.
+
+    Attributes
+    ----------
+    num_categories : int
+        number of categories
+    num_bins : int
+        number of probability bins for the precision-recall and ROC curves
+    """
+    def __init__(self, num_categories, num_bins=1000):
+        self.num_categories = num_categories
+        self.num_bins = num_bins
+        self.cm = ConfusionMatrix(num_categories)
+        self.pos_hist = np.zeros(num_bins)
+        self.neg_hist = np.zeros(num_bins)
+
+    def update(self, pred_probs, labels):
+        """ Add a batch of predicted probabilities and labels.
+
+        Parameters
+        ----------
+        pred_probs : :obj:`numpy.ndarray`
+            num_datapoints x num_categories array of predicted probabilities
+        labels : :obj:`numpy.ndarray`
+            true category of each datapoint
+        """
+        labels = np.asarray(labels).astype(np.int64)
+        predictions = np.argmax(pred_probs, 1)
+        self.cm.matrix += np.bincount(labels * self.num_categories + predictions,
+                                      minlength=self.num_categories**2).reshape(self.num_categories, self.num_categories)
+
+        if self.num_categories > 1:
+            bins = np.clip((pred_probs[:,1] * self.num_bins).astype(np.int64), 0, self.num_bins-1)
+            self.pos_hist += np.bincount(bins[labels == 1], minlength=self.num_bins)
+            self.neg_hist += np.bincount(bins[labels == 0], minlength=self.num_bins)
+
+    @property
+    def confusion_matrix(self):
+        return self.cm
+
+    @property
+    def num_datapoints(self):
+        return int(np.sum(self.cm.matrix))
+
+    @property
+    def error_rate(self):
+        return 100.0 - (
+            100.0 *
+            np.trace(self.cm.matrix) /
+            self.num_datapoints)
+
+    @property
+    def fpr(self):
+        num_neg = np.sum(self.cm.matrix[0,:])
+        if num_neg == 0:
+            return 0.0
+        return float(self.cm.matrix[0,1]) / num_neg
+
+    @property
+    def precision(self):
+        num_pred_pos = np.sum(self.cm.matrix[:,1])
+        if num_pred_pos == 0:
+            return 1.0
+        return float(self.cm.matrix[1,1]) / num_pred_pos
+
+    @property
+    def recall(self):
+        if np.sum(self.cm.matrix[:,1]) == 0:
+            return 1.0
+        return float(self.cm.matrix[1,1]) / np.sum(self.cm.matrix[1,:])
+
+    def _cumulative_counts(self):
+        """ Returns the true and false positive counts for thresholds at the lower edge of each bin, highest threshold first """
+        tps = np.cumsum(self.pos_hist[::-1])
+        fps = np.cumsum(self.neg_hist[::-1])
+        thresholds = np.arange(self.num_bins)[::-1] / float(self.num_bins)
+        return tps, fps, thresholds
+
+    def precision_recall_curve(self, plot=False, line_width=2, font_size=15, color='b', style='-', label='', marker=None):
+        tps, fps, thresholds = self._cumulative_counts()
+        valid = (tps + fps) > 0
+        tps, fps, thresholds = tps[valid], fps[valid], thresholds[valid]
+        precision = tps / (tps + fps)
+        recall = tps / max(tps[-1], 1)
+
+        # match the ordering of sklearn, with increasing thresholds and a final point at zero recall
+        precision = np.r_[precision[::-1], 1]
+        recall = np.r_[recall[::-1], 0]
+        thresholds = thresholds[::-1]
+        if plot:
+            plt.plot(recall, precision, linewidth=line_width, color=color, linestyle=style, label=label, marker=marker)
+            plt.xlabel('Recall', fontsize=font_size)
+            plt.ylabel('Precision', fontsize=font_size)
+        return precision, recall, thresholds
+
+    def roc_curve(self, plot=False, line_width=2, font_size=15, color='b', style='-', label=''):
+        tps, fps, thresholds = self._cumulative_counts()
+        fpr = np.r_[0, fps / max(fps[-1], 1)]
+        tpr = np.r_[0, tps / max(tps[-1], 1)]
+        thresholds = np.r_[1, thresholds]
+
+        if plot:
+            plt.plot(fpr, tpr, linewidth=line_width, color=color, linestyle=style, label=label)
+            plt.xlabel('FPR', fontsize=font_size)
+            plt.ylabel('TPR', fontsize=font_size)
+        return fpr, tpr, thresholds
+
+    @property
+    def ap_score(self):
+        precision, recall, _ = self.precision_recall_curve()
+        return -np.sum(np.diff(recall) * precision[:-1])
+
+    @property
+    def auc_score(self):
+        fpr, tpr, _ = self.roc_curve()
+        return np.trapz(tpr, fpr)
+
+    def save(self, filename):
+        if not os.path.exists(filename):
+            os.mkdir(filename)
+        np.savez_compressed(os.path.join(filename, 'streaming_result.npz'),
+                            confusion_matrix=self.cm.matrix,
+                            pos_hist=self.pos_hist,
+                            neg_hist=self.neg_hist)
+
+    @staticmethod
+    def load(filename):
+        if not os.path.exists(filename):
+            raise ValueError('File %s does not exists' %(filename))
+
+        data = np.load(os.path.join(filename, 'streaming_result.npz'))
+        num_categories = data['confusion_matrix'].shape[0]
+        result = StreamingClassificationResult(num_categories, num_bins=data['pos_hist'].shape[0])
+        result.cm.matrix = data['confusion_matrix']
+        result.pos_hist = data['pos_hist']
+        result.neg_hist = data['neg_hist']
+        return result
+
 class RegressionResult(object):
     def __init__(self, predictions_list, labels_list):
         self.predictions = None
@@ -31,6 +31,7 @@ from abc import ABCMeta, abstractmethod
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 import scipy.io
 import scipy.stats
 import time
@@ -41,9 +42,29 @@ from dexnet.learning import DiscreteSelectionPolicy, UniformSelectionPolicy, Tho
 from dexnet.learning import DiscreteModel, BetaBernoulliModel, GaussianModel, CorrelatedBetaBernoulliModel
 from dexnet.learning import DiscreteSamplingSolver
 from dexnet.learning import MaxIterTerminationCondition
+from dexnet.learning import KeepAllSnapshotPolicy, snapshot_bytes
 
 import IPython
 
+def _evaluate_objective(args):
+    """ Evaluates an objective on a candidate in a worker of a thread or process pool.
+    Worker processes reseed the numpy random state so that nondeterministic objectives
+    do not draw the same samples in every process.
+
+    Parameters
+    ----------
+    args : :obj:`tuple`
+        the objective, the candidate, a random seed, and the id of the process that created the batch
+
+    Returns
+    -------
+    objective output value for the candidate
+    """
+    objective, candidate, seed, parent_pid = args
+    if os.getpid() != parent_pid:
+        np.random.seed(seed)
+    return objective.evaluate(candidate)
+
 class AdaptiveSamplingResult:
     """
     Struct to store the results of sampling / optimization.
@@ -66,10 +87,13 @@ class AdaptiveSamplingResult:
         the indices of the candidates selected at each snapshot iteration
     vals : list of objective output values
         the value returned by the evaluated candidate at each snapshot iteration
-    models : list of :obj:`Model`
-        the state of the current candidate objective value predictive model at each snapshot iteration
+    models : list of :obj:`Snapshot`
+        the snapshots of the predictive model retained by the snapshot policy, in the order they were taken.
+        The last entry is always the model state at the final iteration. Unless every snapshot is kept,
+        these do not line up with iters
     best_pred_ind : list of int
-        the indices of the candidate predicted to be the best by the model at each snapshot iteration
+        the indices of the candidate predicted to be the best by the model in each retained snapshot,
+        aligned with models rather than iters
     """
     def __init__(self, best_candidates, best_pred_means, best_pred_vars, total_time, checkpt_times, iters, indices, vals, models):
         self.best_candidates = best_candidates
@@ -121,8 +145,29 @@ class DiscreteAdaptiveSampler(DiscreteSamplingSolver):
         # feels a little hacky, but maybe we can make it work down the road
         pass
 
+    def evaluate_batch(self, candidates, pool = None):
+        """ Evaluates the objective on a batch of candidates.
+
+        Parameters
+        ----------
+        candidates : list of arbitrary objects that can be evaluted by the objective
+            the candidates to evaluate
+        pool : :obj:`multiprocessing.pool.ThreadPool` or :obj:`multiprocessing.Pool`
+            pool to evaluate the candidates in parallel, or None to evaluate serially
+
+        Returns
+        -------
+        :obj:`list`
+            the objective output value for each candidate
+        """
+        if pool is None or len(candidates) == 1:
+            return [self.objective_.evaluate(c) for c in candidates]
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=len(candidates))
+        parent_pid = os.getpid()
+        return pool.map(_evaluate_objective, [(self.objective_, c, s, parent_pid) for c, s in zip(candidates, seeds)])
+
     def discrete_maximize(self, candidates, termination_condition = MaxIterTerminationCondition(DEF_MAX_ITER),
-                          snapshot_rate = 1):
+                          snapshot_rate = 1, snapshot_policy = None, batch_size = 1, pool = None):
         """
         Maximizes a function over a discrete set of variables by
         iteratively predicting the best point (using some model and policy).
@@ -135,6 +180,13 @@ class DiscreteAdaptiveSampler(DiscreteSamplingSolver):
             called on each iteration to determine whether or not to terminate
         snapshot_rate : int
             how often to store the state of the optimizer
+        snapshot_policy : :obj:`SnapshotPolicy`
+            which snapshots of the model to keep, defaults to keeping all snapshots
+        batch_size : int
+            number of candidates chosen by the selection policy and evaluated before each round of model updates
+        pool : :obj:`multiprocessing.pool.ThreadPool` or :obj:`multiprocessing.Pool`
+            pool to evaluate each batch in parallel, or None to evaluate serially.
+            The objective and candidates must be picklable to use a process pool
 
         Returns
         ------
@@ -149,46 +201,66 @@ class DiscreteAdaptiveSampler(DiscreteSamplingSolver):
             logging.error('Illegal model specified')
             raise ValueError('Illegitimate model used in DiscreteAdaptiveSampler')
 
+        if batch_size < 1:
+            raise ValueError('Batch size must be at least 1')
+
         # init vars
         terminate = False
         k = 0 # cur iter
         num_candidates = len(candidates)
         self.reset_model(candidates) # update model with new candidates
+        if snapshot_policy is None:
+            snapshot_policy = KeepAllSnapshotPolicy()
+        snapshot_policy.reset()
+        num_snapshots = 0
+        num_snapshot_bytes = 0
 
         # logging
         times = []
         iters = []
         iter_indices = []
         iter_vals = []
-        iter_models = []
         start_time = time.clock()
         next_ind_val = 0
 
         while not terminate:
-            # get next point to sample
-            next_ind = self.selection_policy_.choose_next()
-
-            # evaluate the function at the given point (can be nondeterministic)
-            prev_ind_val = next_ind_val
-            next_ind_val = self.objective_.evaluate(candidates[next_ind])
-
-            # snapshot the model and whatnot
-            if (k % snapshot_rate) == 0:
-                logging.debug('Iteration %d' %(k))
-
-                # log time and stuff
-                checkpt = time.clock()
-                times.append(checkpt - start_time)
-                iters.append(k)
-                iter_indices.append(next_ind)
-                iter_vals.append(next_ind_val)
-                iter_models.append(self.model_.snapshot())
-
-            # update the model (e.g. posterior update, grasp pruning)
-            self.model_.update(next_ind, next_ind_val)
-
-            # check termination condiation
-            k = k + 1
+            # get next points to sample, clipping the last batch to the remaining iterations
+            cur_batch_size = batch_size
+            remaining_iters = termination_condition.remaining_iters(k)
+            if remaining_iters is not None:
+                cur_batch_size = max(min(batch_size, remaining_iters), 1)
+            if cur_batch_size == 1:
+                next_inds = [self.selection_policy_.choose_next()]
+            else:
+                next_inds = self.selection_policy_.choose_next_batch(cur_batch_size)
+
+            # evaluate the function at the given points (can be nondeterministic)
+            next_ind_vals = self.evaluate_batch([candidates[i] for i in next_inds], pool=pool)
+
+            for next_ind, val in zip(next_inds, next_ind_vals):
+                prev_ind_val = next_ind_val
+                next_ind_val = val
+
+                # snapshot the model and whatnot
+                if (k % snapshot_rate) == 0:
+                    logging.debug('Iteration %d' %(k))
+
+                    # log time and stuff
+                    checkpt = time.clock()
+                    times.append(checkpt - start_time)
+                    iters.append(k)
+                    iter_indices.append(next_ind)
+                    iter_vals.append(next_ind_val)
+                    snapshot = self.model_.snapshot()
+                    num_snapshots += 1
+                    num_snapshot_bytes += snapshot_bytes(snapshot)
+                    snapshot_policy.add(snapshot)
+
+                # update the model (e.g. posterior update, grasp pruning)
+                self.model_.update(next_ind, next_ind_val)
+                k = k + 1
+
+            # check termination condiation once per batch
             terminate = termination_condition(k, cur_val = next_ind_val, prev_val = prev_ind_val, model = self.model_)
 
         # log final values
@@ -197,7 +269,10 @@ class DiscreteAdaptiveSampler(DiscreteSamplingSolver):
         iters.append(k)
         iter_indices.append(next_ind)
         iter_vals.append(next_ind_val)
-        iter_models.append(self.model_.snapshot())
+        snapshot_policy.finish(self.model_.snapshot())
+        snapshot_policy.close()
+        logging.info('Took %d snapshots totaling %.3f MB, retained %.3f MB' %(num_snapshots, num_snapshot_bytes / 1e6,
+                                                                               snapshot_policy.num_bytes / 1e6))
 
         # log total runtime
         end_time = time.clock()
@@ -210,7 +285,7 @@ class DiscreteAdaptiveSampler(DiscreteSamplingSolver):
         for i in range(num_best):
             best_candidates.append(candidates[best_indices[i]])
         return AdaptiveSamplingResult(best_candidates, best_pred_means, best_pred_vars, total_duration,
-                                      times, iters, iter_indices, iter_vals, iter_models)
+                                      times, iters, iter_indices, iter_vals, snapshot_policy.snapshots)
 
 
 # Beta-Bernoulli bandit models: so easy!
@@ -405,9 +480,14 @@ class CorrelatedBetaBernoulliBandit(DiscreteAdaptiveSampler):
 
     def reset_model(self, candidates):
         """ Needed to independently maximize over subsets of data """
+        # the correlations only depend on the candidates, so reuse them unless the candidates changed
+        correlations = None
+        if self.model_.candidates_ is self.candidates_:
+            correlations = self.model_.correlations
         self.model_ = CorrelatedBetaBernoulliModel(
             self.candidates_, self.model_.nn_, self.model_.kernel_,
-            self.model_.tolerance_, self.model_.alpha_prior_, self.model_.beta_prior_, p=self.model_.p_
+            self.model_.tolerance_, self.model_.alpha_prior_, self.model_.beta_prior_, p=self.model_.p_,
+            correlations=correlations
         )
         self.selection_policy_.set_model(self.model_) # always update the selection policy!
 
@@ -28,12 +28,31 @@ from abc import ABCMeta, abstractmethod
 
 import logging
 import numpy as np
-import scipy.io
 import scipy.stats as ss
 
 from dexnet.learning import DiscreteModel, BetaBernoulliModel, GaussianModel
+from dexnet.learning import gittins_index_table
 import IPython
 
+def top_indices(values, num_indices):
+    """ Returns the indices of the largest values, breaking ties uniformly at random.
+
+    Parameters
+    ----------
+    values : :obj:`numpy.ndarray`
+        values to choose from
+    num_indices : int
+        number of indices to return
+
+    Returns
+    -------
+    :obj:`numpy.ndarray` of int
+        the indices of the min(num_indices, len(values)) largest values, largest first
+    """
+    perm = np.random.permutation(values.shape[0])
+    order = np.argsort(-values[perm], kind='mergesort')
+    return perm[order[:num_indices]]
+
 class DiscreteSelectionPolicy:
     __metaclass__ = ABCMeta
 
@@ -47,6 +66,41 @@ class DiscreteSelectionPolicy:
         """
         pass
 
+    def choose_next_batch(self, num_arms):
+        """ Choose a batch of indices of the model to sample before the next update.
+        Defaults to repeated independent calls to choose_next, so indices may repeat.
+
+        Parameters
+        ----------
+        num_arms : int
+            the number of indices to choose
+
+        Returns
+        -------
+        :obj:`list` of int
+            the indices to sample
+        """
+        return [self.choose_next() for i in range(num_arms)]
+
+    def _index_tree(self, index_fn):
+        """ Returns the tree of per-variable scores maintained by the current model,
+        registering index_fn with the model the first time it is used.
+
+        Parameters
+        ----------
+        index_fn : function
+            maps a :obj:`numpy.ndarray` of variable indices to the :obj:`numpy.ndarray` of their current scores
+
+        Returns
+        -------
+        :obj:`MaxSegmentTree`
+            the tree of scores
+        """
+        if getattr(self, 'index_model_', None) is not self.model_:
+            self.index_tree_ = self.model_.add_index(index_fn)
+            self.index_model_ = self.model_
+        return self.index_tree_
+
     def set_model(self, model):
         if not isinstance(model, DiscreteModel):
             raise ValueError('Must supply a discrete predictive model')
@@ -85,43 +139,67 @@ class ThompsonSelectionPolicy(DiscreteSelectionPolicy):
         next_index = np.random.choice(num_max_indices)
         return max_indices[next_index]        
 
-class BetaBernoulliGittinsIndex98Policy(DiscreteSelectionPolicy):
-    """ Chooses the next point using the BetaBernoulli gittins index policy with gamma = 0.98"""
-    def __init__(self, model = None):
-        self.indices_ = scipy.io.loadmat('data/bandits/gittins_indices_98.mat')
-        self.indices_ = self.indices_['indices']
+class BetaBernoulliGittinsIndexPolicy(DiscreteSelectionPolicy):
+    """ Chooses the next point using the BetaBernoulli gittins index policy.
+    The index table for each discount is computed once and cached (see gittins_index_table).
+
+    Attributes
+    ----------
+    discount : float
+        discount factor, between 0 and 1
+    """
+    def __init__(self, discount = 0.98, model = None):
+        self.discount_ = discount
+        self.indices_ = gittins_index_table(discount)
         DiscreteSelectionPolicy.__init__(self, model)
 
+    @property
+    def discount(self):
+        return self.discount_
+
     def choose_next(self):
         """ Returns the index of the maximal random sample, breaking ties uniformly at random"""
+        max_indices = self._gittins_tree().max_indices()
+        num_max_indices = max_indices.shape[0]
+        next_index = np.random.choice(num_max_indices)
+        return max_indices[next_index]        
+
+    def choose_next_batch(self, num_arms):
+        """ Returns the indices of the num_arms largest Gittins indices, breaking ties at random"""
+        return list(self._gittins_tree().top_indices(num_arms))
+
+    def _gittins_tree(self):
+        """ Returns the tree of Gittins indices, which the model updates incrementally """
         if self.model_ is None:
             raise ValueError('Must set predictive model')
         if not isinstance(self.model_, BetaBernoulliModel):
             raise ValueError('Gittins index policy can only be used with Beta-bernoulli models')
-        
-        alphas = self.model_.posterior_alphas.astype(np.uint64)
-        betas = self.model_.posterior_betas.astype(np.uint64)
+        return self._index_tree(self._gittins_indices)
+
+    def _gittins_indices(self, indices):
+        """ Returns the Gittins index of the variables at the given indices """
+        alphas = np.asarray(self.model_.posterior_alphas[indices]).astype(np.int64)
+        betas = np.asarray(self.model_.posterior_betas[indices]).astype(np.int64)
 
-        # subtract one, since the indices are intended for matlab 1 indexing
+        # subtract one, since entry (i, j) of the table is the index for alpha = i+1 and beta = j+1
         alphas = alphas - 1
         betas = betas - 1
 
         # snap alphas and betas to boundaries of index matrix
-        alphas[alphas >= self.indices_.shape[0]] = self.indices_.shape[0] - 1
-        betas[betas >= self.indices_.shape[1]] = self.indices_.shape[1] - 1
-        np.round(alphas)
-        np.round(betas)
+        alphas = np.clip(alphas, 0, self.indices_.shape[0] - 1)
+        betas = np.clip(betas, 0, self.indices_.shape[1] - 1)
 
-        # find maximum of gittins indices
-        gittins_indices = self.indices_[alphas, betas]
+        return self.indices_[alphas, betas]
 
-        max_indices = np.where(gittins_indices == np.max(gittins_indices))[0]
-        num_max_indices = max_indices.shape[0]
-        next_index = np.random.choice(num_max_indices)
-        return max_indices[next_index]        
+class BetaBernoulliGittinsIndex98Policy(BetaBernoulliGittinsIndexPolicy):
+    """ Chooses the next point using the BetaBernoulli gittins index policy with gamma = 0.98"""
+    def __init__(self, model = None):
+        BetaBernoulliGittinsIndexPolicy.__init__(self, 0.98, model)
 
 class BetaBernoulliBayesUCBPolicy(DiscreteSelectionPolicy):
-    """ Chooses the next point using the Bayes UCB selection policy"""
+    """ Chooses the next point using the Bayes UCB selection policy.
+    The quantile depends on the time step, so the bounds of all variables are recomputed on every iteration.
+    """
     def __init__(self, horizon=1000, c=6, model=None):
         self.t_ = 1
         self.n_ = horizon
@@ -130,19 +208,28 @@ class BetaBernoulliBayesUCBPolicy(DiscreteSelectionPolicy):
     
     def choose_next(self, stop = False):
         """ Returns the index of the maximal random sample, breaking ties uniformly at random"""
+        ucbs = self._ucbs()
+        max_indices = np.where(ucbs == np.max(ucbs))[0]
+        num_max_indices = max_indices.shape[0]
+        next_index = np.random.choice(num_max_indices)
+        self.t_ += 1
+        return max_indices[next_index]        
+
+    def choose_next_batch(self, num_arms):
+        """ Returns the indices of the num_arms largest upper confidence bounds, breaking ties uniformly at random"""
+        next_indices = top_indices(self._ucbs(), num_arms)
+        self.t_ += next_indices.shape[0]
+        return list(next_indices)
+
+    def _ucbs(self):
+        """ Returns the upper quantile of the posterior of each variable at the current time step """
         if self.model_ is None:
             raise ValueError('Must set predictive model')
         gamma = 1.0 - (1.0 / (self.t_ * np.log(self.n_)**self.c_))
         alphas = self.model_.posterior_alphas
         betas = self.model_.posterior_betas
         intervals = ss.beta.interval(gamma, alphas, betas)
-        ucbs = intervals[1]
-
-        max_indices = np.where(ucbs == np.max(ucbs))[0]
-        num_max_indices = max_indices.shape[0]
-        next_index = np.random.choice(num_max_indices)
-        self.t_ += 1
-        return max_indices[next_index]        
+        return intervals[1]
 
 class GaussianUCBPolicy(DiscreteSelectionPolicy):
     def __init__(self, beta=1.0):
@@ -151,14 +238,23 @@ class GaussianUCBPolicy(DiscreteSelectionPolicy):
     def choose_next(self, stop=False):
         """Returns the index of the variable with the highest UCB, breaking ties
         uniformly at random."""
+        max_indices = self._ucb_tree().max_indices()
+        num_max_indices = max_indices.shape[0]
+        next_index = np.random.choice(num_max_indices)
+        return max_indices[next_index]
+
+    def choose_next_batch(self, num_arms):
+        """ Returns the indices of the num_arms highest UCBs, breaking ties at random"""
+        return list(self._ucb_tree().top_indices(num_arms))
+
+    def _ucb_tree(self):
+        """ Returns the tree of upper confidence bounds, which the model updates incrementally """
         if self.model_ is None:
             raise ValueError('Must set predictive model')
         if not isinstance(self.model_, GaussianModel):
             raise ValueError('GP-UCB can only be used with Gaussian models')
+        return self._index_tree(self._ucbs)
 
-        ucb = self.model_.means + self.beta_ * np.sqrt(self.model_.variances)
-        max_ucb = np.max(ucb)
-        max_indices = np.where(ucb == max_ucb)[0]
-        num_max_indices = max_indices.shape[0]
-        next_index = np.random.choice(num_max_indices)
-        return max_indices[next_index]
+    def _ucbs(self, indices):
+        """ Returns the upper confidence bound of the variables at the given indices """
+        return self.model_.means[indices] + self.beta_ * np.sqrt(self.model_.variances_at(indices))
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Computation and caching of Gittins index tables for Beta-Bernoulli bandits
+"""
+import logging
+import numpy as np
+import os
+import tempfile
+import threading
+import time
+
+# default location of cached tables
+GITTINS_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                                 'dexnet', 'gittins')
+
+DEF_GITTINS_TABLE_SIZE = 100 # maximum alpha and beta in the table
+DEF_GITTINS_NUM_REWARDS = 1001 # number of retirement rewards to calibrate against
+GITTINS_HORIZON_TOL = 1e-4 # discount weight at which the lookahead is truncated
+
+# tables shared by all policies in this process, keyed by (discount, size, horizon)
+_GITTINS_TABLES = {}
+_GITTINS_TABLES_LOCK = threading.Lock()
+
+def gittins_horizon(discount, tol=GITTINS_HORIZON_TOL):
+    """ Number of lookahead steps needed for the discount weight to fall below tol """
+    return int(np.ceil(np.log(tol) / np.log(discount)))
+
+def compute_gittins_index_table(discount, size=DEF_GITTINS_TABLE_SIZE, horizon=None,
+                                num_rewards=DEF_GITTINS_NUM_REWARDS):
+    """ Computes the Gittins indices of a Beta-Bernoulli arm for a range of posterior parameters.
+    The index of each state is the retirement reward per step at which continuing to pull the arm and retiring
+    are equally valuable. Values are computed for a grid of retirement rewards in a single backward induction over
+    all states with a finite lookahead, and the index is interpolated where the value of continuing crosses the value of retiring.
+
+    Parameters
+    ----------
+    discount : float
+        discount factor, between 0 and 1
+    size : int
+        maximum alpha and beta parameters in the table
+    horizon : int
+        number of lookahead steps beyond the table, defaults to the number of steps for the discount weight to fall below GITTINS_HORIZON_TOL
+    num_rewards : int
+        number of retirement rewards between 0 and 1 to calibrate against
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        size x size array where entry (i, j) is the Gittins index of the Beta distribution with alpha = i+1 and beta = j+1
+    """
+    if discount <= 0 or discount >= 1:
+        raise ValueError('Discount must be between 0 and 1')
+    if size < 1:
+        raise ValueError('Table size must be at least 1')
+    if horizon is None:
+        horizon = gittins_horizon(discount)
+
+    rewards = np.linspace(0, 1, num_rewards)[:,np.newaxis]
+    retire_values = rewards / (1.0 - discount)
+    table = np.zeros([size, size])
+
+    # approximate the values at the end of the lookahead by the best of retiring or pulling at the current mean forever
+    max_total = 2 * size + horizon
+    alphas = np.arange(1, max_total)
+    values = np.maximum(rewards, alphas / float(max_total)) / (1.0 - discount)
+
+    # backward induction over the states with alpha + beta = n
+    for n in range(max_total - 1, 1, -1):
+        alphas = np.arange(1, n)
+        means = alphas / float(n)
+        continue_values = means * (1.0 + discount * values[:,alphas]) + (1.0 - means) * discount * values[:,alphas-1]
+
+        # interpolate the reward where continuing stops being better than retiring
+        alphas_in_table = alphas[(alphas <= size) & (n - alphas <= size)]
+        if alphas_in_table.shape[0] > 0:
+            diffs = continue_values[:,alphas_in_table-1] - retire_values
+            crossings = np.argmax(diffs <= 0, axis=0)
+            crossings = np.maximum(crossings, 1)
+            cols = np.arange(alphas_in_table.shape[0])
+            d_before = diffs[crossings-1, cols]
+            d_after = diffs[crossings, cols]
+            r_before = rewards[crossings-1, 0]
+            r_after = rewards[crossings, 0]
+            indices = r_before + (r_after - r_before) * d_before / (d_before - d_after)
+            table[alphas_in_table-1, n-alphas_in_table-1] = indices
+
+        values = np.maximum(retire_values, continue_values)
+    return table
+
+def gittins_index_table(discount, size=DEF_GITTINS_TABLE_SIZE, horizon=None, cache_dir=GITTINS_CACHE_DIR):
+    """ Returns a read-only table of Gittins indices, computing it only if it is not already cached.
+    Tables are saved to .npy files in the cache directory and memory-mapped, so they are computed once
+    and shared between all policies and processes.
+
+    Parameters
+    ----------
+    discount : float
+        discount factor, between 0 and 1
+    size : int
+        maximum alpha and beta parameters in the table
+    horizon : int
+        number of lookahead steps beyond the table (see compute_gittins_index_table)
+    cache_dir : :obj:`str`
+        directory to cache the tables in, or None to not cache the table on disk
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        size x size array where entry (i, j) is the Gittins index of the Beta distribution with alpha = i+1 and beta = j+1
+    """
+    if horizon is None:
+        horizon = gittins_horizon(discount)
+    key = (float(discount), int(size), int(horizon))
+
+    with _GITTINS_TABLES_LOCK:
+        if key in _GITTINS_TABLES.keys():
+            return _GITTINS_TABLES[key]
+
+        # check the disk cache
+        table = None
+        if cache_dir is not None:
+            filename = os.path.join(cache_dir, 'gittins_indices_%.6f_%d_%d.npy' %(discount, size, horizon))
+            if os.path.exists(filename):
+                table = np.load(filename, mmap_mode='r')
+
+        # compute the table
+        if table is None:
+            logging.info('Computing Gittins index table for discount %.4f' %(discount))
+            start = time.time()
+            table = compute_gittins_index_table(discount, size=size, horizon=horizon)
+            logging.info('Gittins index table took %.3f sec' %(time.time() - start))
+
+            # write to a temporary file first so that other processes never read a partial table
+            if cache_dir is not None:
+                if not os.path.exists(cache_dir):
+                    try:
+                        os.makedirs(cache_dir)
+                    except OSError:
+                        if not os.path.isdir(cache_dir):
+                            raise
+                fd, tmp_filename = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, table)
+                os.rename(tmp_filename, filename)
+                table = np.load(filename, mmap_mode='r')
+            else:
+                table.flags.writeable = False
+
+        _GITTINS_TABLES[key] = table
+        return table
@@ -28,11 +28,14 @@ from abc import ABCMeta, abstractmethod
 
 import copy
 import numpy as np
+import scipy.sparse
 import scipy.stats
 import numbers
 
 import IPython
 
+from dexnet.learning import MaxSegmentTree
+
 class Model:
     """
     A predictor of some value of the input data
@@ -86,6 +89,41 @@ class DiscreteModel(Model):
         """Returns the number of variables in the model"""
         return self.num_vars_
 
+    def add_index(self, index_fn):
+        """ Tracks the maximum of a per-variable score that only changes for the variables being updated,
+        such as the mean or an upper confidence bound. The score is recomputed for the updated variables after each update.
+
+        Parameters
+        ----------
+        index_fn : function
+            maps a :obj:`numpy.ndarray` of variable indices to the :obj:`numpy.ndarray` of their current scores
+
+        Returns
+        -------
+        :obj:`MaxSegmentTree`
+            the tree of scores for each variable
+        """
+        if not hasattr(self, 'index_trees_'):
+            self.index_trees_ = []
+        tree = MaxSegmentTree(index_fn(np.arange(self.num_vars_)))
+        self.index_trees_.append((index_fn, tree))
+        return tree
+
+    def _update_indices(self, indices):
+        """ Recomputes the tracked scores of the given variables """
+        if not hasattr(self, 'index_trees_'):
+            return
+        for index_fn, tree in self.index_trees_:
+            tree.update(indices, index_fn(indices))
+
+    def _rebuild_indices(self):
+        """ Recomputes the tracked scores of all variables """
+        if not hasattr(self, 'index_trees_'):
+            return
+        all_indices = np.arange(self.num_vars_)
+        for index_fn, tree in self.index_trees_:
+            tree.update(all_indices, index_fn(all_indices))
+
 
 class Snapshot:
     """ Abstract class for storing the current state of a model """
@@ -222,6 +260,7 @@ class BetaBernoulliModel(DiscreteModel):
         """
         Allocates numpy arrays for the estimated alpha and beta values for each variable, and the number of observations for each
         """
+        self.index_trees_ = []
         if isinstance(self.alpha_prior_, numbers.Number):
             self.posterior_alphas_ = self.alpha_prior_ * np.ones(self.num_vars_)
         else:
@@ -233,6 +272,11 @@ class BetaBernoulliModel(DiscreteModel):
             self.posterior_betas_ = np.array(self.beta_prior_)
         
         self.num_observations_ = np.zeros(self.num_vars_)
+        self.mean_tree_ = self.add_index(self._posterior_means)
+
+    def _posterior_means(self, indices):
+        """ Posterior mean of the variables at the given indices """
+        return BetaBernoulliModel.beta_mean(self.posterior_alphas_[indices], self.posterior_betas_[indices])
 
     @staticmethod
     def beta_mean(alpha, beta):
@@ -269,9 +313,8 @@ class BetaBernoulliModel(DiscreteModel):
         Returns the index (or indices), posterior mean, and posterior variance of the variable(s) with the
         maximal mean probaiblity of success
         """
-        mean_posteriors = BetaBernoulliModel.beta_mean(self.posterior_alphas_, self.posterior_betas_)
-        max_indices = np.where(mean_posteriors == np.max(mean_posteriors))[0]
-        max_posterior_means = mean_posteriors[max_indices]
+        max_indices = self.mean_tree_.max_indices()
+        max_posterior_means = self._posterior_means(max_indices)
         max_posterior_vars = BetaBernoulliModel.beta_variance(self.posterior_alphas_[max_indices], self.posterior_betas_[max_indices])
 
         return max_indices, max_posterior_means, max_posterior_vars
@@ -286,6 +329,7 @@ class BetaBernoulliModel(DiscreteModel):
         self.posterior_alphas_[index] = self.posterior_alphas_[index] + value
         self.posterior_betas_[index] = self.posterior_betas_[index] + (1.0 - value)
         self.num_observations_[index] = self.num_observations_[index] + 1
+        self._update_indices(index)
 
     def snapshot(self):
         """
@@ -328,9 +372,12 @@ class GaussianModel(DiscreteModel):
         self._init_model_params()
 
     def _init_model_params(self):
+        self.index_trees_ = []
         self.means_ = np.zeros(self.num_vars_)
         self.squared_means_ = np.zeros(self.num_vars_)
         self.num_observations_ = np.zeros(self.num_vars_)
+        self.total_observations_ = 0
+        self.mean_tree_ = self.add_index(lambda indices: self.means_[indices])
 
     @property
     def means(self):
@@ -339,9 +386,14 @@ class GaussianModel(DiscreteModel):
     @property
     def variances(self):
         """ Confidence bounds on the mean """
-        if np.max(self.num_observations_) == 0:
-            return self.sample_vars
-        return self.sample_vars / np.sqrt(self.num_observations_)
+        return self.variances_at(np.arange(self.num_vars_))
+
+    def variances_at(self, indices):
+        """ Confidence bounds on the mean of the variables at the given indices """
+        sample_vars = self.squared_means_[indices] - self.means_[indices]**2
+        if self.total_observations_ == 0:
+            return sample_vars
+        return sample_vars / np.sqrt(self.num_observations_[indices])
 
     @property
     def sample_vars(self):
@@ -361,10 +413,9 @@ class GaussianModel(DiscreteModel):
         """Returns the index, mean, and variance of the variable(s) with the
         maximal predicted value.
         """
-        max_mean = np.max(self.means_)
-        max_indices = np.where(self.means_ == max_mean)[0]
-        max_posterior_means = self.means[max_indices]
-        max_posterior_vars = self.variances[max_indices]
+        max_indices = self.mean_tree_.max_indices()
+        max_posterior_means = self.means_[max_indices]
+        max_posterior_vars = self.variances_at(max_indices)
 
         return max_indices, max_posterior_means, max_posterior_vars
 
@@ -385,6 +436,13 @@ class GaussianModel(DiscreteModel):
         self.means_[index] = (old_mean * n + value) / (n + 1)
         self.squared_means_[index] = (old_squared_mean * n + value**2) / (n + 1)
         self.num_observations_[index] += 1
+        self.total_observations_ += 1
+
+        # the variances of all variables change scale after the first observation
+        if self.total_observations_ == 1:
+            self._rebuild_indices()
+        else:
+            self._update_indices(index)
 
     def sample(self, stop=False):
         """Sample discrete predictions from the model. Mean follows a t-distribution"""
@@ -419,9 +477,13 @@ class CorrelatedBetaBernoulliModel(BetaBernoulliModel):
         prior alpha parameter of the Beta distribution 
     beta_prior : float
         prior beta parameter of the Beta distribution 
+    correlations : :obj:`scipy.sparse.csr_matrix`
+        num_vars x num_vars matrix of kernel weights between each candidate and its neighbors within the error radius,
+        computed from the candidates if not provided. A provided matrix must have been computed for the same candidates,
+        nn and kernel, which is then assumed to be trained on them already
     """
     def __init__(self, candidates, nn, kernel, tolerance=1e-2,
-                 alpha_prior=1.0, beta_prior=1.0, p=0.5):
+                 alpha_prior=1.0, beta_prior=1.0, p=0.5, correlations=None):
         BetaBernoulliModel.__init__(self, len(candidates), alpha_prior, beta_prior)
         self.candidates_ = candidates
 
@@ -432,7 +494,53 @@ class CorrelatedBetaBernoulliModel(BetaBernoulliModel):
         self.p_ = p
 
         self.nn_ = nn
-        self.nn_.train(candidates)
+
+        # updates are accumulated in place, so make sure they are not truncated
+        self.posterior_alphas_ = self.posterior_alphas_.astype(np.float64)
+        self.posterior_betas_ = self.posterior_betas_.astype(np.float64)
+        self.correlations_ = correlations
+        if self.correlations_ is None:
+            self.nn_.train(candidates)
+            self.correlations_ = self._compute_correlations()
+
+    @property
+    def correlations(self):
+        return self.correlations_
+
+    def _compute_correlations(self):
+        """ Builds the sparse matrix of kernel weights between each candidate and the neighbors
+        within the error radius. The kernel is symmetric, so it is evaluated once per neighboring pair.
+
+        Returns
+        -------
+        :obj:`scipy.sparse.csr_matrix`
+            num_vars x num_vars matrix of kernel weights
+        """
+        rows = []
+        cols = []
+        for i, candidate in enumerate(self.candidates_):
+            neighbor_indices, _ = self.nn_.within_distance(candidate, self.error_radius_,
+                                                           return_indices=True)
+            neighbor_indices = np.array(neighbor_indices, dtype=np.int64)
+            neighbor_indices = neighbor_indices[neighbor_indices >= i]
+            rows.append(i * np.ones(neighbor_indices.shape[0], dtype=np.int64))
+            cols.append(neighbor_indices)
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+
+        # evaluate the kernel for each unique pair
+        weights = np.array([self.kernel_(self.candidates_[i], self.candidates_[j])
+                            for i, j in zip(rows, cols)], dtype=np.float64)
+
+        # mirror the pairs below the diagonal
+        off_diag = rows != cols
+        all_rows = np.r_[rows, cols[off_diag]]
+        all_cols = np.r_[cols, rows[off_diag]]
+        all_weights = np.r_[weights, weights[off_diag]]
+        correlations = scipy.sparse.coo_matrix((all_weights, (all_rows, all_cols)),
+                                               shape=(self.num_vars_, self.num_vars_)).tocsr()
+        correlations.sum_duplicates()
+        return correlations
 
     @property
     def kernel_matrix(self):
@@ -456,18 +564,15 @@ class CorrelatedBetaBernoulliModel(BetaBernoulliModel):
         if not (0 <= value <= 1):
             raise ValueError('Values must be between 0 and 1')
 
-        # find neighbors within radius
-        candidate = self.candidates_[index]
-        neighbor_indices, _ = self.nn_.within_distance(candidate, self.error_radius_,
-                                                       return_indices=True)
-        # create array of correlations
-        correlations = np.zeros(self.num_vars_)
-        for neighbor_index in neighbor_indices:
-            neighbor = self.candidates_[neighbor_index]
-            correlations[neighbor_index] = self.kernel_(candidate, neighbor)
-
-        self.posterior_alphas_ = self.posterior_alphas_ + value * correlations
-        self.posterior_betas_ = self.posterior_betas_ + (1.0 - value) * correlations
+        # look up the precomputed correlations with the neighbors within radius
+        start = self.correlations_.indptr[index]
+        end = self.correlations_.indptr[index+1]
+        neighbor_indices = self.correlations_.indices[start:end]
+        correlations = self.correlations_.data[start:end]
+
+        self.posterior_alphas_[neighbor_indices] += value * correlations
+        self.posterior_betas_[neighbor_indices] += (1.0 - value) * correlations
+        self._update_indices(neighbor_indices)
 
         # TODO: should num_observations_ be updated by correlations instead?
         self.num_observations_[index] += 1.0
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Segment tree for tracking the maximum of a set of values that change a few at a time
+"""
+import heapq
+import numpy as np
+
+class MaxSegmentTree(object):
+    """ Binary tree over a fixed number of values where each internal node holds the maximum of its children.
+    Updating a value and querying the maximum take O(log N) time. NaN values are ignored when taking maxima.
+
+    Attributes
+    ----------
+    num_values : int
+        the number of values in the tree
+    values : :obj:`numpy.ndarray`
+        the current values
+    """
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 1 or values.shape[0] == 0:
+            raise ValueError('Must provide a non-empty 1D array of values')
+
+        self.num_values_ = values.shape[0]
+        self.num_leaves_ = 1
+        while self.num_leaves_ < self.num_values_:
+            self.num_leaves_ *= 2
+
+        # leaves are stored after the internal nodes, padded with -inf
+        self.tree_ = -np.inf * np.ones(2 * self.num_leaves_)
+        self.tree_[self.num_leaves_:self.num_leaves_+self.num_values_] = values
+        level_start = self.num_leaves_
+        while level_start > 1:
+            nodes = np.arange(level_start / 2, level_start)
+            self.tree_[nodes] = np.fmax(self.tree_[2*nodes], self.tree_[2*nodes+1])
+            level_start = level_start / 2
+
+    @property
+    def num_values(self):
+        return self.num_values_
+
+    @property
+    def values(self):
+        return self.tree_[self.num_leaves_:self.num_leaves_+self.num_values_]
+
+    def __len__(self):
+        return self.num_values_
+
+    def update(self, indices, values):
+        """ Set the values at the given indices and update their ancestors.
+
+        Parameters
+        ----------
+        indices : int or :obj:`numpy.ndarray` of int
+            the indices to update
+        values : float or :obj:`numpy.ndarray` of float
+            the new values
+        """
+        tree = self.tree_
+        if np.isscalar(indices):
+            node = int(indices) + self.num_leaves_
+            tree[node] = values
+            node = node / 2
+            while node >= 1:
+                left = tree[2*node]
+                right = tree[2*node+1]
+                if left >= right or right != right:
+                    tree[node] = left
+                else:
+                    tree[node] = right
+                node = node / 2
+            return
+
+        nodes = np.asarray(indices, dtype=np.int64).ravel() + self.num_leaves_
+        if nodes.shape[0] == 0:
+            return
+        tree[nodes] = values
+        while nodes[0] > 1:
+            nodes = np.unique(nodes / 2)
+            tree[nodes] = np.fmax(tree[2*nodes], tree[2*nodes+1])
+
+    def max(self):
+        """ Returns the maximum value """
+        return self.tree_[1]
+
+    def max_indices(self):
+        """ Returns the indices of all values equal to the maximum.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            the indices of the maximal values, in increasing order
+        """
+        tree = self.tree_
+        max_value = tree[1]
+
+        # follow the path to the maximum until it branches
+        node = 1
+        while node < self.num_leaves_:
+            left_max = tree[2*node] == max_value
+            right_max = tree[2*node+1] == max_value
+            if left_max and right_max:
+                break
+            elif left_max:
+                node = 2*node
+            elif right_max:
+                node = 2*node+1
+            else:
+                return np.array([], dtype=np.int64)
+
+        # search all branches level by level
+        nodes = np.array([node])
+        while nodes[0] < self.num_leaves_:
+            children = np.repeat(2*nodes, 2)
+            children[1::2] += 1
+            nodes = children[self.tree_[children] == max_value]
+            if nodes.shape[0] == 0:
+                break
+        indices = nodes - self.num_leaves_
+        return indices[indices < self.num_values_]
+
+    def top_indices(self, num_indices):
+        """ Returns the indices of the largest values, breaking ties uniformly at random among siblings.
+
+        Parameters
+        ----------
+        num_indices : int
+            number of indices to return
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            the indices of the min(num_indices, num_values) largest values, largest first
+        """
+        top_indices = []
+        heap = [(-self.tree_[1], np.random.rand(), 1)]
+        while len(heap) > 0 and len(top_indices) < num_indices:
+            _, _, node = heapq.heappop(heap)
+            if node >= self.num_leaves_:
+                if node - self.num_leaves_ < self.num_values_:
+                    top_indices.append(node - self.num_leaves_)
+                continue
+            for child in [2*node, 2*node+1]:
+                value = self.tree_[child]
+                if value == value:
+                    heapq.heappush(heap, (-value, np.random.rand(), child))
+        return np.array(top_indices, dtype=np.int64)
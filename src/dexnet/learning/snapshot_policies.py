@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Policies for retaining the model snapshots taken while running an adaptive sampler
+"""
+from abc import ABCMeta, abstractmethod
+
+import collections
+import copy
+import h5py
+import logging
+import numpy as np
+import os
+
+def snapshot_bytes(snapshot):
+    """ Number of bytes in the array attributes of a snapshot.
+
+    Parameters
+    ----------
+    snapshot : :obj:`Snapshot`
+        snapshot to measure
+
+    Returns
+    -------
+    int
+        total bytes of the arrays held by the snapshot
+    """
+    num_bytes = 0
+    for value in snapshot.__dict__.values():
+        if isinstance(value, np.ndarray):
+            num_bytes += value.nbytes
+    return num_bytes
+
+class SnapshotPolicy:
+    """
+    Decides which model snapshots an adaptive sampler keeps in memory.
+    The final snapshot of a run is always kept in full.
+
+    Attributes
+    ----------
+    snapshots : :obj:`list` of :obj:`Snapshot`
+        the retained snapshots, in the order they were taken
+    num_bytes : int
+        number of bytes in the arrays of the retained snapshots
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        self.reset()
+
+    @property
+    def num_bytes(self):
+        return sum([snapshot_bytes(s) for s in self.snapshots])
+
+    @property
+    def snapshots(self):
+        snapshots = self._retained()
+        if self.final_ is not None:
+            snapshots.append(self.final_)
+        return snapshots
+
+    def reset(self):
+        """ Clear the retained snapshots before a new run """
+        self.final_ = None
+        self._clear()
+
+    def add(self, snapshot):
+        """ Add a snapshot taken during a run.
+
+        Parameters
+        ----------
+        snapshot : :obj:`Snapshot`
+            the snapshot to retain
+        """
+        self._add(snapshot)
+
+    def finish(self, snapshot):
+        """ Add the final snapshot of a run, which is kept in full.
+
+        Parameters
+        ----------
+        snapshot : :obj:`Snapshot`
+            the final snapshot
+        """
+        self.final_ = snapshot
+
+    def close(self):
+        """ Release any resources held for writing snapshots. Called by the sampler when a run finishes. """
+        pass
+
+    @abstractmethod
+    def _clear(self):
+        """ Remove all retained snapshots """
+        pass
+
+    @abstractmethod
+    def _add(self, snapshot):
+        """ Retain a snapshot """
+        pass
+
+    @abstractmethod
+    def _retained(self):
+        """ Returns a new list of the retained snapshots, excluding the final snapshot """
+        pass
+
+class KeepAllSnapshotPolicy(SnapshotPolicy):
+    """ Keeps every snapshot in full. Memory grows linearly with the number of snapshots. """
+    def _clear(self):
+        self.snapshots_ = []
+
+    def _add(self, snapshot):
+        self.snapshots_.append(snapshot)
+
+    def _retained(self):
+        return list(self.snapshots_)
+
+class BestOnlySnapshotPolicy(SnapshotPolicy):
+    """ Keeps only the entries of each snapshot for the candidate predicted to be the best,
+    so per-candidate arrays are replaced by scalars.
+    """
+    def _clear(self):
+        self.snapshots_ = []
+
+    def _add(self, snapshot):
+        best_snapshot = copy.copy(snapshot)
+        for name, value in snapshot.__dict__.items():
+            if isinstance(value, np.ndarray) and value.ndim > 0:
+                best_snapshot.__dict__[name] = value[snapshot.best_pred_ind]
+        self.snapshots_.append(best_snapshot)
+
+    def _retained(self):
+        return list(self.snapshots_)
+
+class RingBufferSnapshotPolicy(SnapshotPolicy):
+    """ Keeps the most recent snapshots in full.
+
+    Attributes
+    ----------
+    size : int
+        the maximum number of snapshots to keep, not counting the final snapshot
+    """
+    def __init__(self, size):
+        if size < 0:
+            raise ValueError('Ring buffer size must be non-negative')
+        self.size_ = size
+        SnapshotPolicy.__init__(self)
+
+    @property
+    def size(self):
+        return self.size_
+
+    def _clear(self):
+        self.snapshots_ = collections.deque(maxlen=self.size_)
+
+    def _add(self, snapshot):
+        if self.size_ > 0:
+            self.snapshots_.append(snapshot)
+
+    def _retained(self):
+        return list(self.snapshots_)
+
+class SinkSnapshotPolicy(SnapshotPolicy):
+    """ Writes each snapshot to disk instead of keeping it in memory.
+    Snapshots are written to groups of an HDF5 file if the filename has a .hdf5 or .h5 extension,
+    and to numbered .npz files in a directory otherwise. The file or directory is opened on the first
+    snapshot of each run, so a policy that is never run holds nothing open.
+
+    Attributes
+    ----------
+    filename : :obj:`str`
+        HDF5 file or directory to write the snapshots to
+    num_written : int
+        number of snapshots written so far, which is used to number the snapshots across runs
+    """
+    def __init__(self, filename):
+        self.filename_ = filename
+        self.num_written_ = 0
+        _, ext = os.path.splitext(filename)
+        self.use_hdf5_ = ext in ['.hdf5', '.h5']
+        self.file_ = None
+        SnapshotPolicy.__init__(self)
+
+    @property
+    def filename(self):
+        return self.filename_
+
+    @property
+    def num_written(self):
+        return self.num_written_
+
+    def _open(self):
+        """ Open the HDF5 file or create the snapshot directory, if not already done """
+        if self.use_hdf5_:
+            if self.file_ is None:
+                self.file_ = h5py.File(self.filename_, 'a')
+        elif not os.path.exists(self.filename_):
+            os.mkdir(self.filename_)
+
+    def _clear(self):
+        pass
+
+    def _add(self, snapshot):
+        self._open()
+        snapshot_name = 'snapshot_%06d' %(self.num_written_)
+        arrays = {}
+        scalars = {}
+        for name, value in snapshot.__dict__.items():
+            if isinstance(value, np.ndarray):
+                arrays[name] = value
+            else:
+                scalars[name] = value
+
+        if self.use_hdf5_:
+            group = self.file_.create_group(snapshot_name)
+            for name, value in arrays.iteritems():
+                group.create_dataset(name, data=value)
+            for name, value in scalars.iteritems():
+                group.attrs[name] = value
+            self.file_.flush()
+        else:
+            arrays.update(scalars)
+            np.savez(os.path.join(self.filename_, snapshot_name + '.npz'), **arrays)
+        self.num_written_ += 1
+
+    def _retained(self):
+        return []
+
+    def close(self):
+        """ Close the HDF5 file, if one is open """
+        if self.file_ is not None:
+            self.file_.close()
+            self.file_ = None
@@ -74,7 +74,7 @@ class DiscreteSamplingSolver(SamplingSolver):
         TopKSolver.__init__(self, objective)
 
     @abstractmethod
-    def discrete_maximize(self, candidates, termination_condition, snapshot_rate):
+    def discrete_maximize(self, candidates, termination_condition, snapshot_rate, snapshot_policy, batch_size, pool):
         """
         Main loop for sampling-based solvers
         """
@@ -102,12 +102,13 @@ class DiscreteSamplingSolver(SamplingSolver):
         return candidate_bins
 
     def solve(self, termination_condition = MaxIterTerminationCondition(DEF_MAX_ITER),
-              snapshot_rate = 1):
+              snapshot_rate = 1, snapshot_policy = None, batch_size = 1, pool = None):
         """ Call discrete maxmization function with all candidates """
-        return self.discrete_maximize(self.candidates_, termination_condition, snapshot_rate)
+        return self.discrete_maximize(self.candidates_, termination_condition, snapshot_rate, snapshot_policy,
+                                      batch_size, pool)
 
     def top_K_solve(self, K, termination_condition = MaxIterTerminationCondition(DEF_MAX_ITER),
-                    snapshot_rate = 1):
+                    snapshot_rate = 1, snapshot_policy = None, batch_size = 1, pool = None):
         """ Solves for the top K maximal / minimal points """
         # partition the input space
         if K == 1:
@@ -118,7 +119,8 @@ class DiscreteSamplingSolver(SamplingSolver):
         # maximize over each bin
         top_K_results = []
         for k in range(K):
-            top_K_results.append(self.discrete_maximize(candidate_bins[k], termination_condition, snapshot_rate))
+            top_K_results.append(self.discrete_maximize(candidate_bins[k], termination_condition, snapshot_rate, snapshot_policy,
+                                                        batch_size, pool))
         return top_K_results
 
 
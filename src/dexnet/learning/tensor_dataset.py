@@ -28,7 +28,10 @@ import json
 import logging
 import numpy as np
 import os
+import Queue
 import sys
+import threading
+import zipfile
 
 import autolab_core.utils as utils
 from autolab_core import YamlConfig
@@ -37,6 +40,10 @@ from dexnet.constants import *
 
 TENSOR_EXT = '.npy'
 COMPRESSED_TENSOR_EXT = '.npz'
+MANIFEST_FILENAME = 'manifest.json'
+SPLIT_DIR = 'splits'
+SPLIT_NAMES = ['train', 'val', 'test']
+DATAPOINT_SPLIT_ATTRIBUTE = 'datapoints'
 
 class Tensor(object):
     """ Abstraction for 4-D tensor objects. """
@@ -89,6 +96,24 @@ class Tensor(object):
             self.set_datapoint(self.cur_index, datapoint)
             self.cur_index += 1
 
+    def add_batch(self, datapoints):
+        """ Adds as many of the datapoints as there is room for.
+
+        Parameters
+        ----------
+        datapoints : :obj:`numpy.ndarray`
+            array of datapoints, with the datapoint index in the first dimension
+
+        Returns
+        -------
+        int
+            the number of datapoints added
+        """
+        num_added = min(datapoints.shape[0], self.num_datapoints - self.cur_index)
+        self.data[self.cur_index:self.cur_index+num_added, ...] = datapoints[:num_added, ...]
+        self.cur_index += num_added
+        return num_added
+
     def datapoint(self, ind):
         """ Returns the datapoint at the given index. """
         if self.height is None:
@@ -161,13 +186,22 @@ class TensorDatapoint(object):
             
 class TensorDataset(object):
     """ Encapsulates learning datasets and different training and test
-    splits of the data. """
-    def __init__(self, filename, config, access_mode=WRITE_ACCESS):
+    splits of the data.
+
+    When num_write_threads is positive, full tensors are compressed and saved by background threads
+    while datapoints are added to a spare set of tensors, and flush() waits for all writes to finish
+    and stops the threads. Datapoints added after a flush are written synchronously.
+
+    flush() also saves a manifest of the number of datapoints in each tensor file, so that
+    opening a dataset and mapping datapoint indices to files does not require reading any tensors.
+    """
+    def __init__(self, filename, config, access_mode=WRITE_ACCESS, num_write_threads=0):
         # read params
         self._filename = filename
         self._config = config
         self._datapoints_per_file = config['datapoints_per_file']
         self._access_mode = access_mode
+        self._num_write_threads = 0
  
         # check valid access mode
         if access_mode == READ_WRITE_ACCESS:
@@ -199,48 +233,23 @@ class TensorDataset(object):
             # init no files
             self._num_tensors = 0
             self._num_datapoints = 0
+            self._file_num_datapoints = []
             if not os.path.exists(self.tensor_dir):
                 os.mkdir(self.tensor_dir)
 
+            # start background writers
+            if num_write_threads > 0:
+                self._start_write_threads(num_write_threads)
+
         elif access_mode == READ_ONLY_ACCESS:
-            # read the number of tensor files
-            tensor_dir = self.tensor_dir
-            tensor_filenames = utils.filenames(tensor_dir, tag=COMPRESSED_TENSOR_EXT, sorted=True)
-            file_nums = np.array([int(filename[-9:-4]) for filename in tensor_filenames])
-
-            self._num_tensors = np.max(file_nums)+1
-
-            # compute the number of datapoints
-            last_tensor_ind = np.where(file_nums == self._num_tensors-1)[0][0]
-            last_tensor_data = np.load(tensor_filenames[last_tensor_ind])['arr_0']
-            self._num_datapoints_last_file = last_tensor_data.shape[0]
-            self._num_datapoints = self._datapoints_per_file * (self._num_tensors-1) + self._num_datapoints_last_file
-
-            # form index maps for each file
-            self._index_to_file_num = {}
-            self._file_num_to_indices = {}
-
-            # set file index
-            cur_file_num = 0
-            start_datapoint_index = 0
-
-            # set mapping from file num to datapoint indices
-            self._file_num_to_indices[cur_file_num] = np.arange(self._datapoints_per_file) + start_datapoint_index
-
-            for ind in range(self._num_datapoints):
-                # set mapping from index to file num
-                self._index_to_file_num[ind] = cur_file_num
-
-                # update to the next file
-                if ind > 0 and ind % self._datapoints_per_file == 0:
-                    cur_file_num += 1
-                    start_datapoint_index += self._datapoints_per_file
-
-                    # set mapping from file num to datapoint indices
-                    if cur_file_num < self._num_tensors-1:
-                        self._file_num_to_indices[cur_file_num] = np.arange(self._datapoints_per_file) + start_datapoint_index
-                    else:
-                        self._file_num_to_indices[cur_file_num] = np.arange(self._num_datapoints_last_file) + start_datapoint_index
+            # read the number of datapoints in each tensor file
+            manifest_filename = os.path.join(self._filename, MANIFEST_FILENAME)
+            if os.path.exists(manifest_filename):
+                manifest = json.load(open(manifest_filename, 'r'))
+                file_num_datapoints = manifest['file_num_datapoints']
+            else:
+                file_num_datapoints = self._count_file_datapoints()
+            self._set_file_num_datapoints(file_num_datapoints)
         else:
             raise ValueError('Access mode %s not supported' %(access_mode))
 
@@ -291,13 +300,57 @@ class TensorDataset(object):
         """ Returns the indices for all datapoints in the given tensor. """
         if tensor_index >= self._num_tensors:
             raise ValueError('Tensor index %d is greater than the number of tensors (%d)' %(tensor_index, self._num_tensors))
-        return self._file_num_to_index[tensor_index]
+        start_ind = self._file_start_indices[tensor_index]
+        return np.arange(start_ind, start_ind + self._file_num_datapoints[tensor_index])
 
     def tensor_index(self, datapoint_index):
         """ Returns the index of the tensor containing the referenced datapoint. """
         if datapoint_index >= self._num_datapoints:
             raise ValueError('Datapoint index %d is greater than the number of datapoints (%d)' %(datapoint_index, self._num_datapoints))
-        return self._index_to_file_num[datapoint_index]
+        if self._full_files:
+            return datapoint_index // self._datapoints_per_file
+        return np.searchsorted(self._file_start_indices, datapoint_index, side='right') - 1
+
+    def _set_file_num_datapoints(self, file_num_datapoints):
+        """ Sets the number of datapoints in each tensor file and the resulting index arithmetic. """
+        self._file_num_datapoints = np.array(file_num_datapoints, dtype=np.int64)
+        self._file_start_indices = np.r_[0, np.cumsum(self._file_num_datapoints)[:-1]].astype(np.int64)
+        self._num_tensors = self._file_num_datapoints.shape[0]
+        self._num_datapoints = int(np.sum(self._file_num_datapoints))
+
+        # indices map to files by division unless a file before the last is partially filled
+        self._full_files = np.all(self._file_num_datapoints[:-1] == self._datapoints_per_file)
+
+    def _count_file_datapoints(self):
+        """ Counts the datapoints in each tensor file of a dataset saved without a manifest.
+        All files but the last are assumed to be full, and only the array header of the last file is read. """
+        tensor_filenames = utils.filenames(self.tensor_dir, tag=COMPRESSED_TENSOR_EXT, sorted=True)
+        if len(tensor_filenames) == 0:
+            return []
+        file_nums = np.array([int(filename[-9:-4]) for filename in tensor_filenames])
+        num_tensors = np.max(file_nums)+1
+
+        # read the shape of the last tensor
+        last_tensor_ind = np.where(file_nums == num_tensors-1)[0][0]
+        with zipfile.ZipFile(tensor_filenames[last_tensor_ind]) as z:
+            f = z.open('arr_0%s' %(TENSOR_EXT))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+            f.close()
+        return [self._datapoints_per_file] * (num_tensors-1) + [shape[0]]
+
+    def _save_manifest(self):
+        """ Saves the number of datapoints in each tensor file. """
+        manifest = {
+            'datapoints_per_file': self._datapoints_per_file,
+            'num_datapoints': self._num_datapoints,
+            'file_num_datapoints': [int(n) for n in self._file_num_datapoints]
+        }
+        manifest_filename = os.path.join(self._filename, MANIFEST_FILENAME)
+        json.dump(manifest, open(manifest_filename, 'w'))
 
     def generate_tensor_filename(self, field_name, file_num, compressed=True):
         """ Generate a filename for a tensor. """
@@ -309,8 +362,12 @@ class TensorDataset(object):
 
     def _allocate_tensors(self):
         """ Allocates the tensors in the dataset. """
+        self._tensors = self._create_tensors()
+
+    def _create_tensors(self):
+        """ Creates an empty tensor for each field in the dataset. """
         # init tensors dict
-        self._tensors = {}
+        tensors = {}
 
         # allocate tensor for each data field
         for field_name, field_spec in self._config['fields'].iteritems():
@@ -327,7 +384,62 @@ class TensorDataset(object):
                         field_shape.append(field_spec['channels'])
                         
             # create tensor
-            self._tensors[field_name] = Tensor(field_shape, field_dtype)
+            tensors[field_name] = Tensor(field_shape, field_dtype)
+        return tensors
+
+    def _start_write_threads(self, num_write_threads):
+        """ Starts threads to save full tensors in the background, with one spare set of tensors per thread
+        so that datapoints can be added while the others are being written. """
+        self._num_write_threads = num_write_threads
+        self._write_queue = Queue.Queue()
+        self._free_tensors = Queue.Queue()
+        self._write_error = None
+        self._write_threads = []
+        for i in range(num_write_threads):
+            self._free_tensors.put(self._create_tensors())
+            write_thread = threading.Thread(target=self._write_worker)
+            write_thread.daemon = True
+            write_thread.start()
+            self._write_threads.append(write_thread)
+
+    def _stop_write_threads(self):
+        """ Signals the background writers to exit once the queue is empty and waits for them. """
+        for write_thread in self._write_threads:
+            self._write_queue.put(None)
+        for write_thread in self._write_threads:
+            write_thread.join()
+        self._write_threads = []
+        self._num_write_threads = 0
+
+    def _write_worker(self):
+        """ Saves tensors from the write queue and returns them to the free list until a stop sentinel is received. """
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                self._write_queue.task_done()
+                return
+            file_num, tensors = item
+            try:
+                self._save_tensors(tensors, file_num)
+            except Exception as e:
+                logging.error('Failed to write tensor %d: %s' %(file_num, str(e)))
+                if self._write_error is None:
+                    self._write_error = e
+            finally:
+                self._free_tensors.put(tensors)
+                self._write_queue.task_done()
+
+    def _check_write_error(self):
+        """ Raises an error if a background write failed. """
+        if self._num_write_threads > 0 and self._write_error is not None:
+            raise RuntimeError('Background tensor write failed: %s' %(str(self._write_error)))
+
+    def _save_tensors(self, tensors, file_num):
+        """ Saves a set of tensors to the given file number and resets them. """
+        for field_name, tensor in tensors.iteritems():
+            filename = self.generate_tensor_filename(field_name, file_num)
+            tensor.save(filename, compressed=True)
+            tensor.reset()
 
     def add(self, datapoint):
         """ Adds a datapoint to the file. """
@@ -348,6 +460,55 @@ class TensorDataset(object):
         # increment num datapoints
         self._num_datapoints += 1
 
+    def add_batch(self, datapoints):
+        """ Adds a batch of datapoints, writing tensors to file whenever they fill.
+
+        Parameters
+        ----------
+        datapoints : :obj:`dict` mapping str to :obj:`numpy.ndarray`
+            arrays of datapoints for every field, with the datapoint index in the first dimension
+
+        Raises
+        ------
+        ValueError
+            if fields are missing, the arrays have different numbers of datapoints,
+            or the shape or data type of an array does not match its field
+        """
+        # check access level
+        if self._access_mode == READ_ONLY_ACCESS:
+            raise ValueError('Cannot add datapoints with read-only access')
+
+        # validate the batch once
+        arrays = {}
+        num_datapoints = None
+        for field_name in self.field_names:
+            if field_name not in datapoints.keys():
+                raise ValueError('Batch is missing field %s' %(field_name))
+            array = np.asarray(datapoints[field_name])
+            tensor = self._tensors[field_name]
+            if array.ndim == 0 or array.shape[1:] != tensor.shape[1:]:
+                raise ValueError('Field %s has datapoint shape %s but expected %s' %(field_name, str(array.shape[1:]), str(tensor.shape[1:])))
+            if not np.can_cast(array.dtype, tensor.dtype, casting='same_kind') and \
+                    not (array.dtype.kind in 'biu' and np.dtype(tensor.dtype).kind in 'biu'):
+                raise ValueError('Cannot store field %s with type %s as %s' %(field_name, array.dtype, np.dtype(tensor.dtype)))
+            if num_datapoints is None:
+                num_datapoints = array.shape[0]
+            elif array.shape[0] != num_datapoints:
+                raise ValueError('Field %s has %d datapoints but expected %d' %(field_name, array.shape[0], num_datapoints))
+            arrays[field_name] = array
+
+        # copy contiguous blocks into the tensors, splitting at file boundaries
+        start_ind = 0
+        while start_ind < num_datapoints:
+            for field_name in self.field_names:
+                num_added = self._tensors[field_name].add_batch(arrays[field_name][start_ind:])
+            start_ind += num_added
+            self._num_datapoints += num_added
+
+            # save if tensors are full
+            if self._tensors[self.field_names[0]].is_full:
+                self.write()
+
     def __getitem__(self, ind):
         """ Indexes the dataset for the datapoint at the given index. """
         return self.datapoint(ind)
@@ -371,10 +532,10 @@ class TensorDataset(object):
 
         # return the datapoint
         datapoint = self.datapoint_template
-        file_num = self._index_to_file_num[ind]
+        file_num = self.tensor_index(ind)
+        tensor_index = ind - self._file_start_indices[file_num]
         for field_name in self.field_names:
             tensor = self.load_tensor(field_name, file_num)
-            tensor_index = ind % self._datapoints_per_file
             datapoint[field_name] = tensor.datapoint(tensor_index)
         return datapoint
 
@@ -421,16 +582,30 @@ class TensorDataset(object):
 
     def write(self):
         """ Writes all tensors to the next file number. """
+        self._check_write_error()
+
+        # skip empty tensors
+        if not self._tensors[self.field_names[0]].has_data:
+            return
+
         # write the next file for all fields
-        for field_name in self.field_names:
-            filename = self.generate_tensor_filename(field_name, self._num_tensors)
-            self._tensors[field_name].save(filename, compressed=True)
-            self._tensors[field_name].reset()
+        self._file_num_datapoints.append(self._tensors[self.field_names[0]].cur_index)
+        if self._num_write_threads > 0:
+            self._write_queue.put((self._num_tensors, self._tensors))
+            self._tensors = self._free_tensors.get()
+        else:
+            self._save_tensors(self._tensors, self._num_tensors)
         self._num_tensors += 1
 
     def flush(self):
-        """ Flushes the data tensors. Alternate handle to write. """
+        """ Flushes the data tensors, waiting for any background writes to finish and stopping
+        the write threads, and saves the manifest. """
         self.write()
+        if self._num_write_threads > 0:
+            self._write_queue.join()
+            self._check_write_error()
+            self._stop_write_threads()
+        self._save_manifest()
 
     @staticmethod
     def open(dataset_dir):
@@ -443,14 +618,185 @@ class TensorDataset(object):
         dataset = TensorDataset(dataset_dir, config, access_mode=READ_ONLY_ACCESS)
         return dataset
         
+    def split_dir(self, attribute):
+        """ Returns the directory of the index files for splits on the given attribute. """
+        return os.path.join(self._filename, SPLIT_DIR, attribute)
+
     def split(self, attribute, train_pct, val_pct):
-        """ Splits the dataset along the given attribute. """
+        """ Splits the dataset along the given attribute by saving the datapoint indices of each split.
+        No tensor data is copied.
+
+        Parameters
+        ----------
+        attribute : str
+            'datapoints' to split individual datapoints, or the name of a scalar field such as
+            obj_labels, pose_labels, or image_labels to keep all datapoints with the same value in the same split
+        train_pct : float
+            fraction of the datapoints (or attribute values) to use for training
+        val_pct : float
+            fraction of the datapoints (or attribute values) to use for validation, with the remainder used for testing
+
+        Returns
+        -------
+        :obj:`TensorDatasetView`
+            training split
+        :obj:`TensorDatasetView`
+            validation split
+        :obj:`TensorDatasetView`
+            test split, which is empty if train_pct and val_pct sum to one
+        """
+        # check valid input
+        if self._access_mode != READ_ONLY_ACCESS:
+            raise ValueError('Dataset must be flushed and opened with read-only access to split')
+        if train_pct < 0 or val_pct < 0 or train_pct + val_pct > 1:
+            raise ValueError('Split percentages must be nonnegative and sum to at most one')
+
         # determine valid values of attribute
-        
+        if attribute == DATAPOINT_SPLIT_ATTRIBUTE:
+            values = self.datapoint_indices
+        elif attribute in self.field_names:
+            if 'height' in self._config['fields'][attribute].keys():
+                raise ValueError('Can only split on scalar fields')
+            values = np.concatenate([self.load_tensor(attribute, file_num).data for file_num in self.tensor_indices])
+        else:
+            raise ValueError('Attribute %s not supported for splitting' %(attribute))
+        unique_values = np.unique(values)
+
         # split on values
+        num_values = unique_values.shape[0]
+        num_train = int(np.floor(train_pct * num_values))
+        num_val = int(np.floor(val_pct * num_values))
+        np.random.shuffle(unique_values)
+        split_values = [unique_values[:num_train],
+                        unique_values[num_train:num_train+num_val],
+                        unique_values[num_train+num_val:]]
+
+        # find indices corresponding to split values and save
+        split_dir = self.split_dir(attribute)
+        if not os.path.exists(split_dir):
+            os.makedirs(split_dir)
+        splits = []
+        for split_name, values_in_split in zip(SPLIT_NAMES, split_values):
+            indices = np.where(np.in1d(values, values_in_split))[0]
+            np.savez_compressed(os.path.join(split_dir, '%s_indices%s' %(split_name, COMPRESSED_TENSOR_EXT)), indices)
+            splits.append(TensorDatasetView(self, indices))
+        json.dump({'train_pct': train_pct, 'val_pct': val_pct},
+                  open(os.path.join(split_dir, 'config.json'), 'w'))
+        return tuple(splits)
+
+    def split_indices(self, attribute, split_name):
+        """ Loads the saved datapoint indices of a split.
 
-        # find indices corresponding to split values
+        Parameters
+        ----------
+        attribute : str
+            attribute the dataset was split on
+        split_name : str
+            one of train, val, or test
 
-        # save split
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            sorted datapoint indices in the split
+        """
+        if split_name not in SPLIT_NAMES:
+            raise ValueError('Split %s not supported' %(split_name))
+        filename = os.path.join(self.split_dir(attribute), '%s_indices%s' %(split_name, COMPRESSED_TENSOR_EXT))
+        if not os.path.exists(filename):
+            raise ValueError('Dataset has not been split on %s' %(attribute))
+        return np.load(filename)['arr_0']
+
+    def split_view(self, attribute, split_name):
+        """ Returns a view of a saved split.
+
+        Parameters
+        ----------
+        attribute : str
+            attribute the dataset was split on
+        split_name : str
+            one of train, val, or test
+
+        Returns
+        -------
+        :obj:`TensorDatasetView`
+            view of the datapoints in the split
+        """
+        return TensorDatasetView(self, self.split_indices(attribute, split_name))
+
+class TensorDatasetView(object):
+    """ Read-only view of a subset of the datapoints in a TensorDataset, such as a training split.
+    Iteration visits the datapoints in index order so that each tensor file of the parent dataset is loaded once.
+    """
+    def __init__(self, dataset, indices):
+        self._dataset = dataset
+        self._indices = np.sort(np.asarray(indices, dtype=np.int64))
+        self._file_num = None
+        self._tensors = None
 
-        raise NotImplementedError()
+    @property
+    def dataset(self):
+        return self._dataset
+
+    @property
+    def indices(self):
+        return self._indices
+
+    @property
+    def num_datapoints(self):
+        return self._indices.shape[0]
+
+    @property
+    def field_names(self):
+        return self._dataset.field_names
+
+    @property
+    def datapoint_template(self):
+        return self._dataset.datapoint_template
+
+    def __len__(self):
+        return self.num_datapoints
+
+    def _load_tensors(self, file_num):
+        """ Loads the tensors of the parent dataset for a file number, reusing the last loaded file. """
+        if file_num != self._file_num:
+            self._tensors = {}
+            for field_name in self.field_names:
+                self._tensors[field_name] = self._dataset.load_tensor(field_name, file_num)
+            self._file_num = file_num
+        return self._tensors
+
+    def _datapoint(self, dataset_ind):
+        """ Returns the datapoint at a global index in the parent dataset. """
+        file_num = self._dataset.tensor_index(dataset_ind)
+        tensor_index = dataset_ind - self._dataset._file_start_indices[file_num]
+        tensors = self._load_tensors(file_num)
+        datapoint = self.datapoint_template
+        for field_name in self.field_names:
+            datapoint[field_name] = tensors[field_name].datapoint(tensor_index)
+        return datapoint
+
+    def __getitem__(self, ind):
+        """ Indexes the view for the datapoint at the given index. """
+        return self.datapoint(ind)
+
+    def datapoint(self, ind):
+        """ Loads the datapoint at a given index in the view.
+
+        Parameters
+        ----------
+        ind : int
+            index in the view
+
+        Returns
+        -------
+        :obj:`TensorDatapoint`
+            the desired tensor datapoint
+        """
+        if ind >= self.num_datapoints:
+            raise ValueError('Index %d larger than the number of datapoints in the view (%d)' %(ind, self.num_datapoints))
+        return self._datapoint(self._indices[ind])
+
+    def __iter__(self):
+        """ Iterates through the datapoints in the view in file order. """
+        for dataset_ind in self._indices:
+            yield self._datapoint(dataset_ind)
@@ -58,6 +58,23 @@ class TerminationCondition:
         """
         pass
 
+    def remaining_iters(self, k):
+        """
+        Returns the number of iterations left before the condition is guaranteed to be met,
+        which batch samplers use to avoid evaluating past the end of a run
+
+        Parameters
+        ----------
+        k : :obj:`int`
+            current iteration
+
+        Returns
+        -------
+        :obj:`int`
+            the number of remaining iterations, or None if the condition does not bound the iterations
+        """
+        return None
+
 class MaxIterTerminationCondition(TerminationCondition):
     """
     Terminate based on reaching a maximum number of iterations.
@@ -73,6 +90,9 @@ class MaxIterTerminationCondition(TerminationCondition):
     def __call__(self, k, cur_val, prev_val, cur_grad = None, cur_hess = None, model = None):
         return (k >= self.max_iters_)
 
+    def remaining_iters(self, k):
+        return max(self.max_iters_ - k, 0)
+
 class ProgressTerminationCondition(TerminationCondition):
     """
     Terminate based on lack of progress.
@@ -122,6 +142,13 @@ class OrTerminationCondition(TerminationCondition):
             terminate = terminate or term_condition(k, cur_val, prev_val, cur_grad, cur_hess, model)
         return terminate
 
+    def remaining_iters(self, k):
+        remaining = [c.remaining_iters(k) for c in self.term_conditions_]
+        remaining = [r for r in remaining if r is not None]
+        if len(remaining) == 0:
+            return None
+        return min(remaining)
+
 class AndTerminationCondition(TerminationCondition):
     """
     Terminate based on the AND of several termination conditions
@@ -139,3 +166,9 @@ class AndTerminationCondition(TerminationCondition):
         for term_condition in self.term_conditions_:
             terminate = terminate and term_condition(k, cur_val, prev_val, cur_grad, cur_hess, model)
         return terminate
+
+    def remaining_iters(self, k):
+        remaining = [c.remaining_iters(k) for c in self.term_conditions_]
+        if None in remaining:
+            return None
+        return max(remaining)
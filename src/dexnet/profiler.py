@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Opt-in registry of named timers and counters for profiling the grasping pipeline.
+"""
+import json
+import logging
+import numpy as np
+import time
+
+class _NullTimer(object):
+    """ Timer context that does nothing, returned when profiling is disabled. """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer(object):
+    """ Timer context that records the elapsed time of its block to a profiler. """
+    def __init__(self, profiler, name):
+        self.profiler_ = profiler
+        self.name_ = name
+
+    def __enter__(self):
+        self.start_ = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler_.record(self.name_, time.time() - self.start_)
+        return False
+
+class Profiler(object):
+    """ Aggregates named stage timings and event counters across a run.
+    All methods return immediately when the profiler is disabled, so instrumented code pays
+    only an attribute lookup and a branch.
+
+    Attributes
+    ----------
+    enabled : bool
+        whether or not timings and counts are being recorded
+    timings : :obj:`dict` mapping :obj:`str` to :obj:`list` of float
+        recorded durations, in seconds, for each named stage
+    counts : :obj:`dict` mapping :obj:`str` to int
+        totals for each named counter
+    """
+    def __init__(self, enabled=False):
+        self.enabled_ = enabled
+        self.timings_ = {}
+        self.counts_ = {}
+
+    @property
+    def enabled(self):
+        return self.enabled_
+
+    @property
+    def timings(self):
+        return self.timings_
+
+    @property
+    def counts(self):
+        return self.counts_
+
+    def enable(self):
+        """ Start recording timings and counts. """
+        self.enabled_ = True
+
+    def disable(self):
+        """ Stop recording timings and counts. Recorded data is kept. """
+        self.enabled_ = False
+
+    def reset(self):
+        """ Clear all recorded timings and counts. """
+        self.timings_ = {}
+        self.counts_ = {}
+
+    def timer(self, name):
+        """ Returns a context manager that records the duration of its block under the given name.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            name of the stage to time
+
+        Returns
+        -------
+        context manager
+            timer for the block, or a shared no-op context if profiling is disabled
+        """
+        if not self.enabled_:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, elapsed):
+        """ Records a duration measured by the caller.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            name of the stage
+        elapsed : float
+            duration of the stage, in seconds
+        """
+        if not self.enabled_:
+            return
+        if name not in self.timings_:
+            self.timings_[name] = []
+        self.timings_[name].append(elapsed)
+
+    def increment(self, name, n=1):
+        """ Increments the named counter.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            name of the counter
+        n : int
+            amount to increment by
+        """
+        if not self.enabled_:
+            return
+        self.counts_[name] = self.counts_.get(name, 0) + n
+
+    def summary(self, percentiles=[50, 90, 99]):
+        """ Aggregates the recorded timings and counts.
+
+        Parameters
+        ----------
+        percentiles : :obj:`list` of float
+            percentiles of the duration of each stage to report
+
+        Returns
+        -------
+        :obj:`dict`
+            dictionary with a 'timers' entry mapping each stage to its count, total, mean, min, max and percentiles,
+            and a 'counters' entry mapping each counter to its total
+        """
+        timers = {}
+        for name, elapsed in self.timings_.iteritems():
+            elapsed = np.array(elapsed)
+            stats = {
+                'count': int(elapsed.shape[0]),
+                'total': float(np.sum(elapsed)),
+                'mean': float(np.mean(elapsed)),
+                'min': float(np.min(elapsed)),
+                'max': float(np.max(elapsed))
+            }
+            for p, val in zip(percentiles, np.percentile(elapsed, percentiles)):
+                stats['p%d' %(p)] = float(val)
+            timers[name] = stats
+        return {
+            'timers': timers,
+            'counters': dict(self.counts_)
+        }
+
+    def log(self):
+        """ Logs the total time of each recorded stage, largest first. """
+        timers = self.summary()['timers']
+        for name in sorted(timers.keys(), key=lambda n: -timers[n]['total']):
+            stats = timers[name]
+            logging.info('%s: %.3f sec total over %d calls (%.4f sec mean)' %(name, stats['total'], stats['count'], stats['mean']))
+
+    def save(self, filename, summary=None):
+        """ Saves the summary of the recorded timings and counts to a JSON file.
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            JSON file to save to
+        summary : :obj:`dict`
+            summary to save, defaults to the summary of the current recordings
+        """
+        if summary is None:
+            summary = self.summary()
+        with open(filename, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+# global profiler shared by the instrumented pipeline stages
+PROFILER = Profiler()
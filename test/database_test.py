@@ -24,6 +24,7 @@ Tests database basic functionality
 Author: Jeff Mahler
 """
 import copy
+import imp
 import IPython
 import logging
 import numpy as np
@@ -37,14 +38,18 @@ from autolab_core import RigidTransform, YamlConfig
 from perception import CameraIntrinsics, RenderMode
 
 from meshpy_berkeley.obj_file import ObjFile
+from meshpy_berkeley.sdf_file import SdfFile
 from meshpy_berkeley.mesh_renderer import ViewsphereDiscretizer, VirtualCamera
 
-from dexnet.constants import READ_WRITE_ACCESS
-from dexnet.database import Hdf5Database, MeshProcessor, RescalingType
+from dexnet.constants import READ_ONLY_ACCESS, READ_WRITE_ACCESS, WRITE_ACCESS
+from dexnet.database import Hdf5Database, GraspableObjectCache, MeshProcessor, RescalingType
+from dexnet.database.keys import SDF_DATA_KEY, SDF_QUANTIZATION_SCALE_KEY, SURFACE_MASK_KEY, SURFACE_GRADIENTS_KEY
+from dexnet.grasping import GraspableObject3D
 from dexnet.grasping.grasp import ParallelJawPtGrasp3D
 from constants import *
 
 CONFIG = YamlConfig(TEST_CONFIG_NAME)
+REPACK_TOOL_FILENAME = 'tools/repack_database.py'
 
 class Hdf5DatabaseTest(TestCase):
 
@@ -94,6 +99,12 @@ class Hdf5DatabaseTest(TestCase):
                                  mesh_processor.stable_poses,
                                  mass=mass)
 
+        # check key index
+        self.assertTrue(dataset.has_object(mesh_processor.key))
+        self.assertTrue(mesh_processor.key in dataset)
+        self.assertFalse(dataset.has_object(mesh_processor.key + '_missing'))
+        self.assertTrue(TEST_DS_NAME in database.dataset_names)
+
         # read graspable and ensure data integrity
         obj = dataset[mesh_processor.key]
         self.assertTrue(obj.key == mesh_processor.key)
@@ -114,16 +125,45 @@ class Hdf5DatabaseTest(TestCase):
             self.assertTrue(np.allclose(wsp.r, lsp.r))
             self.assertTrue(np.allclose(wsp.p, lsp.p))
 
+        # the surface mask is stored with the object, and the gradients only on request
+        self.assertTrue(obj.has_surface_index)
+        write_surface_points, _ = mesh_processor.sdf.surface_points(grid_basis=False)
+        self.assertTrue(np.allclose(write_surface_points, obj.surface_index.surface_points))
+        self.assertFalse(SURFACE_GRADIENTS_KEY in dataset.surface_index_data(obj.key).keys())
+        gradients = obj.surface_index.gradients
+        dataset.store_surface_index(obj.key, force_overwrite=True, with_gradients=True)
+        self.assertTrue(SURFACE_GRADIENTS_KEY in dataset.surface_index_data(obj.key).keys())
+        self.assertTrue(dataset[obj.key].has_surface_index)
+        self.assertTrue(np.allclose(dataset[obj.key].surface_index.gradients, gradients))
+
         self.assertTrue(database is not None and dataset is not None)        
 
         # test loop access
         for obj in dataset:
             key = obj.key
 
+        # test prefetched loop access
+        prefetched_keys = [obj.key for obj in dataset.graspables(num_prefetch=2)]
+        self.assertTrue(prefetched_keys == dataset.object_keys)
+
+        # read errors reach the iterating thread
+        missing_keys = dataset.object_keys + ['missing_object']
+        for num_prefetch in [0, 2]:
+            with self.assertRaises(ValueError):
+                for obj in dataset.graspables(missing_keys, num_prefetch=num_prefetch):
+                    pass
+
         # test direct access
         obj = dataset[key]
         self.assertTrue(obj.key == key)
 
+        # test subset views
+        subset = dataset.subset(0, 1)
+        self.assertTrue(subset.object_keys == dataset.object_keys[:1])
+        self.assertTrue(subset.has_object(dataset.object_keys[0]))
+        for obj in subset:
+            self.assertTrue(obj.key == dataset.object_keys[0])
+
         # read / write meshing
         obj = dataset[dataset.object_keys[0]]        
         mesh_filename = dataset.obj_mesh_filename(obj.key, overwrite=True)
@@ -250,13 +290,123 @@ class Hdf5DatabaseTest(TestCase):
         except:
             obj_deleted = True
         self.assertTrue(obj_deleted)
+        self.assertFalse(dataset.has_object(key))
 
         database.close()
 
+    def test_graspable_cache(self, num_objects=4):
+        mesh = ObjFile(OBJ_FILENAME).read()
+        sdf = SdfFile(SDF_FILENAME).read()
+        objs = [GraspableObject3D(sdf, mesh, key='obj_%d' %(i)) for i in range(num_objects)]
+        obj_bytes = GraspableObjectCache.object_bytes(objs[0])
+        cache = GraspableObjectCache(int(2.5 * obj_bytes))
+
+        # hits and misses
+        self.assertTrue(cache.get(objs[0].key) is None)
+        cache.put(objs[0].key, objs[0])
+        cache.put(objs[1].key, objs[1])
+        self.assertTrue(cache.get(objs[0].key) is objs[0])
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.num_bytes, 2 * obj_bytes)
+
+        # the least recently used object is evicted first
+        cache.put(objs[2].key, objs[2])
+        self.assertFalse(objs[1].key in cache)
+        self.assertTrue(objs[0].key in cache)
+        self.assertTrue(objs[2].key in cache)
+        self.assertEqual(cache.evictions, 1)
+
+        # objects are measured again after their surface index is built
+        objs[0].surface_index.kd_tree
+        self.assertTrue(cache.get(objs[0].key) is objs[0])
+        self.assertEqual(cache.num_bytes, GraspableObjectCache.object_bytes(objs[0]) + obj_bytes)
+        self.assertGreater(cache.num_bytes, 2 * obj_bytes)
+
+        # objects that grow are evicted to stay within the budget
+        objs[0].sdf_pyramid
+        objs[0].surface_index.gradients
+        cache.put(objs[3].key, objs[3])
+        cached_bytes = sum([GraspableObjectCache.object_bytes(obj) for obj in objs if obj.key in cache])
+        self.assertEqual(cache.num_bytes, cached_bytes)
+        self.assertLessEqual(cache.num_bytes, cache.max_bytes)
+        self.assertTrue(objs[3].key in cache)
+
+        # invalidation
+        cache.invalidate(objs[3].key)
+        self.assertFalse(objs[3].key in cache)
+        self.assertTrue(cache.get(objs[3].key) is None)
+
+        # objects larger than the cache are not stored
+        small_cache = GraspableObjectCache(obj_bytes - 1)
+        small_cache.put(objs[1].key, objs[1])
+        self.assertEqual(len(small_cache), 0)
+        self.assertEqual(small_cache.num_bytes, 0)
+
+    def test_storage_options(self):
+        mesh = ObjFile(OBJ_FILENAME).read()
+        sdf = SdfFile(SDF_FILENAME).read()
+        key = 'storage_test'
+        repack_tool = imp.load_source('repack_database', REPACK_TOOL_FILENAME)
+        option_sets = [{'compression': 'lzf'},
+                       {'compression': 'gzip', 'compression_level': 9},
+                       {'compression': 'lzf', 'chunk_size': 16},
+                       {'quantize_sdf': True},
+                       {'compression': 'gzip', 'chunk_size': 16, 'quantize_sdf': True}]
+
+        # uncompressed database to repack
+        plain_db_filename = os.path.join(TEST_DB_DIR, 'storage_plain.hdf5')
+        database = Hdf5Database(plain_db_filename, access_level=WRITE_ACCESS)
+        database.create_dataset(TEST_DS_NAME).create_graspable(key, mesh, sdf)
+        database.close()
+
+        for i, storage_options in enumerate(option_sets):
+            # write with the options directly and by repacking
+            db_filename = os.path.join(TEST_DB_DIR, 'storage_%d.hdf5' %(i))
+            database = Hdf5Database(db_filename, access_level=WRITE_ACCESS, storage_options=storage_options)
+            database.create_dataset(TEST_DS_NAME).create_graspable(key, mesh, sdf)
+            options = database.storage_options
+            database.close()
+            repacked_db_filename = os.path.join(TEST_DB_DIR, 'storage_%d_repacked.hdf5' %(i))
+            repack_tool.repack_database(plain_db_filename, repacked_db_filename, storage_options,
+                                        num_timing_objects=1)
+
+            for filename in [db_filename, repacked_db_filename]:
+                database = Hdf5Database(filename, access_level=READ_ONLY_ACCESS)
+                self.assertEqual(database.storage_options, options)
+                dataset = database.dataset(TEST_DS_NAME)
+
+                # layout of the stored sdf
+                sdf_dataset = dataset.sdf_data(key)[SDF_DATA_KEY]
+                self.assertEqual(sdf_dataset.compression, options['compression'])
+                if options['chunk_size'] is not None:
+                    self.assertEqual(sdf_dataset.chunks, tuple([min(options['chunk_size'], d) for d in sdf_dataset.shape]))
+
+                # the surface index is rewritten with the same layout, without the gradients
+                self.assertEqual(dataset.surface_index_data(key)[SURFACE_MASK_KEY].compression, options['compression'])
+                self.assertFalse(SURFACE_GRADIENTS_KEY in dataset.surface_index_data(key).keys())
+
+                # sdf error bound and exact mesh
+                obj = dataset[key]
+                sdf_error = np.max(np.abs(np.asarray(obj.sdf.data) - np.asarray(sdf.data)))
+                if options['quantize_sdf']:
+                    self.assertEqual(sdf_dataset.dtype, np.float16)
+                    scale = dataset.sdf_data(key).attrs[SDF_QUANTIZATION_SCALE_KEY]
+                    self.assertAlmostEqual(scale, np.max(np.abs(sdf.data)), places=6)
+                    self.assertLessEqual(sdf_error, scale * 2**-11)
+                else:
+                    self.assertFalse(SDF_QUANTIZATION_SCALE_KEY in dataset.sdf_data(key).attrs.keys())
+                    self.assertLess(sdf_error, 1e-6)
+                self.assertTrue(np.array_equal(obj.mesh.vertices, mesh.vertices))
+                self.assertTrue(np.array_equal(obj.mesh.triangles, mesh.triangles))
+                database.close()
+
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.INFO)
     test_suite = TestSuite()
     test_suite.addTest(Hdf5DatabaseTest('test_illegal_create'))
     test_suite.addTest(Hdf5DatabaseTest('test_new_database_and_graspable'))
+    test_suite.addTest(Hdf5DatabaseTest('test_graspable_cache'))
+    test_suite.addTest(Hdf5DatabaseTest('test_storage_options'))
     TextTestRunner(verbosity=2).run(test_suite)
     
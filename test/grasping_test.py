@@ -24,18 +24,22 @@ Tests grasping basic functionality
 Author: Jeff Mahler
 """
 import copy
+import cvxopt as cvx
 import IPython
 import logging
 import numpy as np
 import os
+import shutil
 import sys
+import tempfile
 import time
 from unittest import TestCase, TestSuite, TextTestRunner
 
 from autolab_core import RigidTransform, YamlConfig
 from perception import CameraIntrinsics
 
-from dexnet.grasping import Contact3D, ParallelJawPtGrasp3D, GraspableObject3D, UniformGraspSampler, AntipodalGraspSampler, GraspQualityConfigFactory, GraspQualityFunctionFactory, RobotGripper, PointGraspMetrics3D
+from dexnet.grasping import Contact3D, NarrowBandSdf3D, ParallelJawPtGrasp3D, GraspSet, GraspableObject3D, UniformGraspSampler, AntipodalGraspSampler, GraspQualityConfigFactory, GraspQualityFunctionFactory, GraspQualityCache, RobotGripper, PointGraspMetrics3D
+from dexnet.constants import NO_CONTACT_DIST
 
 from meshpy_berkeley.obj_file import ObjFile
 from meshpy_berkeley.sdf_file import SdfFile
@@ -120,6 +124,91 @@ class GraspTest(TestCase):
             caught_bad_init = True
         self.assertTrue(caught_bad_init)
 
+    def test_grasp_set(self, num_grasps=50):
+        # random grasps
+        grasps = []
+        for i in range(num_grasps):
+            v = np.random.randn(3)
+            v = v / np.linalg.norm(v)
+            configuration = ParallelJawPtGrasp3D.configuration_from_params(np.random.rand(3), v, 0.05,
+                                                                          angle=2 * np.pi * np.random.rand())
+            grasps.append(ParallelJawPtGrasp3D(configuration, grasp_id=i))
+        grasp_set = GraspSet.from_grasps(grasps)
+        self.assertEqual(len(grasp_set), num_grasps)
+
+        # test views and vectorized transforms against the single grasps
+        T_grasp_obj = grasp_set.T_grasp_obj
+        g1, g2 = grasp_set.endpoints
+        for i, grasp in enumerate(grasps):
+            self.assertEqual(grasp_set[i].id, grasp.id)
+            self.assertTrue(np.allclose(grasp_set[i].configuration, grasp.configuration))
+            self.assertTrue(np.allclose(T_grasp_obj[i,:3,:3], grasp.T_grasp_obj.rotation))
+            self.assertTrue(np.allclose(T_grasp_obj[i,:3,3], grasp.T_grasp_obj.translation))
+            self.assertTrue(np.allclose(g1[i], grasp.endpoints[0]))
+            self.assertTrue(np.allclose(g2[i], grasp.endpoints[1]))
+
+        distances = grasp_set.distance()
+        self.assertTrue(np.allclose(distances[1,2], ParallelJawPtGrasp3D.distance(grasps[1], grasps[2])))
+
+        # test subsets
+        subset = grasp_set[grasp_set.ids % 2 == 0]
+        self.assertEqual(len(subset), num_grasps / 2)
+        self.assertEqual(subset[1].id, 2)
+
+    def test_table_alignment(self, num_grasps=20, num_poses=5, num_angles=1000):
+        # random grasps and table orientations
+        grasps = []
+        for i in range(num_grasps):
+            v = np.random.randn(3)
+            v = v / np.linalg.norm(v)
+            configuration = ParallelJawPtGrasp3D.configuration_from_params(np.random.rand(3), v, 0.05)
+            grasps.append(ParallelJawPtGrasp3D(configuration, grasp_id=i))
+        grasp_set = GraspSet.from_grasps(grasps)
+        stable_poses = [RigidTransform(rotation=RigidTransform.random_rotation(), from_frame='obj', to_frame='stp')
+                        for j in range(num_poses)]
+        table_normals = np.array([T.rotation[2,:] for T in stable_poses])
+        perpendicular_angles = grasp_set.perpendicular_table_angles(table_normals)
+        parallel_angles = grasp_set.parallel_table_angles(table_normals)
+
+        # compare the closed-form angles to a grid search
+        thetas = np.linspace(0, 2*np.pi, num_angles, endpoint=False)
+        for i, grasp in enumerate(grasps):
+            for j, stable_pose in enumerate(stable_poses):
+                n = grasp.unrotated_full_axis.T.dot(table_normals[j])
+                alignment = -n[0] * np.cos(thetas) - n[2] * np.sin(thetas)
+                aligned_grasp = grasp.perpendicular_table(stable_pose)
+                self.assertTrue(np.allclose(aligned_grasp.approach_angle, perpendicular_angles[i,j]))
+                self.assertTrue(np.abs(aligned_grasp.rotated_full_axis[:,0].dot(-table_normals[j]) - np.max(alignment)) < 1e-4)
+
+                parallel_grasp = grasp.parallel_table(stable_pose)
+                self.assertTrue(np.allclose(parallel_grasp.approach_angle, parallel_angles[i,j]))
+                self.assertTrue(np.abs(parallel_grasp.rotated_full_axis[:,0].dot(table_normals[j])) < 1e-10)
+
+    def test_grasp_angles_from_stp_z(self, num_grasps=20, num_poses=5):
+        # random grasps and table orientations
+        grasps = []
+        for i in range(num_grasps):
+            v = np.random.randn(3)
+            v = v / np.linalg.norm(v)
+            configuration = ParallelJawPtGrasp3D.configuration_from_params(np.random.rand(3), v, 0.05,
+                                                                          angle=2 * np.pi * np.random.rand())
+            grasps.append(ParallelJawPtGrasp3D(configuration, grasp_id=i))
+        grasp_set = GraspSet.from_grasps(grasps)
+        stable_poses = [RigidTransform(rotation=RigidTransform.random_rotation(), from_frame='obj', to_frame='stp')
+                        for j in range(num_poses)]
+
+        # compare batched angles to the angles computed from the composed transforms
+        grasp_axis_angles, grasp_approach_angles, nus = grasp_set.grasp_angles_from_stp_z(stable_poses)
+        self.assertEqual(grasp_axis_angles.shape, (num_grasps, num_poses))
+        for i, grasp in enumerate(grasps):
+            for j, stable_pose in enumerate(stable_poses):
+                T_stp_grasp = stable_pose * grasp.T_grasp_obj
+                self.assertTrue(np.allclose(grasp_axis_angles[i,j], np.arccos(T_stp_grasp.y_axis[2])))
+                self.assertTrue(np.allclose(grasp_approach_angles[i,j], np.arccos(np.abs(T_stp_grasp.x_axis[2]))))
+                self.assertTrue(np.allclose(nus[i,j], T_stp_grasp.z_axis[2]))
+                self.assertTrue(np.allclose(grasp.grasp_angles_from_stp_z(stable_pose),
+                                            [grasp_axis_angles[i,j], grasp_approach_angles[i,j], nus[i,j]]))
+
     def test_init_graspable(self):
         of = ObjFile(OBJ_FILENAME)
         sf = SdfFile(SDF_FILENAME)
@@ -127,6 +216,151 @@ class GraspTest(TestCase):
         sdf = sf.read()
         obj = GraspableObject3D(sdf, mesh)
 
+    def test_surface_index(self):
+        of = ObjFile(OBJ_FILENAME)
+        sf = SdfFile(SDF_FILENAME)
+        mesh = of.read()
+        sdf = sf.read()
+        obj = GraspableObject3D(sdf, mesh)
+        self.assertFalse(obj.has_surface_index)
+
+        # surface points match the sdf
+        surface_index = obj.surface_index
+        self.assertTrue(obj.has_surface_index)
+        surface_points, _ = sdf.surface_points(grid_basis=False)
+        surface_points_grid, _ = sdf.surface_points(grid_basis=True)
+        self.assertTrue(np.allclose(surface_index.surface_points, surface_points))
+        self.assertEqual(np.sum(surface_index.surface_mask), surface_points.shape[0])
+        self.assertTrue(np.all(surface_index.on_surface(surface_points_grid.T)))
+
+        # radius queries match brute force search
+        center = surface_points[0]
+        radius = 10 * sdf.resolution
+        local_points = surface_index.surface_points_in_radius(center, radius)
+        dists = np.linalg.norm(surface_points - center, axis=1)
+        self.assertEqual(local_points.shape[0], np.sum(dists <= radius))
+
+        # normals agree with the sdf surface normals
+        normals, valid = surface_index.surface_normals(surface_points_grid.T.astype(np.float64))
+        self.assertTrue(np.allclose(np.linalg.norm(normals[:,valid], axis=0), 1.0))
+        alignments = []
+        for i in range(0, surface_points_grid.shape[0], surface_points_grid.shape[0] // NUM_TEST_CASES + 1):
+            sdf_normal = sdf.surface_normal(surface_points_grid[i])
+            if sdf_normal is not None and valid[i]:
+                alignments.append(abs(sdf_normal.dot(normals[:,i])))
+        self.assertGreater(np.mean(alignments), 0.9)
+
+        # transformed objects share the grid arrays and move the surface points
+        T = RigidTransform(rotation=RigidTransform.random_rotation(), translation=np.random.rand(3),
+                           from_frame='obj', to_frame='obj')
+        obj_tf = obj.transform(T)
+        self.assertTrue(obj_tf.has_surface_index)
+        self.assertTrue(obj_tf.surface_index.surface_mask is surface_index.surface_mask)
+        self.assertTrue(obj_tf.surface_index.gradients is surface_index.gradients)
+        surface_points_tf, _ = obj_tf.sdf.surface_points(grid_basis=False)
+        self.assertTrue(np.allclose(obj_tf.surface_index.surface_points, surface_points_tf))
+
+    def test_narrow_band_sdf(self, band_voxels=3, num_grasps=10):
+        of = ObjFile(OBJ_FILENAME)
+        sf = SdfFile(SDF_FILENAME)
+        mesh = of.read()
+        sdf = sf.read()
+        nb_sdf = NarrowBandSdf3D.from_sdf(sdf, band_voxels=band_voxels)
+        self.assertLess(nb_sdf.nbytes, sdf.data.nbytes)
+
+        # the narrow band holds the clamped sdf
+        band_width = band_voxels * sdf.resolution
+        self.assertTrue(np.allclose(nb_sdf.data, np.clip(sdf.data, -band_width, band_width), atol=1e-6))
+        surface_points, _ = sdf.surface_points(grid_basis=False)
+        nb_surface_points, _ = nb_sdf.surface_points(grid_basis=False)
+        self.assertTrue(np.allclose(nb_surface_points, surface_points))
+
+        # same grid transforms and surface queries
+        pts = surface_points[::surface_points.shape[0] // NUM_TEST_CASES + 1].T
+        pts_grid = sdf.transform_pt_obj_to_grid(pts)
+        self.assertTrue(np.allclose(nb_sdf.transform_pt_obj_to_grid(pts), pts_grid))
+        self.assertTrue(np.allclose(nb_sdf.transform_pt_grid_to_obj(pts_grid), pts))
+        self.assertTrue(np.allclose(nb_sdf.transform_pt_obj_to_grid(1.0), sdf.transform_pt_obj_to_grid(1.0)))
+        for i in range(pts_grid.shape[1]):
+            self.assertEqual(nb_sdf.on_surface(pts_grid[:,i])[0], sdf.on_surface(pts_grid[:,i])[0])
+            self.assertAlmostEqual(nb_sdf[pts_grid[:,i]], sdf[pts_grid[:,i]], places=5)
+
+        # contacts match those on the dense sdf
+        obj = GraspableObject3D(sdf, mesh)
+        nb_obj = GraspableObject3D(nb_sdf, mesh)
+        gripper = RobotGripper.load(GRIPPER_NAME)
+        ags = UniformGraspSampler(gripper, CONFIG)
+        grasps = ags.generate_grasps(obj, target_num_grasps=num_grasps)
+        for grasp in grasps:
+            success, c = grasp.close_fingers(obj)
+            nb_success, nb_c = grasp.close_fingers(nb_obj)
+            self.assertEqual(success, nb_success)
+            if success:
+                for contact, nb_contact in zip(c, nb_c):
+                    self.assertTrue(np.allclose(contact.point, nb_contact.point))
+                    self.assertGreater(contact.normal.dot(nb_contact.normal), 0.9)
+        self.assertTrue(nb_obj.surface_index.gradients is None)
+
+        # the contact search built the pyramid from the blocks, and it stays conservative
+        self.assertTrue(nb_obj.has_sdf_pyramid)
+        sdf_pyramid = nb_obj.sdf_pyramid
+        self.assertEqual(2**sdf_pyramid.min_level, nb_sdf.block_size)
+        pts_grid = np.random.rand(3, NUM_TEST_CASES) * (np.array(sdf.dims_).reshape(3, 1) - 1)
+        sd = nb_sdf.interpolate(pts_grid)
+        for level in range(sdf_pyramid.min_level, sdf_pyramid.min_level + sdf_pyramid.num_levels):
+            bounds = sdf_pyramid.bounds(pts_grid, level)
+            self.assertTrue(np.all(np.abs(sd) >= np.abs(bounds) - 1e-6))
+            self.assertTrue(np.all(sd * bounds >= 0))
+
+        # transforms are applied without touching the blocks
+        T = RigidTransform(rotation=RigidTransform.random_rotation(), translation=np.random.rand(3),
+                           from_frame='obj', to_frame='obj')
+        nb_obj_tf = nb_obj.transform(T)
+        pts_tf = T.rotation.dot(pts) + T.translation.reshape(3, 1)
+        self.assertTrue(np.allclose(nb_obj_tf.sdf.transform_pt_grid_to_obj(pts_grid), pts_tf))
+
+    def test_sdf_pyramid(self, num_grasps=10, approach_dist=0.2):
+        of = ObjFile(OBJ_FILENAME)
+        sf = SdfFile(SDF_FILENAME)
+        mesh = of.read()
+        sdf = sf.read()
+        obj = GraspableObject3D(sdf, mesh)
+        self.assertFalse(obj.has_sdf_pyramid)
+        sdf_pyramid = obj.sdf_pyramid
+        self.assertTrue(obj.has_sdf_pyramid)
+
+        # bounds are conservative at every level
+        pts_grid = np.random.rand(3, NUM_TEST_CASES) * (np.array(sdf.dims_).reshape(3, 1) - 1)
+        sd = np.array([sdf[pts_grid[:,i]] for i in range(NUM_TEST_CASES)])
+        for level in range(sdf_pyramid.min_level, sdf_pyramid.min_level + sdf_pyramid.num_levels):
+            bounds = sdf_pyramid.bounds(pts_grid, level)
+            self.assertTrue(np.all(np.abs(sd) >= np.abs(bounds) - 1e-6))
+            self.assertTrue(np.all(sd * bounds >= 0))
+
+        # surface points are never culled
+        surface_points_grid, _ = sdf.surface_points(grid_basis=True)
+        self.assertTrue(np.all(sdf_pyramid.near_surface(surface_points_grid.T)))
+
+        # approach lines keep every sample on the surface and skip most of the rest
+        gripper = RobotGripper.load(GRIPPER_NAME)
+        ags = UniformGraspSampler(gripper, CONFIG)
+        grasps = ags.generate_grasps(obj, target_num_grasps=num_grasps)
+        num_samples = int(ParallelJawPtGrasp3D.samples_per_grid * sdf.transform_pt_obj_to_grid(approach_dist) / 2)
+        num_near = 0
+        num_total = 0
+        for grasp in grasps:
+            g1, _ = grasp.endpoints
+            line_of_action = ParallelJawPtGrasp3D.create_line_of_action(g1, -grasp.rotated_full_axis[:,0], approach_dist,
+                                                                        obj, num_samples, min_width=0)
+            near_surface = sdf_pyramid.near_surface(np.array(line_of_action).T)
+            for i, pt_grid in enumerate(line_of_action):
+                on_surface, _ = sdf.on_surface(pt_grid)
+                if on_surface:
+                    self.assertTrue(near_surface[i])
+            num_near += np.sum(near_surface)
+            num_total += near_surface.shape[0]
+        self.assertLess(num_near, num_total)
+
     def test_init_gripper(self):
         gripper = RobotGripper.load(GRIPPER_NAME)
 
@@ -153,6 +387,34 @@ class GraspTest(TestCase):
             c2.normal = normals[:,1]
             self.assertFalse(PointGraspMetrics3D.force_closure(c1, c2, mu, use_abs_value=False))
 
+    def test_force_closure_batch(self):
+        # random antipodal and non-antipodal contact pairs
+        points = []
+        normals = []
+        friction_coefs = []
+        antipodal = []
+        for i in range(2 * NUM_TEST_CASES):
+            contacts, contact_normals, _, mu, _ = random_force_closure_test_case(antipodal=(i % 2 == 0))
+            points.append(contacts.T)
+            normals.append(contact_normals.T)
+            friction_coefs.append(mu)
+            antipodal.append(i % 2 == 0)
+        in_force_closure = PointGraspMetrics3D.force_closure_batch(np.array(points), np.array(normals), np.array(friction_coefs))
+        self.assertTrue(np.all(in_force_closure == np.array(antipodal)))
+
+    def test_grasp_matrix_batch(self, num_grasps=10, num_forces=16):
+        params = GraspQualityConfigFactory.create_config(CONFIG['metrics']['robust_ferrari_canny'])
+        forces = np.random.randn(num_grasps, 3, num_forces)
+        torques = np.random.randn(num_grasps, 3, num_forces)
+        normals = np.random.randn(num_grasps, 3, 2)
+        for soft_fingers in [False, True]:
+            G = PointGraspMetrics3D.grasp_matrix_batch(forces, torques, normals, soft_fingers=soft_fingers, params=params)
+            for i in range(num_grasps):
+                G_i = PointGraspMetrics3D.grasp_matrix(forces[i], torques[i], normals[i], soft_fingers=soft_fingers, params=params)
+                self.assertTrue(np.allclose(G[i], G_i))
+                self.assertTrue(np.allclose(G_i[:3,:num_forces], forces[i]))
+                self.assertTrue(np.allclose(G_i[3:,:num_forces], params.torque_scaling * torques[i]))
+
     def test_wrench_in_positive_span(self):
         # simple test for in positive span
         wrench_basis = np.eye(6)
@@ -188,6 +450,97 @@ class GraspTest(TestCase):
                                                                         num_fingers)
             self.assertFalse(in_span)
 
+    def test_wrench_in_positive_span_batch(self):
+        # identity bases, so the minimum norm forces are the target wrenches themselves when in span
+        wrench_bases = np.tile(np.eye(6), [NUM_TEST_CASES, 1, 1])
+        force_limit = 1000
+        num_fingers = 1
+
+        # truly in span, with force limits
+        target_wrenches = np.random.rand(NUM_TEST_CASES, 6)
+        in_span, norms = PointGraspMetrics3D.wrench_in_positive_span_batch(wrench_bases,
+                                                                           target_wrenches,
+                                                                           force_limit,
+                                                                           num_fingers)
+        self.assertTrue(np.all(in_span))
+        self.assertTrue(np.allclose(norms, np.linalg.norm(target_wrenches, axis=1), atol=1e-3))
+
+        # not in span, but within force limits
+        in_span, norms = PointGraspMetrics3D.wrench_in_positive_span_batch(wrench_bases,
+                                                                           -target_wrenches,
+                                                                           force_limit,
+                                                                           num_fingers)
+        self.assertFalse(np.any(in_span))
+
+        # truly in span, but not with force limits
+        force_limit = 0.1
+        target_wrenches[:,0] = 1000
+        in_span, norms = PointGraspMetrics3D.wrench_in_positive_span_batch(wrench_bases,
+                                                                           target_wrenches,
+                                                                           force_limit,
+                                                                           num_fingers)
+        self.assertFalse(np.any(in_span))
+
+    def test_wrench_in_positive_span_batch_matches_qp(self, num_fingers=2, num_wrenches_per_finger=3, force_limit=10):
+        # random well-conditioned grasp maps, with targets exerted by positive forces for even cases and negative forces for odd cases
+        num_wrenches = num_fingers * num_wrenches_per_finger
+        wrench_bases = np.eye(6) + 0.2 * np.random.randn(NUM_TEST_CASES, 6, num_wrenches)
+        forces = np.random.rand(NUM_TEST_CASES, num_wrenches)
+        forces[1::2,:] = -forces[1::2,:]
+        target_wrenches = np.einsum('bij,bj->bi', wrench_bases, forces)
+
+        # the default 1e-6 tolerance gives the same decisions as the per-grasp program
+        in_span, norms = PointGraspMetrics3D.wrench_in_positive_span_batch(wrench_bases, target_wrenches,
+                                                                           force_limit, num_fingers, tol=1e-6)
+        for i in range(NUM_TEST_CASES):
+            true_in_span, true_norm = PointGraspMetrics3D.wrench_in_positive_span(wrench_bases[i], target_wrenches[i],
+                                                                                  force_limit, num_fingers)
+            self.assertEqual(in_span[i], true_in_span)
+
+        # with tight tolerances for both solvers the finger forces match too.
+        # cvxopt's default tolerances only give the force norms to about 1e-4
+        solver_options = dict(cvx.solvers.options)
+        cvx.solvers.options.update({'abstol': 1e-12, 'reltol': 1e-12, 'feastol': 1e-12})
+        try:
+            in_span, norms = PointGraspMetrics3D.wrench_in_positive_span_batch(wrench_bases, target_wrenches,
+                                                                               force_limit, num_fingers, tol=1e-12)
+            for i in range(NUM_TEST_CASES):
+                true_in_span, true_norm = PointGraspMetrics3D.wrench_in_positive_span(wrench_bases[i], target_wrenches[i],
+                                                                                      force_limit, num_fingers)
+                self.assertEqual(in_span[i], true_in_span)
+                if true_in_span:
+                    self.assertLess(np.abs(norms[i] - true_norm), 1e-6)
+        finally:
+            cvx.solvers.options.clear()
+            cvx.solvers.options.update(solver_options)
+
+    def test_wrench_resistance_batch(self, num_fingers=2, num_wrenches_per_finger=8):
+        # one set of parameters per grasp, as for samples of the parameters in robust metrics
+        num_wrenches = num_fingers * num_wrenches_per_finger
+        forces = np.random.randn(NUM_TEST_CASES, 3, num_wrenches)
+        torques = 0.01 * np.random.randn(NUM_TEST_CASES, 3, num_wrenches)
+        normals = np.random.randn(NUM_TEST_CASES, 3, num_fingers)
+        params = []
+        for i in range(NUM_TEST_CASES):
+            grasp_params = GraspQualityConfigFactory.create_config(CONFIG['metrics']['force_closure'])
+            grasp_params.friction_coef = np.random.rand()
+            grasp_params.force_limits = 10.0
+            grasp_params.target_wrench = np.r_[0.5 * np.random.randn(3), np.zeros(3)]
+            grasp_params.torque_scaling = 1.0
+            params.append(grasp_params)
+
+        for soft_fingers in [False, True]:
+            in_closure = PointGraspMetrics3D.partial_closure_batch(forces, torques, normals, soft_fingers=soft_fingers, params=params)
+            Q = PointGraspMetrics3D.wrench_resistance_batch(forces, torques, normals, soft_fingers=soft_fingers, params=params)
+            for i in range(NUM_TEST_CASES):
+                true_in_closure = PointGraspMetrics3D.partial_closure(forces[i], torques[i], normals[i],
+                                                                      soft_fingers=soft_fingers, params=params[i])
+                true_Q = PointGraspMetrics3D.wrench_resistance(forces[i], torques[i], normals[i],
+                                                               soft_fingers=soft_fingers, params=params[i])
+                self.assertEqual(in_closure[i], true_in_closure)
+                self.assertEqual(Q[i] > 0, true_Q > 0)
+                self.assertAlmostEqual(Q[i], true_Q, delta=1e-6 * max(abs(true_Q), 1.0))
+
     def test_min_norm_vector_in_facet(self):
         # zero in facet
         facet = np.c_[np.eye(6), -np.eye(6)]
@@ -251,6 +604,69 @@ class GraspTest(TestCase):
                 true_fc = PointGraspMetrics3D.force_closure(c1, c2, quality_config.friction_coef)
                 self.assertEqual(fn_fc, true_fc)
 
+        # batches of grasps match evaluating each grasp
+        metric_spec = dict(CONFIG['metrics']['force_closure'])
+        metric_spec['quality_method'] = 'partial_closure'
+        quality_config = GraspQualityConfigFactory.create_config(metric_spec)
+        quality_config.force_limits = gripper.force_limit
+        quality_config.target_wrench = np.array([0, 0, gripper.force_limit / 10.0, 0, 0, 0])
+        quality_fn = GraspQualityFunctionFactory.create_quality_function(obj, quality_config)
+        results = quality_fn.evaluate_batch(grasps)
+        self.assertEqual(len(results), len(grasps))
+        for grasp, result in zip(grasps, results):
+            self.assertEqual(result.quality, quality_fn(grasp).quality)
+
+    def test_quality_cache(self, max_entries=15):
+        num_grasps = 10
+        of = ObjFile(OBJ_FILENAME)
+        sf = SdfFile(SDF_FILENAME)
+        mesh = of.read()
+        sdf = sf.read()
+        obj = GraspableObject3D(sdf, mesh)
+
+        gripper = RobotGripper.load(GRIPPER_NAME)
+
+        ags = UniformGraspSampler(gripper, CONFIG)
+        grasps = ags.generate_grasps(obj, target_num_grasps=num_grasps)
+        num_grasps = len(grasps)
+
+        cache_dir = tempfile.mkdtemp()
+        cache_filename = os.path.join(cache_dir, 'quality_cache.db')
+        cache = GraspQualityCache(cache_filename, max_entries=max_entries)
+        quality_config = GraspQualityConfigFactory.create_config(CONFIG['metrics']['force_closure'])
+        quality_fn = GraspQualityFunctionFactory.create_quality_function(obj, quality_config, quality_cache=cache)
+
+        # first pass computes, second pass reads from the cache
+        qualities = [quality_fn(grasp).quality for grasp in grasps]
+        self.assertEqual(cache.misses, num_grasps)
+        self.assertEqual(cache.hits, 0)
+        cached_qualities = [quality_fn(grasp).quality for grasp in grasps]
+        self.assertEqual(cache.hits, num_grasps)
+        self.assertTrue(np.allclose(qualities, cached_qualities))
+
+        # results persist after reopening, and are found with the config that the first pass added derived parameters to
+        cache.close()
+        cache = GraspQualityCache(cache_filename, max_entries=max_entries)
+        quality_fn = GraspQualityFunctionFactory.create_quality_function(obj, quality_config, quality_cache=cache)
+        self.assertEqual(len(cache), num_grasps)
+        quality_fn(grasps[0])
+        self.assertEqual(cache.hits, 1)
+
+        # changing the config recomputes, and evicts the least recently used results
+        quality_config.friction_coef = 2 * quality_config.friction_coef
+        quality_fn = GraspQualityFunctionFactory.create_quality_function(obj, quality_config, quality_cache=cache)
+        for grasp in grasps:
+            quality_fn(grasp)
+        self.assertEqual(cache.misses, num_grasps)
+        self.assertEqual(len(cache), min(2 * num_grasps, max_entries))
+        self.assertEqual(cache.evictions, max(2 * num_grasps - max_entries, 0))
+        quality_config.friction_coef = quality_config.friction_coef / 2
+        quality_fn = GraspQualityFunctionFactory.create_quality_function(obj, quality_config, quality_cache=cache)
+        quality_fn(grasps[0])
+        self.assertEqual(cache.hits, 2)
+        cache.close()
+        shutil.rmtree(cache_dir)
+
     def test_contacts(self):
         num_samples = 128
         mu = 0.5
@@ -310,6 +726,75 @@ class GraspTest(TestCase):
                     v = np.cos(theta) * T_contact2_obj.x_axis + np.sin(theta) * T_contact2_obj.y_axis
                     self.assertLessEqual(v[0], T_contact2_obj.x_axis[0])
 
+    def test_surface_windows(self, width=1e-2, num_steps=21, max_projection=0.1, num_checked_contacts=4):
+        num_grasps = 10
+        of = ObjFile(OBJ_FILENAME)
+        sf = SdfFile(SDF_FILENAME)
+        mesh = of.read()
+        sdf = sf.read()
+        obj = GraspableObject3D(sdf, mesh)
+
+        gripper = RobotGripper.load(GRIPPER_NAME)
+
+        ags = UniformGraspSampler(gripper, CONFIG)
+        grasps = ags.generate_grasps(obj, target_num_grasps=num_grasps)
+
+        num_checked = 0
+        for grasp in grasps:
+            success, c = grasp.close_fingers(obj)
+            if success:
+                for contact in c:
+                    # the contact itself projects onto the surface
+                    window = contact.surface_window_projection(width, num_steps, sigma_range=0.0,
+                                                               direction=contact.in_direction)
+                    self.assertEqual(window.shape, (num_steps, num_steps))
+                    self.assertLess(abs(window[num_steps // 2, num_steps // 2]), 2 * sdf.resolution)
+
+                    window_sdf = contact.surface_window_sdf(width, num_steps)
+                    self.assertEqual(window_sdf.shape, (num_steps, num_steps))
+                    if num_checked >= num_checked_contacts:
+                        continue
+                    num_checked += 1
+
+                    # sdf window matches looking up each cell
+                    _, t1, t2 = contact.tangents()
+                    scales = np.linspace(-width / 2.0, width / 2.0, num_steps)
+                    for i in range(num_steps):
+                        for j in range(num_steps):
+                            pt_grid = sdf.transform_pt_obj_to_grid(contact.point + scales[i] * t1 + scales[j] * t2)
+                            true_sd = -1e-2
+                            if not sdf.is_out_of_bounds(pt_grid):
+                                true_sd = sdf[pt_grid]
+                            self.assertAlmostEqual(window_sdf[i,j], true_sd, places=5)
+
+                    # projection window matches marching each ray on its own
+                    window = contact._compute_surface_window_projection(width=width, num_steps=num_steps,
+                                                                        max_projection=max_projection,
+                                                                        sigma_range=0.0, direction=contact.in_direction)
+                    direction, t1, t2 = contact.tangents(contact.in_direction)
+                    direction = direction / np.linalg.norm(direction)
+                    num_samples = max(int(2.0 * max_projection / sdf.resolution), 2)
+                    dists = np.linspace(-sdf.resolution, max_projection, num_samples)
+                    res = width / num_steps
+                    scales = np.linspace(-width / 2.0 + res / 2.0, width / 2.0 - res / 2.0, num_steps)
+                    for i in range(num_steps):
+                        for j in range(num_steps):
+                            window_pt = contact.point + scales[i] * t1 + scales[j] * t2
+                            true_projection = NO_CONTACT_DIST
+                            if not sdf.is_out_of_bounds(sdf.transform_pt_obj_to_grid(window_pt)):
+                                prev_sd = None
+                                for k in range(num_samples):
+                                    sd = sdf[sdf.transform_pt_obj_to_grid(window_pt + dists[k] * direction)]
+                                    if prev_sd is not None and (sd <= 0) != (prev_sd <= 0):
+                                        alpha = prev_sd / (prev_sd - sd)
+                                        true_projection = min(dists[k-1] + alpha * (dists[1] - dists[0]), max_projection)
+                                        break
+                                    prev_sd = sd
+                            self.assertAlmostEqual(window[j,i], true_projection, delta=1e-5)
+
+                    surface_window = contact.surface_information(width, num_steps, direction=contact.in_direction)
+                    self.assertEqual(surface_window.proj_win_2d.shape, (num_steps, num_steps))
+
     def test_find_contacts(self):
         of = ObjFile(OBJ_FILENAME)
         sf = SdfFile(SDF_FILENAME)
@@ -335,14 +820,27 @@ if __name__ == '__main__':
     logging.getLogger().setLevel(logging.INFO)
     test_suite = TestSuite()
     test_suite.addTest(GraspTest('test_init_grasp'))
+    test_suite.addTest(GraspTest('test_grasp_set'))
+    test_suite.addTest(GraspTest('test_table_alignment'))
+    test_suite.addTest(GraspTest('test_grasp_angles_from_stp_z'))
     test_suite.addTest(GraspTest('test_init_graspable'))
+    test_suite.addTest(GraspTest('test_surface_index'))
+    test_suite.addTest(GraspTest('test_narrow_band_sdf'))
+    test_suite.addTest(GraspTest('test_sdf_pyramid'))
     test_suite.addTest(GraspTest('test_init_gripper'))
     test_suite.addTest(GraspTest('test_force_closure'))
+    test_suite.addTest(GraspTest('test_force_closure_batch'))
+    test_suite.addTest(GraspTest('test_grasp_matrix_batch'))
     test_suite.addTest(GraspTest('test_wrench_in_positive_span'))
+    test_suite.addTest(GraspTest('test_wrench_in_positive_span_batch'))
+    test_suite.addTest(GraspTest('test_wrench_in_positive_span_batch_matches_qp'))
+    test_suite.addTest(GraspTest('test_wrench_resistance_batch'))
     test_suite.addTest(GraspTest('test_min_norm_vector_in_facet'))
     test_suite.addTest(GraspTest('test_antipodal_grasp_sampler'))
     test_suite.addTest(GraspTest('test_grasp_quality_functions'))
+    test_suite.addTest(GraspTest('test_quality_cache'))
     test_suite.addTest(GraspTest('test_contacts'))
+    test_suite.addTest(GraspTest('test_surface_windows'))
     test_suite.addTest(GraspTest('test_find_contacts'))
     TextTestRunner(verbosity=2).run(test_suite)
         
@@ -26,21 +26,69 @@ Author: Jeff Mahler
 from abc import ABCMeta, abstractmethod
 
 import copy
+import h5py
 import IPython
 import logging
 import numpy as np
 import os
+import shutil
 import sys
+import tempfile
 import time
+import threading
 from unittest import TestCase, TestSuite, TextTestRunner
 
 from autolab_core import RigidTransform, YamlConfig, BernoulliRV, GaussianRV
 from dexnet.learning import RandomBinaryObjective, RandomContinuousObjective, UniformAllocationMean, ThompsonSampling, GaussianUniformAllocationMean, MaxIterTerminationCondition
+from dexnet.learning import CorrelatedBetaBernoulliModel, CorrelatedThompsonSampling
+from dexnet.learning import BestOnlySnapshotPolicy, RingBufferSnapshotPolicy, SinkSnapshotPolicy, MaxSegmentTree, compute_gittins_index_table
+from dexnet.learning import ClassificationResult, StreamingClassificationResult, TensorDataset
+from multiprocessing.pool import ThreadPool
 
 from constants import *
 
 CONFIG = YamlConfig(TEST_CONFIG_NAME)
 
+TENSOR_CONFIG = {
+    'datapoints_per_file': 100,
+    'fields': {
+        'images': {
+            'dtype': 'float32',
+            'height': 8,
+            'width': 8,
+            'channels': 1
+        },
+        'labels': {
+            'dtype': 'uint32'
+        }
+    }
+}
+
+class SquaredExponentialKernel(object):
+    """ Squared exponential kernel over points for testing correlated models """
+    def __init__(self, sigma=1.0):
+        self.sigma_ = sigma
+
+    def __call__(self, x, y):
+        return np.exp(-np.sum((x - y)**2) / (2 * self.sigma_**2))
+
+    def error_radius(self, tolerance):
+        return self.sigma_ * np.sqrt(-2 * np.log(tolerance))
+
+class BruteForceNearestNeighbor(object):
+    """ Exhaustive nearest neighbor search over points for testing correlated models """
+    def __init__(self):
+        self.num_trainings_ = 0
+
+    def train(self, data):
+        self.data_ = np.array(data)
+        self.num_trainings_ += 1
+
+    def within_distance(self, x, dist, return_indices=False):
+        distances = np.linalg.norm(self.data_ - x, axis=1)
+        indices = np.where(distances <= dist)[0]
+        return list(indices), distances[indices]
+
 class LearningTest(TestCase):
     def test_uniform_alloc(self, num_candidates=NUM_CANDIDATES):
         # get candidates
@@ -114,11 +162,303 @@ class LearningTest(TestCase):
         self.assertTrue(np.abs(result.best_candidates[0].mu - true_max) < 1e-4)
         self.assertTrue(result.best_pred_ind[-1] == true_max_indices[0])        
 
+    def test_max_segment_tree(self, num_values=NUM_CANDIDATES, num_updates=1000):
+        np.random.seed(1000)
+        values = np.random.randint(0, 5, size=num_values).astype(np.float64)
+        tree = MaxSegmentTree(values)
+
+        # randomly update single values and batches of values
+        for i in range(num_updates):
+            if i % 2 == 0:
+                index = np.random.randint(num_values)
+                values[index] = np.random.randint(0, 6)
+                tree.update(index, values[index])
+            else:
+                indices = np.unique(np.random.randint(num_values, size=4))
+                values[indices] = np.random.randint(0, 6, size=indices.shape[0])
+                tree.update(indices, values[indices])
+
+            # check against a full recompute
+            self.assertEqual(tree.max(), np.max(values))
+            self.assertTrue(np.array_equal(tree.max_indices(), np.where(values == np.max(values))[0]))
+            top_values = values[tree.top_indices(3)]
+            self.assertTrue(np.array_equal(top_values, np.sort(values)[::-1][:3]))
+
+    def test_gittins_index_table(self, discount=0.9, size=5):
+        table = compute_gittins_index_table(discount, size=size)
+        self.assertEqual(table.shape, (size, size))
+
+        # compare to the published index for a uniform prior
+        self.assertTrue(np.abs(table[0,0] - 0.7029) < 1e-3)
+
+        # indices exceed the mean, increase with successes and decrease with failures
+        alphas, betas = np.meshgrid(np.arange(1, size+1), np.arange(1, size+1), indexing='ij')
+        self.assertTrue(np.all(table > alphas / (alphas + betas).astype(np.float64)))
+        self.assertTrue(np.all(np.diff(table, axis=0) > 0))
+        self.assertTrue(np.all(np.diff(table, axis=1) < 0))
+
+    def test_streaming_classification_result(self, num_datapoints=10000, batch_size=100):
+        # generate noisy binary predictions
+        np.random.seed(1000)
+        labels = (np.random.rand(num_datapoints) < 0.3).astype(np.int64)
+        pos_probs = np.clip(0.3 * labels + 0.7 * np.random.rand(num_datapoints), 0, 1)
+        pred_probs = np.c_[1 - pos_probs, pos_probs]
+
+        # accumulate in batches
+        pred_probs_list = []
+        labels_list = []
+        streaming_result = StreamingClassificationResult(2)
+        for i in range(0, num_datapoints, batch_size):
+            pred_probs_list.append(pred_probs[i:i+batch_size])
+            labels_list.append(labels[i:i+batch_size])
+            streaming_result.update(pred_probs[i:i+batch_size], labels[i:i+batch_size])
+        result = ClassificationResult(pred_probs_list, labels_list)
+
+        # check metrics
+        self.assertEqual(streaming_result.num_datapoints, result.num_datapoints)
+        self.assertTrue(np.array_equal(streaming_result.confusion_matrix.matrix, result.confusion_matrix.matrix))
+        self.assertAlmostEqual(streaming_result.error_rate, result.error_rate)
+        self.assertAlmostEqual(streaming_result.precision, result.precision)
+        self.assertAlmostEqual(streaming_result.recall, result.recall)
+        self.assertAlmostEqual(streaming_result.fpr, result.fpr)
+
+        # check the binned auc against the rank statistic
+        ranks = np.argsort(np.argsort(pos_probs)) + 1
+        num_pos = np.sum(labels)
+        num_neg = num_datapoints - num_pos
+        auc = (np.sum(ranks[labels == 1]) - num_pos * (num_pos + 1) / 2.0) / (num_pos * num_neg)
+        self.assertTrue(np.abs(streaming_result.auc_score - auc) < 1e-3)
+
+    def test_tensor_dataset_background_write(self, num_datapoints=250, num_write_threads=2):
+        dataset_dir = os.path.join(tempfile.mkdtemp(), 'dataset')
+        try:
+            # write datapoints in the background
+            dataset = TensorDataset(dataset_dir, TENSOR_CONFIG, num_write_threads=num_write_threads)
+            datapoint = dataset.datapoint_template
+            images = np.random.rand(num_datapoints, 8, 8, 1).astype(np.float32)
+            for i in range(num_datapoints):
+                datapoint['images'] = images[i]
+                datapoint['labels'] = i
+                dataset.add(datapoint)
+            num_threads = threading.active_count()
+            dataset.flush()
+            self.assertEqual(threading.active_count(), num_threads - num_write_threads)
+
+            # read back
+            dataset = TensorDataset.open(dataset_dir)
+            self.assertEqual(dataset.num_datapoints, num_datapoints)
+            self.assertEqual(dataset.num_tensors, 3)
+            for i in [0, num_datapoints-1]:
+                datapoint = dataset[i]
+                self.assertEqual(datapoint['labels'], i)
+                self.assertTrue(np.allclose(datapoint['images'], images[i]))
+        finally:
+            shutil.rmtree(os.path.dirname(dataset_dir))
+
+    def test_tensor_dataset_add_batch(self, num_datapoints=250, batch_size=70):
+        dataset_dir = os.path.join(tempfile.mkdtemp(), 'dataset')
+        try:
+            # write batches that span file boundaries
+            dataset = TensorDataset(dataset_dir, TENSOR_CONFIG)
+            images = np.random.rand(num_datapoints, 8, 8, 1).astype(np.float32)
+            labels = np.arange(num_datapoints)
+            for i in range(0, num_datapoints, batch_size):
+                dataset.add_batch({'images': images[i:i+batch_size],
+                                   'labels': labels[i:i+batch_size]})
+            self.assertEqual(dataset.num_datapoints, num_datapoints)
+
+            # check validation
+            with self.assertRaises(ValueError):
+                dataset.add_batch({'images': images[:2]})
+            with self.assertRaises(ValueError):
+                dataset.add_batch({'images': images[:2], 'labels': labels[:3]})
+            with self.assertRaises(ValueError):
+                dataset.add_batch({'images': images[:2,:4], 'labels': labels[:2]})
+            with self.assertRaises(ValueError):
+                dataset.add_batch({'images': images[:2], 'labels': labels[:2].astype(np.float32)})
+            dataset.flush()
+
+            # read back
+            dataset = TensorDataset.open(dataset_dir)
+            self.assertEqual(dataset.num_datapoints, num_datapoints)
+            self.assertEqual(dataset.num_tensors, 3)
+            for i in [0, 99, 100, 199, 200, num_datapoints-1]:
+                datapoint = dataset[i]
+                self.assertEqual(datapoint['labels'], i)
+                self.assertTrue(np.allclose(datapoint['images'], images[i]))
+
+            # read back without the manifest
+            os.remove(os.path.join(dataset_dir, 'manifest.json'))
+            dataset = TensorDataset.open(dataset_dir)
+            self.assertEqual(dataset.num_datapoints, num_datapoints)
+            self.assertEqual(dataset.tensor_index(200), 2)
+            self.assertTrue(np.all(dataset.datapoint_indices_for_tensor(2) == np.arange(200, num_datapoints)))
+        finally:
+            shutil.rmtree(os.path.dirname(dataset_dir))
+
+    def test_tensor_dataset_split(self, num_datapoints=250, num_labels=20):
+        dataset_dir = os.path.join(tempfile.mkdtemp(), 'dataset')
+        try:
+            dataset = TensorDataset(dataset_dir, TENSOR_CONFIG)
+            images = np.random.rand(num_datapoints, 8, 8, 1).astype(np.float32)
+            labels = np.arange(num_datapoints) % num_labels
+            dataset.add_batch({'images': images, 'labels': labels})
+            dataset.flush()
+
+            # split on labels
+            dataset = TensorDataset.open(dataset_dir)
+            train, val, test = dataset.split('labels', 0.6, 0.2)
+            self.assertEqual(len(train) + len(val) + len(test), num_datapoints)
+            split_labels = [set(labels[split.indices]) for split in [train, val, test]]
+            self.assertEqual(len(split_labels[0]), 12)
+            self.assertEqual(len(split_labels[1]), 4)
+            self.assertEqual(len(split_labels[0] & split_labels[1]), 0)
+            self.assertEqual(len(split_labels[0] & split_labels[2]), 0)
+
+            # reopen a split and iterate
+            val = TensorDataset.open(dataset_dir).split_view('labels', 'val')
+            num_val = 0
+            for i, datapoint in zip(val.indices, val):
+                self.assertEqual(datapoint['labels'], labels[i])
+                self.assertTrue(np.allclose(datapoint['images'], images[i]))
+                num_val += 1
+            self.assertEqual(num_val, len(val))
+        finally:
+            shutil.rmtree(os.path.dirname(dataset_dir))
+
+    def test_batch_thompson_sampling(self, num_candidates=NUM_CANDIDATES, batch_size=8, num_workers=4):
+        # get candidates
+        np.random.seed(1000)
+        pred_means = np.random.rand(num_candidates)
+        candidates = []
+        for i in range(num_candidates):
+            candidates.append(BernoulliRV(pred_means[i]))
+
+        # get true maximum
+        true_max = np.max(pred_means)
+        true_max_indices = np.where(pred_means == true_max)
+        
+        # solve using batches of thompson samples evaluated in parallel
+        obj = RandomBinaryObjective()
+        ts = ThompsonSampling(obj, candidates)
+        pool = ThreadPool(num_workers)
+        result = ts.solve(termination_condition = MaxIterTerminationCondition(MAX_ITERS), snapshot_rate = SNAPSHOT_RATE,
+                          batch_size = batch_size, pool = pool)
+        pool.close()
+
+        # check result (not guaranteed to work in finite iterations but whatever)
+        self.assertTrue(len(result.best_candidates) == 1)
+        self.assertTrue(np.abs(result.best_candidates[0].p - true_max) < 1e-4)
+        self.assertTrue(result.best_pred_ind[-1] == true_max_indices[0])
+        self.assertEqual(np.sum(result.models[-1].num_obs), MAX_ITERS)
+
+    def test_batch_last_batch_clipped(self, num_candidates=NUM_CANDIDATES, batch_size=8, max_iters=101):
+        np.random.seed(1000)
+        pred_means = np.random.rand(num_candidates)
+        candidates = []
+        for i in range(num_candidates):
+            candidates.append(BernoulliRV(pred_means[i]))
+
+        # the iteration limit is not a multiple of the batch size, so the last batch must be clipped
+        obj = RandomBinaryObjective()
+        ts = ThompsonSampling(obj, candidates)
+        result = ts.solve(termination_condition = MaxIterTerminationCondition(max_iters), snapshot_rate = 1,
+                          batch_size = batch_size)
+        self.assertEqual(result.iters[-1], max_iters)
+        self.assertEqual(np.sum(result.models[-1].num_obs), max_iters)
+
+    def test_correlated_beta_bernoulli_updates(self, num_candidates=30, num_updates=200, tolerance=1e-2):
+        np.random.seed(1000)
+        candidates = [x for x in np.random.rand(num_candidates, 2)]
+        kernel = SquaredExponentialKernel(sigma=0.1)
+        nn = BruteForceNearestNeighbor()
+        sampler = CorrelatedThompsonSampling(RandomBinaryObjective(), candidates, nn, kernel, tolerance=tolerance)
+        model = sampler.model_
+        self.assertEqual(nn.num_trainings_, 1)
+
+        # resetting the model reuses the precomputed correlations
+        correlations = model.correlations
+        sampler.reset_model(candidates)
+        self.assertTrue(sampler.model_.correlations is correlations)
+        self.assertEqual(nn.num_trainings_, 1)
+
+        # compare the sparse updates of both models to the per-update kernel loop
+        indices = np.random.randint(num_candidates, size=num_updates)
+        values = np.random.rand(num_updates)
+        values[::2] = np.round(values[::2])
+        for m in [model, sampler.model_]:
+            alphas = np.ones(num_candidates)
+            betas = np.ones(num_candidates)
+            for index, value in zip(indices, values):
+                m.update(index, value)
+                neighbor_indices, _ = nn.within_distance(candidates[index], kernel.error_radius(tolerance),
+                                                         return_indices=True)
+                weights = np.zeros(num_candidates)
+                for neighbor_index in neighbor_indices:
+                    weights[neighbor_index] = kernel(candidates[index], candidates[neighbor_index])
+                alphas = alphas + value * weights
+                betas = betas + (1.0 - value) * weights
+            self.assertTrue(np.allclose(m.posterior_alphas, alphas))
+            self.assertTrue(np.allclose(m.posterior_betas, betas))
+        self.assertGreater(np.max(model.posterior_alphas), 2.0)
+
+    def test_snapshot_policies(self, num_candidates=NUM_CANDIDATES):
+        # get candidates
+        np.random.seed(1000)
+        pred_means = np.random.rand(num_candidates)
+        candidates = []
+        for i in range(num_candidates):
+            candidates.append(BernoulliRV(pred_means[i]))
+        num_snapshots = MAX_ITERS / SNAPSHOT_RATE
+
+        # keep only the scalars for the best candidate
+        obj = RandomBinaryObjective()
+        ts = ThompsonSampling(obj, candidates)
+        result = ts.solve(termination_condition = MaxIterTerminationCondition(MAX_ITERS), snapshot_rate = SNAPSHOT_RATE,
+                          snapshot_policy = BestOnlySnapshotPolicy())
+        self.assertEqual(len(result.models), num_snapshots + 1)
+        for model in result.models[:-1]:
+            self.assertTrue(np.isscalar(model.alphas))
+        self.assertEqual(result.models[-1].alphas.shape[0], num_candidates)
+
+        # keep the most recent snapshots
+        ring_size = 3
+        result = ts.solve(termination_condition = MaxIterTerminationCondition(MAX_ITERS), snapshot_rate = SNAPSHOT_RATE,
+                          snapshot_policy = RingBufferSnapshotPolicy(ring_size))
+        self.assertEqual(len(result.models), ring_size + 1)
+        for model in result.models:
+            self.assertEqual(model.alphas.shape[0], num_candidates)
+
+        # write snapshots to disk, opening the file only while running
+        sink_dir = tempfile.mkdtemp()
+        sink_filename = os.path.join(sink_dir, 'snapshots.hdf5')
+        sink_policy = SinkSnapshotPolicy(sink_filename)
+        self.assertFalse(os.path.exists(sink_filename))
+        for i in range(2):
+            result = ts.solve(termination_condition = MaxIterTerminationCondition(MAX_ITERS), snapshot_rate = SNAPSHOT_RATE,
+                              snapshot_policy = sink_policy)
+            self.assertEqual(len(result.models), 1)
+            sink_file = h5py.File(sink_filename, 'r')
+            self.assertEqual(len(sink_file.keys()), (i + 1) * num_snapshots)
+            sink_file.close()
+        self.assertEqual(sink_policy.num_written, 2 * num_snapshots)
+        shutil.rmtree(sink_dir)
+
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.DEBUG)
     test_suite = TestSuite()
     test_suite.addTest(LearningTest('test_uniform_alloc'))
     test_suite.addTest(LearningTest('test_thompson_sampling'))    
     test_suite.addTest(LearningTest('test_gaussian_uniform_alloc'))    
+    test_suite.addTest(LearningTest('test_max_segment_tree'))
+    test_suite.addTest(LearningTest('test_gittins_index_table'))
+    test_suite.addTest(LearningTest('test_streaming_classification_result'))
+    test_suite.addTest(LearningTest('test_tensor_dataset_background_write'))
+    test_suite.addTest(LearningTest('test_tensor_dataset_add_batch'))
+    test_suite.addTest(LearningTest('test_tensor_dataset_split'))
+    test_suite.addTest(LearningTest('test_batch_thompson_sampling'))
+    test_suite.addTest(LearningTest('test_batch_last_batch_clipped'))
+    test_suite.addTest(LearningTest('test_correlated_beta_bernoulli_updates'))
+    test_suite.addTest(LearningTest('test_snapshot_policies'))
     TextTestRunner(verbosity=2).run(test_suite)
         
@@ -30,6 +30,12 @@ YAML Configuration File Parameters
 ----------------------------------
 database_name : str
     full path to a Dex-Net HDF5 database
+graspable_cache_mb : float
+    size, in megabytes, of the in-memory cache of graspable objects (avoids re-reading objects in the rendering pass)
+sdf_band_voxels : float
+    width, in voxels, of the narrow band SDFs that objects are read into (fits more objects in the cache), 0 for dense SDFs
+num_prefetch_objects : int
+    number of objects to read ahead in a background thread while checking collisions and rendering
 target_object_keys : :obj:`OrderedDict`
     dictionary mapping dataset names to target objects (either 'all' or a list of specific object keys)
 env_rv_params : :obj:`OrderedDict`
@@ -149,6 +155,8 @@ def generate_gqcnn_dataset(dataset_path,
         number of datapoints to store in each unique tensor file on disk
     tensors/fields : :obj:`dict`
         dictionary mapping field names to dictionaries specifying the data type, height, width, and number of channels for each tensor
+    num_tensor_write_threads : int
+        number of background threads to compress and save tensor files while new datapoints are generated (0 to save synchronously)
 
     debug : bool
         True (or 1) if the random seed should be set to enforce deterministic behavior, False (0) otherwise
@@ -164,6 +172,12 @@ def generate_gqcnn_dataset(dataset_path,
     gripper = RobotGripper.load(gripper_name)
     image_samples_per_stable_pose = config['images_per_stable_pose']
     stable_pose_min_p = config['stable_pose_min_p']
+    num_prefetch_objects = 0
+    if 'num_prefetch_objects' in config.keys():
+        num_prefetch_objects = config['num_prefetch_objects']
+    num_tensor_write_threads = 0
+    if 'num_tensor_write_threads' in config.keys():
+        num_tensor_write_threads = config['num_tensor_write_threads']
     
     # read gqcnn params
     gqcnn_params = config['gqcnn']
@@ -181,7 +195,7 @@ def generate_gqcnn_dataset(dataset_path,
     # set target objects
     for dataset in datasets:
         if target_object_keys[dataset.name] == 'all':
-            target_object_keys[dataset.name] = dataset.object_keys
+            target_object_keys[dataset.name] = dataset.object_key_set
 
     # setup grasp params
     table_alignment_params = config['table_alignment']
@@ -237,7 +251,8 @@ def generate_gqcnn_dataset(dataset_path,
         tensor_config['fields'][metric_name]['dtype'] = 'float32'
 
     # init tensor dataset
-    tensor_dataset = TensorDataset(output_dir, tensor_config)
+    tensor_dataset = TensorDataset(output_dir, tensor_config,
+                                   num_write_threads=num_tensor_write_threads)
     tensor_datapoint = tensor_dataset.datapoint_template
 
     # setup log file
@@ -273,10 +288,8 @@ def generate_gqcnn_dataset(dataset_path,
         # loop through datasets and objects
         for dataset in datasets:
             logging.info('Reading dataset %s' %(dataset.name))
-            for obj in dataset:
-                if obj.key not in target_object_keys[dataset.name]:
-                    continue
-
+            target_keys = [k for k in dataset.object_keys if k in target_object_keys[dataset.name]]
+            for obj in dataset.graspables(target_keys, num_prefetch=num_prefetch_objects):
                 # init candidate grasp storage
                 candidate_grasps_dict[obj.key] = {}
 
@@ -286,52 +299,50 @@ def generate_gqcnn_dataset(dataset_path,
 
                 # read in the stable poses of the mesh
                 stable_poses = dataset.stable_poses(obj.key)
+                stable_poses = [stable_pose for stable_pose in stable_poses if stable_pose.p > stable_pose_min_p]
+
+                # read grasps and compute their angles with every table plane at once.
+                # aligning a grasp with a table tilts its approach axis by |pi/2 - axis angle| from the table normal
+                grasps = dataset.grasp_set(obj.key, gripper=gripper.name)
+                grasp_axis_table_angles, _, _ = grasps.grasp_angles_from_stp_z(stable_poses)
+                grasp_approach_table_angles = np.abs(np.pi / 2 - grasp_axis_table_angles)
+                perpendicular_table = (grasp_approach_table_angles < max_grasp_approach_table_angle)
+
                 for i, stable_pose in enumerate(stable_poses):
-                    # render images if stable pose is valid
-                    if stable_pose.p > stable_pose_min_p:
-                        candidate_grasps_dict[obj.key][stable_pose.id] = []
-
-                        # setup table in collision checker
-                        T_obj_stp = stable_pose.T_obj_table.as_frames('obj', 'stp')
-                        T_obj_table = obj.mesh.get_T_surface_obj(T_obj_stp, delta=table_offset).as_frames('obj', 'table')
-                        T_table_obj = T_obj_table.inverse()
-                        collision_checker.set_table(table_mesh_filename, T_table_obj)
-
-                        # read grasp and metrics
-                        grasps = dataset.grasps(obj.key, gripper=gripper.name)
-                        logging.info('Aligning %d grasps for object %s in stable %s' %(len(grasps), obj.key, stable_pose.id))
-
-                        # align grasps with the table
-                        aligned_grasps = [grasp.perpendicular_table(stable_pose) for grasp in grasps]
-
-                        # check grasp validity
-                        logging.info('Checking collisions for %d grasps for object %s in stable %s' %(len(grasps), obj.key, stable_pose.id))
-                        for aligned_grasp in aligned_grasps:
-                            # check angle with table plane and skip unaligned grasps
-                            _, grasp_approach_table_angle, _ = aligned_grasp.grasp_angles_from_stp_z(stable_pose)
-                            perpendicular_table = (np.abs(grasp_approach_table_angle) < max_grasp_approach_table_angle)
-                            if not perpendicular_table: 
-                                continue
-
-                            # check whether any valid approach directions are collision free
-                            collision_free = False
-                            for phi_offset in phi_offsets:
-                                rotated_grasp = aligned_grasp.grasp_y_axis_offset(phi_offset)
-                                collides = collision_checker.collides_along_approach(rotated_grasp, approach_dist, delta_approach)
-                                if not collides:
-                                    collision_free = True
-                                    break
-                    
-                            # store if aligned to table
-                            candidate_grasps_dict[obj.key][stable_pose.id].append(GraspInfo(aligned_grasp, collision_free))
+                    candidate_grasps_dict[obj.key][stable_pose.id] = []
 
-                            # visualize if specified
-                            if collision_free and config['vis']['candidate_grasps']:
-                                logging.info('Grasp %d' %(aligned_grasp.id))
-                                vis.figure()
-                                vis.gripper_on_object(gripper, aligned_grasp, obj, stable_pose.T_obj_world)
-                                vis.show()
-                                
+                    # setup table in collision checker
+                    T_obj_stp = stable_pose.T_obj_table.as_frames('obj', 'stp')
+                    T_obj_table = obj.mesh.get_T_surface_obj(T_obj_stp, delta=table_offset).as_frames('obj', 'table')
+                    T_table_obj = T_obj_table.inverse()
+                    collision_checker.set_table(table_mesh_filename, T_table_obj)
+
+                    # align the grasps that can be made perpendicular to the table
+                    logging.info('Aligning %d grasps for object %s in stable %s' %(len(grasps), obj.key, stable_pose.id))
+                    aligned_grasps = grasps[perpendicular_table[:,i]].perpendicular_table(stable_pose)
+
+                    # check grasp validity
+                    logging.info('Checking collisions for %d grasps for object %s in stable %s' %(len(aligned_grasps), obj.key, stable_pose.id))
+                    for aligned_grasp in aligned_grasps:
+                        # check whether any valid approach directions are collision free
+                        collision_free = False
+                        for phi_offset in phi_offsets:
+                            rotated_grasp = aligned_grasp.grasp_y_axis_offset(phi_offset)
+                            collides = collision_checker.collides_along_approach(rotated_grasp, approach_dist, delta_approach)
+                            if not collides:
+                                collision_free = True
+                                break
+                
+                        # store if aligned to table
+                        candidate_grasps_dict[obj.key][stable_pose.id].append(GraspInfo(aligned_grasp, collision_free))
+
+                        # visualize if specified
+                        if collision_free and config['vis']['candidate_grasps']:
+                            logging.info('Grasp %d' %(aligned_grasp.id))
+                            vis.figure()
+                            vis.gripper_on_object(gripper, aligned_grasp, obj, stable_pose.T_obj_world)
+                            vis.show()
+                            
         # save to file
         logging.info('Saving to file')
         pkl.dump(candidate_grasps_dict, open(grasp_cache_filename, 'wb'))
@@ -351,13 +362,9 @@ def generate_gqcnn_dataset(dataset_path,
     for dataset in datasets:
         logging.info('Generating data for dataset %s' %(dataset.name))
         
-        # iterate through all object keys
-        object_keys = dataset.object_keys
-        for obj_key in object_keys:
-            obj = dataset[obj_key]
-            if obj.key not in target_object_keys[dataset.name]:
-                continue
-
+        # iterate through all target objects
+        target_keys = [k for k in dataset.object_keys if k in target_object_keys[dataset.name]]
+        for obj in dataset.graspables(target_keys, num_prefetch=num_prefetch_objects):
             # read in the stable poses of the mesh
             stable_poses = dataset.stable_poses(obj.key)
             for i, stable_pose in enumerate(stable_poses):
@@ -539,6 +546,10 @@ def generate_gqcnn_dataset(dataset_path,
     # save last file
     tensor_dataset.flush()
 
+    for dataset in datasets:
+        if dataset.graspable_cache is not None:
+            logging.info('Graspable cache stats for dataset %s: %s' %(dataset.name, dataset.graspable_cache.stats))
+
     # save category mappings
     obj_cat_filename = os.path.join(output_dir, 'object_category_map.json')
     json.dump(obj_category_map, open(obj_cat_filename, 'w'))
@@ -578,8 +589,16 @@ if __name__ == '__main__':
         np.random.seed(SEED)
         
     # open database
+    graspable_cache_bytes = 0
+    if 'graspable_cache_mb' in config.keys():
+        graspable_cache_bytes = int(config['graspable_cache_mb'] * 1e6)
+    sdf_band_voxels = 0
+    if 'sdf_band_voxels' in config.keys():
+        sdf_band_voxels = config['sdf_band_voxels']
     database = Hdf5Database(config['database_name'],
-                            access_level=READ_ONLY_ACCESS)
+                            access_level=READ_ONLY_ACCESS,
+                            graspable_cache_bytes=graspable_cache_bytes,
+                            sdf_band_voxels=sdf_band_voxels)
 
     # read params
     target_object_keys = config['target_objects']
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Rewrites a Dex-Net HDF5 database with a new storage layout (chunking, compression, and SDF quantization)
+and reports the change in file size and object read time.
+
+YAML Configuration File Parameters
+----------------------------------
+storage_options : :obj:`dict`
+    chunking, compression, and quantization of the repacked SDF and mesh data (see dexnet.database.Hdf5ObjectFactory.storage_options)
+num_timing_objects : int
+    number of objects per dataset to read from each database when comparing read times
+"""
+import argparse
+import h5py
+import logging
+import numpy as np
+import os
+import time
+
+from autolab_core import YamlConfig
+
+from dexnet.constants import READ_ONLY_ACCESS, WRITE_ACCESS
+from dexnet.database import Hdf5Database, Hdf5ObjectFactory
+from dexnet.database.keys import *
+
+# root attributes that describe the storage layout, which are set for the new layout rather than copied
+STORAGE_KEYS = [STORAGE_COMPRESSION_KEY, STORAGE_COMPRESSION_LEVEL_KEY,
+                STORAGE_CHUNK_SIZE_KEY, STORAGE_QUANTIZE_SDF_KEY]
+
+def copy_attrs(src, dst, exclude=[]):
+    """ Copies the HDF5 attributes of src to dst, skipping the keys in exclude """
+    for key, value in src.attrs.iteritems():
+        if key not in exclude:
+            dst.attrs[key] = value
+
+def repack_group(src, dst, storage_options):
+    """ Recursively copies an HDF5 group, rewriting SDF, surface index and mesh data with the given storage options.
+
+    Parameters
+    ----------
+    src : :obj:`h5py.Group`
+        group to copy from
+    dst : :obj:`h5py.Group`
+        group to copy to
+    storage_options : :obj:`dict`
+        chunking, compression, and quantization of the SDF and mesh data
+    """
+    for name, item in src.iteritems():
+        # copy datasets that are not part of an SDF or mesh directly
+        if not isinstance(item, h5py.Group):
+            src.copy(item, dst, name=name)
+            continue
+
+        if name in dst.keys():
+            dst_item = dst[name]
+        else:
+            dst_item = dst.create_group(name)
+
+        # rewrite sdfs and meshes
+        if name == SDF_KEY and SDF_DATA_KEY in item.keys():
+            copy_attrs(item, dst_item, exclude=[SDF_QUANTIZATION_SCALE_KEY])
+            sdf = Hdf5ObjectFactory.sdf_3d(item)
+            Hdf5ObjectFactory.write_sdf_3d(sdf, dst_item, storage_options=storage_options)
+        elif name == SURFACE_INDEX_KEY and SURFACE_MASK_KEY in item.keys() and SDF_KEY in src.keys():
+            copy_attrs(item, dst_item)
+            surface_index = Hdf5ObjectFactory.surface_index(item, Hdf5ObjectFactory.sdf_3d(src[SDF_KEY]))
+            Hdf5ObjectFactory.write_surface_index(surface_index, dst_item, storage_options=storage_options,
+                                                  with_gradients=SURFACE_GRADIENTS_KEY in item.keys())
+        elif MESH_VERTICES_KEY in item.keys() and MESH_TRIANGLES_KEY in item.keys():
+            copy_attrs(item, dst_item)
+            mesh = Hdf5ObjectFactory.mesh_3d(item)
+            Hdf5ObjectFactory.write_mesh_3d(mesh, dst_item, storage_options=storage_options)
+        else:
+            copy_attrs(item, dst_item)
+            repack_group(item, dst_item, storage_options)
+
+def time_object_reads(database_filename, num_objects):
+    """ Times reading the SDFs and meshes of the first objects in each dataset of a database.
+
+    Parameters
+    ----------
+    database_filename : str
+        path to the database
+    num_objects : int
+        number of objects to read from each dataset
+
+    Returns
+    -------
+    float
+        total read time in seconds
+    :obj:`dict` mapping str to :obj:`numpy.ndarray`
+        SDF data for each object read, keyed by dataset and object name
+    """
+    total_time = 0.0
+    sdf_data = {}
+    data = h5py.File(database_filename, 'r')
+    for dataset_name, dataset_data in data[DATASETS_KEY].iteritems():
+        objects = dataset_data[OBJECTS_KEY]
+        for key in objects.keys()[:num_objects]:
+            if SDF_KEY not in objects[key].keys() or MESH_KEY not in objects[key].keys():
+                continue
+            start = time.time()
+            sdf = Hdf5ObjectFactory.sdf_3d(objects[key][SDF_KEY])
+            Hdf5ObjectFactory.mesh_3d(objects[key][MESH_KEY])
+            total_time += time.time() - start
+            sdf_data[os.path.join(dataset_name, key)] = sdf.data
+    data.close()
+    return total_time, sdf_data
+
+def repack_database(input_filename, output_filename, storage_options, num_timing_objects=100):
+    """ Rewrites a database with a new storage layout and logs the change in size and read time.
+
+    Parameters
+    ----------
+    input_filename : str
+        path to the database to repack
+    output_filename : str
+        path to save the repacked database to
+    storage_options : :obj:`dict`
+        chunking, compression, and quantization of the SDF and mesh data
+    num_timing_objects : int
+        number of objects per dataset to read from each database when comparing read times
+    """
+    if os.path.abspath(input_filename) == os.path.abspath(output_filename):
+        raise ValueError('Output database must be different from the input database')
+
+    # create the output database with the new layout
+    database = Hdf5Database(output_filename, access_level=WRITE_ACCESS,
+                            storage_options=storage_options)
+    storage_options = database.storage_options
+    database.close()
+
+    # copy everything
+    logging.info('Repacking %s to %s with options %s' %(input_filename, output_filename, storage_options))
+    repack_start = time.time()
+    src = h5py.File(input_filename, 'r')
+    dst = h5py.File(output_filename, 'r+')
+    copy_attrs(src, dst, exclude=STORAGE_KEYS)
+    repack_group(src, dst, storage_options)
+    src.close()
+    dst.close()
+    logging.info('Repacking took %.3f sec' %(time.time() - repack_start))
+
+    # report size
+    input_size = os.path.getsize(input_filename)
+    output_size = os.path.getsize(output_filename)
+    logging.info('Size: %.2f MB -> %.2f MB (%.1f%%)' %(input_size / 1e6, output_size / 1e6,
+                                                        100.0 * output_size / max(input_size, 1)))
+
+    # report read time and quantization error
+    input_time, input_sdfs = time_object_reads(input_filename, num_timing_objects)
+    output_time, output_sdfs = time_object_reads(output_filename, num_timing_objects)
+    logging.info('Read time for %d objects: %.3f sec -> %.3f sec' %(len(input_sdfs), input_time, output_time))
+    if len(input_sdfs) > 0:
+        max_sdf_error = max([np.max(np.abs(input_sdfs[k] - output_sdfs[k])) for k in input_sdfs.keys()])
+        logging.info('Max SDF difference: %.6f' %(max_sdf_error))
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+
+    # parse args
+    parser = argparse.ArgumentParser(description='Rewrite a Dex-Net HDF5 database with a new storage layout')
+    parser.add_argument('input_database', type=str, help='path to the database to repack')
+    parser.add_argument('output_database', type=str, help='path to save the repacked database to')
+    parser.add_argument('--config_filename', type=str, default=None, help='configuration file to use')
+    args = parser.parse_args()
+    config_filename = args.config_filename
+
+    # handle config filename
+    if config_filename is None:
+        config_filename = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                       '..',
+                                       'cfg/tools/repack_database.yaml')
+
+    # parse config
+    config = YamlConfig(config_filename)
+
+    # repack
+    repack_database(args.input_database,
+                    args.output_database,
+                    config['storage_options'],
+                    num_timing_objects=config['num_timing_objects'])